@@ -0,0 +1,254 @@
+# coding=utf-8
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+import cache
+import draw_graph
+
+# Analyses of an executed graph, answered as overlays the page can paint over the graph it already drew: lists indexed
+# like the graph's vertices and edges, plus a few totals. Every graph gets a compressed sparse row index of its
+# adjacency once, and searches walk it a whole frontier at a time with array operations, so only the depth first search
+# visits vertices one by one. Indexes are cached by graph and overlays by graph and query, so asking again about the
+# same graph while debugging runs neither the format nor the search.
+
+ANALYSES = ("bfs", "dfs", "components", "bipartite", "degrees", "shortest_paths")
+
+INDEX_CACHE_ENTRIES = cache.setting("INDEX_CACHE_ENTRIES", 16)
+INDEX_CACHE_BYTES = cache.setting("INDEX_CACHE_BYTES", 256 * 1024 * 1024)
+OVERLAY_CACHE_ENTRIES = cache.setting("OVERLAY_CACHE_ENTRIES", 256)
+OVERLAY_CACHE_BYTES = cache.setting("OVERLAY_CACHE_BYTES", 64 * 1024 * 1024)
+
+
+class Adjacency:
+    # The neighbours of vertex v are neighbours[offsets[v]:offsets[v + 1]], reached through the edges at the same
+    # positions of edge_ids, in the order the edges were read. An edge is listed at both of its ends, and a self-loop
+    # twice at its one end.
+    def __init__(self, num_vertices: int, heads: np.ndarray, tails: np.ndarray) -> None:
+        self.num_vertices = num_vertices
+        ends = np.concatenate([heads, tails])
+        order = np.argsort(ends, kind="stable")
+        self.offsets = np.zeros(num_vertices + 1, dtype=np.int64)
+        np.cumsum(np.bincount(ends, minlength=num_vertices), out=self.offsets[1:])
+        self.neighbours = np.concatenate([tails, heads])[order].astype(np.intc)
+        self.edge_ids = (order % max(len(heads), 1)).astype(np.intc)
+
+    def degree(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+    def expand(self, frontier: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # every edge out of the frontier, in the order a queue would go through them: the frontier vertex each leaves,
+        # the neighbour it reaches and the edge
+        starts = self.offsets[frontier]
+        counts = self.offsets[frontier + 1] - starts
+        positions = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts - starts, counts)
+        return np.repeat(frontier, counts), self.neighbours[positions], self.edge_ids[positions]
+
+    def nbytes(self) -> int:
+        return self.offsets.nbytes + self.neighbours.nbytes + self.edge_ids.nbytes
+
+
+class Search:
+    # a breadth or depth first search: the vertices it reached in the order it reached them, and for every vertex the
+    # edge it was reached through and where from, -1 for sources and vertices never reached
+    def __init__(self, order: np.ndarray, parent: np.ndarray, parent_edge: np.ndarray) -> None:
+        self.order = order
+        self.parent = parent
+        self.parent_edge = parent_edge
+
+    def tree_edges(self, num_edges: int) -> np.ndarray:
+        out = np.zeros(num_edges, dtype=np.int8)
+        out[self.parent_edge[self.parent_edge >= 0]] = 1
+        return out
+
+
+def bfs(adjacency: Adjacency, sources: np.ndarray) -> Tuple[Search, np.ndarray]:
+    # a layer at a time, from all the sources at once; each vertex is claimed by the first edge reaching it in queue
+    # order, so the order and parents are those of a queue started with the sources. Also returns the distances.
+    n = adjacency.num_vertices
+    distance = np.full(n, -1, dtype=np.intc)
+    parent = np.full(n, -1, dtype=np.intc)
+    parent_edge = np.full(n, -1, dtype=np.intc)
+    frontier = np.asarray(sources, dtype=np.intc)
+    distance[frontier] = 0
+    layers = [frontier]
+    depth = 0
+    while len(frontier):
+        depth += 1
+        origin, reached, through = adjacency.expand(frontier)
+        fresh = distance[reached] < 0
+        origin, reached, through = origin[fresh], reached[fresh], through[fresh]
+        first = np.sort(np.unique(reached, return_index=True)[1])
+        frontier = reached[first]
+        distance[frontier] = depth
+        parent[frontier] = origin[first]
+        parent_edge[frontier] = through[first]
+        layers.append(frontier)
+    return Search(np.concatenate(layers), parent, parent_edge), distance
+
+
+def dfs(adjacency: Adjacency, source: int) -> Search:
+    # preorder, taking neighbours in the order the edges were read; every vertex keeps the position in its row it got
+    # to, so the search is linear even though it goes vertex by vertex
+    offsets = adjacency.offsets.tolist()
+    neighbours = adjacency.neighbours.tolist()
+    edge_ids = adjacency.edge_ids.tolist()
+    position = offsets[:-1]
+    seen = bytearray(adjacency.num_vertices)
+    parent = [-1] * adjacency.num_vertices
+    parent_edge = [-1] * adjacency.num_vertices
+    seen[source] = 1
+    order = [source]
+    stack = [source]
+    while stack:
+        v = stack[-1]
+        i = position[v]
+        end = offsets[v + 1]
+        while i < end and seen[neighbours[i]]:
+            i += 1
+        if i == end:
+            position[v] = i
+            stack.pop()
+            continue
+        w = neighbours[i]
+        position[v] = i + 1
+        seen[w] = 1
+        parent[w] = v
+        parent_edge[w] = edge_ids[i]
+        order.append(w)
+        stack.append(w)
+    return Search(np.array(order, dtype=np.intc), np.array(parent, dtype=np.intc),
+                  np.array(parent_edge, dtype=np.intc))
+
+
+class GraphIndex:
+    # one executed graph, by vertex and edge positions as the graph response lists them
+    def __init__(self, names: List[str], heads: np.ndarray, tails: np.ndarray) -> None:
+        self.names = names
+        self.heads = heads
+        self.tails = tails
+        self.adjacency = Adjacency(len(names), heads, tails)
+        # made on the first analysis that needs them
+        self.name_index: Optional[Dict[str, int]] = None
+        self.label: Optional[np.ndarray] = None
+        self.count = 0
+
+    def nbytes(self) -> int:
+        # counting the components it may keep
+        return self.adjacency.nbytes() + self.heads.nbytes + self.tails.nbytes \
+            + 8 * len(self.names) + sum(49 + len(name) for name in self.names)
+
+    def vertex(self, name: Optional[str]) -> int:
+        # the position of a vertex named in a query, the last one winning a name as with edges; the first vertex when
+        # none is named
+        if not self.names:
+            raise Exception("Graph has no vertices!")
+        if name is None:
+            return 0
+        if self.name_index is None:
+            self.name_index = {vertex: i for i, vertex in enumerate(self.names)}
+        if name not in self.name_index:
+            raise Exception("Unknown vertex!", name)
+        return self.name_index[name]
+
+    def components(self) -> Tuple[np.ndarray, int]:
+        if self.label is None:
+            self.label, self.count = draw_graph.components(len(self.names), self.heads, self.tails)
+        return self.label, self.count
+
+    def overlay(self, analysis: str, source: Optional[str] = None, target: Optional[str] = None) -> str:
+        if analysis == "bfs":
+            out = self.bfs_overlay(self.vertex(source))
+        elif analysis == "dfs":
+            out = self.dfs_overlay(self.vertex(source))
+        elif analysis == "components":
+            out = self.components_overlay()
+        elif analysis == "bipartite":
+            out = self.bipartite_overlay()
+        elif analysis == "degrees":
+            out = self.degrees_overlay()
+        elif analysis == "shortest_paths":
+            out = self.paths_overlay(self.vertex(source), None if target is None else self.vertex(target))
+        else:
+            raise Exception("Unknown analysis!", analysis)
+        out["analysis"] = analysis
+        return json.dumps(out)
+
+    def bfs_overlay(self, source: int) -> Dict[str, Any]:
+        search, distance = bfs(self.adjacency, np.array([source]))
+        return {"source": source, "order": search.order.tolist(),
+                "vertices": {"distance": distance.tolist(), "parent": search.parent.tolist()},
+                "edges": {"tree": search.tree_edges(len(self.heads)).tolist()},
+                "summary": {"reached": len(search.order), "depth": int(distance.max())}}
+
+    def dfs_overlay(self, source: int) -> Dict[str, Any]:
+        search = dfs(self.adjacency, source)
+        rank = np.full(len(self.names), -1, dtype=np.intc)
+        rank[search.order] = np.arange(len(search.order))
+        return {"source": source, "order": search.order.tolist(),
+                "vertices": {"rank": rank.tolist(), "parent": search.parent.tolist()},
+                "edges": {"tree": search.tree_edges(len(self.heads)).tolist()},
+                "summary": {"reached": len(search.order)}}
+
+    def components_overlay(self) -> Dict[str, Any]:
+        label, count = self.components()
+        sizes = np.bincount(label, minlength=count)
+        return {"vertices": {"component": label.tolist()}, "edges": {"component": label[self.heads].tolist()},
+                "summary": {"count": count, "sizes": sizes.tolist(), "largest": int(sizes.max(initial=0))}}
+
+    def bipartite_overlay(self) -> Dict[str, Any]:
+        # sides by the parity of the depth in a search forest with a root per component; the graph is bipartite
+        # exactly when no edge joins two vertices on the same side, self-loops included
+        label, count = self.components()
+        roots = np.unique(label, return_index=True)[1]
+        _, distance = bfs(self.adjacency, roots)
+        side = distance % 2
+        conflict = (side[self.heads] == side[self.tails]).astype(np.int8)
+        odd = np.unique(label[self.heads[conflict == 1]])
+        return {"vertices": {"side": side.tolist()}, "edges": {"conflict": conflict.tolist()},
+                "summary": {"bipartite": not len(odd), "conflicts": int(conflict.sum()),
+                            "odd_components": odd.tolist()}}
+
+    def degrees_overlay(self) -> Dict[str, Any]:
+        # self-loops count twice, and repeated edges once for each time they were read
+        degree = self.adjacency.degree()
+        values, counts = np.unique(degree, return_counts=True)
+        low = np.minimum(self.heads, self.tails).astype(np.int64)
+        high = np.maximum(self.heads, self.tails).astype(np.int64)
+        pairs = low * max(len(self.names), 1) + high
+        summary = {"min": int(degree.min()) if len(degree) else 0, "max": int(degree.max(initial=0)),
+                   "mean": float(degree.mean()) if len(degree) else 0.0,
+                   "median": float(np.median(degree)) if len(degree) else 0.0,
+                   "isolated": int((degree == 0).sum()), "leaves": int((degree == 1).sum()),
+                   "self_loops": int((self.heads == self.tails).sum()),
+                   "repeated_edges": len(pairs) - len(np.unique(pairs)),
+                   "histogram": {"degrees": values.tolist(), "counts": counts.tolist()}}
+        return {"vertices": {"degree": degree.tolist()}, "summary": summary}
+
+    def paths_overlay(self, source: int, target: Optional[int]) -> Dict[str, Any]:
+        # edges are unweighted, so the search tree of a breadth first search holds a shortest path to every vertex
+        search, distance = bfs(self.adjacency, np.array([source]))
+        out = {"source": source, "vertices": {"distance": distance.tolist(), "parent": search.parent.tolist()},
+               "edges": {"tree": search.tree_edges(len(self.heads)).tolist()},
+               "summary": {"reached": len(search.order), "eccentricity": int(distance.max())}}
+        if target is not None:
+            # from the target back up the tree, turned around; empty when the target can't be reached
+            vertices = []
+            edges = []
+            if distance[target] >= 0:
+                v = target
+                while v != source:
+                    vertices.append(v)
+                    edges.append(int(search.parent_edge[v]))
+                    v = int(search.parent[v])
+                vertices.append(source)
+            out["target"] = target
+            out["path"] = {"vertices": vertices[::-1], "edges": edges[::-1], "length": len(edges)}
+        return out
+
+
+index_cache = cache.LRUCache(INDEX_CACHE_ENTRIES, INDEX_CACHE_BYTES, lambda index: index.nbytes())
+overlay_cache = cache.LRUCache(OVERLAY_CACHE_ENTRIES, OVERLAY_CACHE_BYTES, len)
@@ -0,0 +1,48 @@
+# coding=utf-8
+# Run from the repository root with: python -m benchmarks.component_bench
+from __future__ import annotations
+
+import random
+import time
+from typing import Tuple
+
+import numpy as np
+
+import draw_graph
+
+ITERATIONS = 50
+BUDGET = 600.0
+
+
+def random_forest(components: int, smallest: int, largest: int) -> Tuple[int, np.ndarray]:
+    edges = []
+    vertices = 0
+    for _ in range(components):
+        size = random.randint(smallest, largest)
+        edges += [(vertices + i, vertices + random.randrange(i)) for i in range(1, size)]
+        vertices += size
+    return vertices, np.array(edges, dtype=np.int64).reshape(-1, 2)
+
+
+def timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    random.seed(0)
+    print("%d workers, %d iterations per layout" % (draw_graph.WORKERS, ITERATIONS))
+    print("%11s %9s %13s %10s %10s" % ("components", "vertices", "single system", "serial", "parallel"))
+    for components, smallest, largest in [(10000, 1, 10), (1000, 10, 100), (20, 1000, 5000)]:
+        vertices, ends = random_forest(components, smallest, largest)
+        heads = ends[:, 0]
+        tails = ends[:, 1]
+        single = timed(lambda: draw_graph.layout(draw_graph.initial_points(vertices), heads, tails, ITERATIONS, BUDGET))
+        serial = timed(lambda: draw_graph.place(vertices, heads, tails, "force", ITERATIONS, BUDGET, False))
+        parallel = timed(lambda: draw_graph.place(vertices, heads, tails, "force", ITERATIONS, BUDGET, True))
+        print("%11d %9d %12.2fs %9.2fs %9.2fs" % (components, vertices, single, serial, parallel))
+
+
+if __name__ == '__main__':
+    main()
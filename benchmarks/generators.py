@@ -0,0 +1,80 @@
+# coding=utf-8
+# Synthetic inputs for the pipeline benchmark: each format comes with a generator that makes data for it of roughly the
+# requested number of tokens, the same data for the same seed.
+from __future__ import annotations
+
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+EDGE_LIST = "newgraph\nVERTICES EDGES\nforall EDGES {\n<ENDPOINT> <ENDPOINT>\n}"
+VERTEX_LIST = "newgraph\nn\nforall n {\n<VERTEX> <w>\n}\nm\nforall m {\n<ENDPOINT> <ENDPOINT>\n}"
+NESTED = "newgraph\nVERTICES r\nforall r {\nc\nforall c {\n<ENDPOINT> <ENDPOINT> <w>\n}\n}"
+HINTS = "newgraph\nn m\n(VERTICES, n)\nforall m {\n<a> <b> <w>\n(ENDPOINT, a - 1)\n(ENDPOINT, b - 1)\n(d, w * 2)\n}"
+
+# largest number of edges in one group of the nested format
+GROUP_SIZE = 20
+
+
+def join(numbers: np.ndarray) -> str:
+    return " ".join(map(str, numbers.tolist()))
+
+
+def edge_list(tokens: int, rng: np.random.Generator) -> str:
+    edges = max(tokens // 2 - 1, 1)
+    vertices = max(edges // 2, 1)
+    return str(vertices) + " " + str(edges) + "\n" + join(rng.integers(0, vertices, 2 * edges))
+
+
+def vertex_list(tokens: int, rng: np.random.Generator) -> str:
+    # named vertices with a weight each, then twice as many edges between them
+    vertices = max(tokens // 6, 1)
+    edges = max((tokens - 2 - 2 * vertices) // 2, 0)
+    names = rng.permutation(10 * vertices)[:vertices]
+    weights = rng.integers(1, 1000, vertices)
+    return str(vertices) + "\n" + join(np.stack([names, weights], axis=1).ravel()) + "\n" + str(edges) + "\n" \
+        + join(names[rng.integers(0, vertices, 2 * edges)])
+
+
+def nested(tokens: int, rng: np.random.Generator) -> str:
+    # groups of weighted edges, each group headed by its size
+    vertices = max(tokens // 6, 1)
+    sizes = []
+    left = tokens - 2
+    while left > 1:
+        size = min(int(rng.integers(1, GROUP_SIZE + 1)), max((left - 1) // 3, 1))
+        sizes.append(size)
+        left -= 1 + 3 * size
+    parts = [str(vertices) + " " + str(len(sizes))]
+    for size in sizes:
+        ends = rng.integers(0, vertices, (size, 2))
+        parts.append(str(size) + "\n" + join(np.concatenate([ends, rng.integers(1, 1000, (size, 1))], axis=1).ravel()))
+    return "\n".join(parts)
+
+
+def hints(tokens: int, rng: np.random.Generator) -> str:
+    # one-based, weighted edges, every endpoint and a derived value solved through a hint
+    edges = max((tokens - 2) // 3, 1)
+    vertices = max(edges // 2, 1)
+    columns = [rng.integers(1, vertices + 1, edges), rng.integers(1, vertices + 1, edges), rng.integers(1, 1000, edges)]
+    return str(vertices) + " " + str(edges) + "\n" + join(np.stack(columns, axis=1).ravel())
+
+
+FORMATS: Dict[str, Tuple[str, Callable[[int, np.random.Generator], str]]] = {
+    "edges": (EDGE_LIST, edge_list),
+    "vertices": (VERTEX_LIST, vertex_list),
+    "nested": (NESTED, nested),
+    "hints": (HINTS, hints),
+}
+
+
+def generate(name: str, tokens: int, seed: int = 0) -> Tuple[str, str]:
+    # the format and data for it
+    if name not in FORMATS:
+        raise Exception("Unknown benchmark format!", name)
+    program, generator = FORMATS[name]
+    return program, generator(tokens, np.random.default_rng(seed))
+
+
+def format_names() -> List[str]:
+    return list(FORMATS)
@@ -0,0 +1,79 @@
+# coding=utf-8
+# Run from the repository root with: python -m benchmarks.graph_memory
+from __future__ import annotations
+
+import random
+import time
+import tracemalloc
+from typing import List, Callable, Optional
+
+import execute
+
+
+# The object-per-element layout execute.Graph used before it became columnar, kept here as the comparison point.
+class ObjectGraph:
+    def __init__(self) -> None:
+        self.vertices = []
+        self.edges = []
+        self.nextEdge = None
+
+    def add_endpoint(self, endpoint: str, loopcnts: dict) -> None:
+        if self.nextEdge is None:
+            self.nextEdge = ObjectEdge(endpoint, None, loopcnts)
+        else:
+            self.nextEdge.b = endpoint
+            self.edges.append(self.nextEdge)
+            self.nextEdge = None
+
+    def set_vertices(self, vertices: int, loopcnts: dict) -> None:
+        for i in range(vertices):
+            self.vertices.append(ObjectVertex(str(i), loopcnts))
+            self.vertices[-1].dependencies[execute.VERTEX_COUNT] = i
+
+
+class ObjectVertex:
+    def __init__(self, index: str, loopcnts: dict) -> None:
+        self.id = index
+        self.dependencies = loopcnts.copy()
+
+
+class ObjectEdge:
+    def __init__(self, a: str, b: Optional[str], loopcnts: dict) -> None:
+        self.a = a
+        self.b = b
+        self.dependencies = loopcnts.copy()
+
+
+def build(graph_class: Callable, vertices: int, endpoints: List[str]) -> object:
+    graph = graph_class()
+    graph.set_vertices(vertices, {})
+    loopcnts = {"EDGES": 0}
+    for i, endpoint in enumerate(endpoints):
+        loopcnts["EDGES"] = i // 2
+        graph.add_endpoint(endpoint, loopcnts)
+    return graph
+
+
+def measure(graph_class: Callable, vertices: int, endpoints: List[str]) -> None:
+    tracemalloc.start()
+    start = time.perf_counter()
+    graph = build(graph_class, vertices, endpoints)
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del graph
+    print("%14s %9d %9d %10.1fMB %10.1fMB %8.2fs" % (graph_class.__name__, vertices, len(endpoints) // 2,
+                                                     current / 2 ** 20, peak / 2 ** 20, elapsed))
+
+
+def main() -> None:
+    random.seed(0)
+    print("%14s %9s %9s %12s %12s %9s" % ("layout", "vertices", "edges", "retained", "peak", "time"))
+    for vertices, edges in [(1000, 10000), (100000, 200000), (500000, 2000000)]:
+        endpoints = [str(random.randrange(vertices)) for _ in range(2 * edges)]
+        for graph_class in (ObjectGraph, execute.Graph):
+            measure(graph_class, vertices, endpoints)
+
+
+if __name__ == '__main__':
+    main()
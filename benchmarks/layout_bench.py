@@ -0,0 +1,71 @@
+# coding=utf-8
+# Run from the repository root with: python -m benchmarks.layout_bench
+from __future__ import annotations
+
+import random
+import time
+from typing import List, Tuple
+
+import numpy as np
+
+import draw_graph
+
+
+def random_graph(vertices: int, extra: float = 0.5) -> List[Tuple[int, int]]:
+    # a random tree plus extra * vertices random edges, so the graph is connected and has some cycles
+    edges = [(i, random.randrange(i)) for i in range(1, vertices)]
+    edges += [(random.randrange(vertices), random.randrange(vertices)) for _ in range(int(vertices * extra))]
+    return edges
+
+
+def all_pairs(points: np.ndarray) -> np.ndarray:
+    # the exact repulsion draw_graph used to compute, in row blocks so that 10k vertices fit in memory
+    forces = np.zeros_like(points)
+    for begin in range(0, len(points), 512):
+        diff = points[begin:begin + 512, None, :] - points[None, :, :]
+        d2 = (diff ** 2).sum(axis=2)
+        d2[d2 == 0] = np.inf
+        forces[begin:begin + 512] = (draw_graph.K2 * diff / (d2 ** 1.5)[:, :, None]).sum(axis=1)
+    return forces
+
+
+def main() -> None:
+    random.seed(0)
+    print("%9s %9s %9s %10s %10s %9s %12s %8s %10s %11s" % ("vertices", "edges", "tree", "repulsion", "all-pairs",
+                                                            "error", "iterations", "layout", "per-iter",
+                                                            "multilevel"))
+    for vertices in (1000, 10000, 100000):
+        edges = random_graph(vertices)
+        ends = np.array(edges, dtype=np.int64)
+        points = draw_graph.initial_points(vertices)
+
+        start = time.perf_counter()
+        tree = draw_graph.QuadTree(points)
+        built = time.perf_counter() - start
+        forces = tree.repulsion(points)
+        repulsion = time.perf_counter() - start - built
+
+        exact = "%10s" % "-"
+        error = "%9s" % "-"
+        if vertices <= 10000:
+            start = time.perf_counter()
+            expected = all_pairs(points)
+            exact = "%9.3fs" % (time.perf_counter() - start)
+            relative = np.hypot(*(forces - expected).T) / np.maximum(np.hypot(*expected.T), 1e-12)
+            error = "%8.2f%%" % (100 * np.median(relative))
+
+        start = time.perf_counter()
+        iterations = draw_graph.layout(points, ends[:, 0], ends[:, 1], draw_graph.MAX_ITERATIONS, 60.0)
+        elapsed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        draw_graph.multilevel(vertices, ends[:, 0], ends[:, 1], draw_graph.MAX_ITERATIONS, 60.0)
+        multilevel = time.perf_counter() - start
+        print("%9d %9d %8.3fs %9.3fs %s %s %12d %7.2fs %9.1fms %10.2fs" % (vertices, len(edges), built, repulsion,
+                                                                           exact, error, iterations, elapsed,
+                                                                           1000 * elapsed / max(iterations, 1),
+                                                                           multilevel))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+# coding=utf-8
+# Run from the repository root with: python -m benchmarks.parse_bench
+from __future__ import annotations
+
+import time
+from typing import Callable
+
+import parse
+import parse_gen
+
+
+def nested_expression(depth: int) -> str:
+    out = "a"
+    for i in range(depth):
+        out = "(" + out + " + " + str(i) + ") * b" + str(i)
+    return out
+
+
+def make_format(loops: int, depth: int) -> str:
+    out = "newgraph\nVERTICES EDGES\n"
+    for i in range(loops):
+        out += "forall EDGES {\n<ENDPOINT + 1> <ENDPOINT + 1> (x" + str(i) + " = " + nested_expression(depth) + ")\n}\n"
+    return out
+
+
+def best_of(repeat: int, fn: Callable[[], object]) -> float:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def main() -> None:
+    proc_grammar = parse.build_proc_grammar(parse.GRAMMAR)
+    print("loops depth   interpreted     packrat   generated")
+    for loops, depth in [(1, 2), (10, 4), (50, 6), (200, 8)]:
+        S = make_format(loops, depth)
+        if repr(parse.parse(S, proc_grammar)) != repr(parse_gen.parse_generated(S)):
+            raise Exception("Generated parser disagrees with the interpreter!", loops, depth)
+        interpreted = best_of(3, lambda: parse.parse(S, proc_grammar))
+        packrat = best_of(3, lambda: parse.parse(S, proc_grammar, packrat=True))
+        generated = best_of(3, lambda: parse_gen.parse_generated(S))
+        print("%5d %5d %12.4fs %10.4fs %10.4fs" % (loops, depth, interpreted, packrat, generated))
+
+
+if __name__ == '__main__':
+    main()
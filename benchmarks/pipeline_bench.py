@@ -0,0 +1,221 @@
+# coding=utf-8
+# Run from the repository root with: python -m benchmarks.pipeline_bench [--sizes 1e2,1e4] [--output results.json]
+#                                                                         [--baseline baseline.json]
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+import compile
+import draw_graph
+import endpoint
+import execute
+import lower
+import parse
+import parse_gen
+from benchmarks import generators
+
+# Times every stage of the pipeline separately on synthetic inputs, and their peak traced memory in a run of its own,
+# since tracing slows everything down. Results are written as JSON; given a baseline written by an earlier run, stages
+# that got slower or bigger by more than the threshold are reported and the exit status is 1. Layouts stop at
+# draw_graph.TIME_BUDGET, so past a few thousand vertices their time is capped and the iterations they got through are
+# what shows a change.
+
+STAGES = ["parse", "parse_gen", "compile", "execute", "closures", "position", "get_data"]
+DEFAULT_SIZES = [100, 1000, 10000, 100000]
+MAX_SIZE = 10 ** 7
+# best of up to REPEAT runs, stopping early once MIN_TIME seconds have gone into a stage
+REPEAT = 5
+MIN_TIME = 1.0
+THRESHOLD = 0.25
+# changes smaller than this many seconds, or bytes, are noise whatever the ratio
+TIME_FLOOR = 0.002
+MEMORY_FLOOR = 64 * 1024
+
+
+class Inputs:
+    # what each stage starts from, made once per format and size by running the stages before it
+    def __init__(self, program: str, data: str) -> None:
+        self.program = program
+        self.data = data
+        self.tokens = len(data.split())
+        self.proc_grammar = parse.build_proc_grammar(parse.GRAMMAR)
+        self.tree = parse_gen.parse_generated(program)
+        self.ast = compile.compile_tree(self.tree)
+        self.lowered = lower.lower_statements(self.ast)
+        graph = execute.Execute(self.ast, data).get_data().values[execute.GRAPH_NAME].values[tuple()]
+        names, heads, tails = endpoint.graph_structure(graph)
+        self.vertices = len(names)
+        self.edges = np.stack([np.frombuffer(heads, dtype=np.intc), np.frombuffer(tails, dtype=np.intc)], axis=1)
+
+
+def get_data(inputs: Inputs) -> None:
+    # end to end and cold: nothing compiled, laid out or answered before
+    endpoint.program_cache.clear()
+    endpoint.result_cache.clear()
+    draw_graph.layout_cache.clear()
+    draw_graph.latest_layouts.clear()
+    endpoint.get_data(inputs.program, inputs.data)
+
+
+def position(inputs: Inputs) -> int:
+    # draw_graph.position, but keeping the number of iterations
+    points, iterations = draw_graph.place(inputs.vertices, inputs.edges[:, 0], inputs.edges[:, 1])
+    draw_graph.scale(points)
+    return iterations
+
+
+def stage(name: str, inputs: Inputs) -> Callable[[], object]:
+    if name == "parse":
+        return lambda: parse.parse(inputs.program, inputs.proc_grammar)
+    elif name == "parse_gen":
+        return lambda: parse_gen.parse_generated(inputs.program)
+    elif name == "compile":
+        return lambda: compile.compile_tree(inputs.tree)
+    elif name == "execute":
+        return lambda: execute.Execute(inputs.ast, inputs.data).get_data()
+    elif name == "closures":
+        return lambda: lower.ClosureExecute(inputs.ast, inputs.data, inputs.lowered).get_data()
+    elif name == "position":
+        return lambda: position(inputs)
+    elif name == "get_data":
+        return lambda: get_data(inputs)
+    else:
+        raise Exception("Unknown stage!", name)
+
+
+def measure(fn: Callable[[], object], memory: bool) -> Tuple[float, int, Optional[int], Optional[int]]:
+    # the best time, the number of runs, the peak traced bytes and the iterations of the fastest run if the stage
+    # counts them; draw_graph prints the extent of every layout, which would bury the results
+    best = None
+    iterations = None
+    runs = 0
+    spent = 0.0
+    with contextlib.redirect_stdout(io.StringIO()):
+        while runs < REPEAT and (runs == 0 or spent < MIN_TIME):
+            start = time.perf_counter()
+            out = fn()
+            elapsed = time.perf_counter() - start
+            if best is None or elapsed < best:
+                best = elapsed
+                iterations = out if type(out) is int else None
+            runs += 1
+            spent += elapsed
+        peak = None
+        if memory:
+            tracemalloc.start()
+            try:
+                fn()
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+    return best, runs, peak, iterations
+
+
+def run(formats: List[str], sizes: List[int], stages: List[str], memory: bool, seed: int) -> List[Dict[str, Any]]:
+    results = []
+    print("%9s %9s %10s %11s %5s %10s %11s" % ("format", "tokens", "stage", "seconds", "runs", "peak", "iterations"))
+    for name in formats:
+        for size in sizes:
+            inputs = Inputs(*generators.generate(name, size, seed))
+            for stage_name in stages:
+                seconds, runs, peak, iterations = measure(stage(stage_name, inputs), memory)
+                results.append({"format": name, "size": size, "tokens": inputs.tokens, "stage": stage_name,
+                                "seconds": seconds, "runs": runs, "peak_bytes": peak, "iterations": iterations})
+                print("%9s %9d %10s %10.4fs %5d %10s %11s" % (name, inputs.tokens, stage_name, seconds, runs,
+                                                              "-" if peak is None else "%.1fMB" % (peak / 2 ** 20),
+                                                              "-" if iterations is None else iterations))
+                sys.stdout.flush()
+    return results
+
+
+def compare(results: List[Dict[str, Any]], baseline: List[Dict[str, Any]], threshold: float) -> List[str]:
+    # the regressions, matching results to the baseline by format, size and stage
+    before = {(result["format"], result["size"], result["stage"]): result for result in baseline}
+    out = []
+    for result in results:
+        old = before.get((result["format"], result["size"], result["stage"]))
+        if old is None:
+            continue
+        for field, floor, unit in (("seconds", TIME_FLOOR, "s"), ("peak_bytes", MEMORY_FLOOR, "B")):
+            if result[field] is None or old[field] is None:
+                continue
+            if result[field] > old[field] * (1 + threshold) and result[field] - old[field] > floor:
+                out.append("%s %d %s: %s %g%s -> %g%s (%+.0f%%)" % (result["format"], result["size"], result["stage"],
+                                                                  field, old[field], unit, result[field], unit,
+                                                                  100 * (result[field] / old[field] - 1)))
+        # a layout that ran out of time with fewer iterations than before got slower per iteration
+        if result["iterations"] is not None and old.get("iterations") is not None \
+                and result["iterations"] < old["iterations"] * (1 - threshold):
+            out.append("%s %d %s: iterations %d -> %d" % (result["format"], result["size"], result["stage"],
+                                                          old["iterations"], result["iterations"]))
+    return out
+
+
+def machine() -> Dict[str, Any]:
+    return {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+            "numpy": np.__version__}
+
+
+def parse_list(text: str) -> List[str]:
+    return [item.strip() for item in text.split(",") if item.strip()]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Times every stage of the pipeline on synthetic inputs.")
+    parser.add_argument("--formats", default=",".join(generators.format_names()))
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="tokens of input, like 1e2,1e4")
+    parser.add_argument("--stages", default=",".join(STAGES))
+    parser.add_argument("--no-memory", action="store_true", help="skip the traced run for peak memory")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="where to write the results as JSON")
+    parser.add_argument("--baseline", help="results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="allowed slowdown, as a fraction")
+    args = parser.parse_args()
+
+    formats = parse_list(args.formats)
+    stages = parse_list(args.stages)
+    sizes = [int(float(size)) for size in parse_list(args.sizes)]
+    for name in formats:
+        if name not in generators.FORMATS:
+            raise Exception("Unknown benchmark format!", name)
+    for stage_name in stages:
+        if stage_name not in STAGES:
+            raise Exception("Unknown stage!", stage_name)
+    for size in sizes:
+        if not 0 < size <= MAX_SIZE:
+            raise Exception("Benchmark sizes go from 1 to 10^7 tokens!", size)
+    # read before running, so that a missing baseline fails straight away
+    baseline = None
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    results = run(formats, sizes, stages, not args.no_memory, args.seed)
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump({"machine": machine(), "seed": args.seed, "results": results}, f, indent=1)
+
+    if baseline is not None:
+        regressions = compare(results, baseline["results"], args.threshold)
+        if baseline.get("machine") != machine():
+            print("Baseline is from another machine:", baseline.get("machine"))
+        for regression in regressions:
+            print("REGRESSION", regression)
+        if regressions:
+            sys.exit(1)
+        print("No regressions over %.0f%%" % (100 * args.threshold))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,196 @@
+# coding=utf-8
+from __future__ import annotations
+
+from array import array
+from itertools import chain
+from typing import List, Optional, Callable, Union, Any
+
+import numpy as np
+
+import compile
+import execute
+
+# Loops whose bodies only read tokens into graph keywords or brand new variables don't need the general interpreter:
+# nothing in the body can observe anything else in the body, so all count * width tokens can be read in one go and
+# split into columns, one per token position. Every column is then appended to the graph or stored as a variable in a
+# single pass, giving exactly the Root the slow path builds one token at a time.
+
+GRAPH_KEYWORDS = ("ENDPOINT", "VERTEX")
+
+
+class Target:
+    def __init__(self, position: int, destination: Union[compile.Keyword, compile.Variable],
+                 transform: Optional[Callable[[int], int]]) -> None:
+        self.position = position
+        self.destination = destination
+        self.transform = transform
+        self.expression = destination
+        self.numeric = False
+
+    def column(self, columns: List[List[str]]) -> Union[List[Any], array]:
+        column = columns[self.position]
+        if not self.numeric:
+            return column
+        try:
+            # numpy reads the whole column at once, taking the same integers int does
+            numbers = np.array(column, dtype=np.int64)
+        except (ValueError, OverflowError):
+            numbers = None
+        if numbers is not None and self.transform is None and isinstance(self.destination, compile.Variable):
+            return array("q", numbers.tobytes())
+        try:
+            # integers past 64 bits still go through int
+            column = numbers.tolist() if numbers is not None else list(map(int, column))
+        except ValueError:
+            # replay the column in order so that the first bad token, or an earlier failing transform, raises as the
+            # slow path would
+            for token in column:
+                value = execute.parse_int(token, self.expression)
+                if self.transform is not None:
+                    self.transform(value)
+        if self.transform is not None:
+            column = list(map(self.transform, column))
+        if isinstance(self.destination, compile.Keyword):
+            # the graph stores names the way the slow path does, through str(curr_val)
+            column = list(map(str, column))
+        return column
+
+    def __repr__(self) -> str:
+        return str(self.position) + " -> " + str(self.destination)
+
+
+class BulkLoop:
+    def __init__(self, loopvar: compile.VarName, width: int, targets: List[Target]) -> None:
+        self.loopvar = loopvar
+        self.width = width
+        self.targets = targets
+        self.endpoints = [t for t in targets if isinstance(t.destination, compile.Keyword)
+                          and t.destination.name == "ENDPOINT"]
+        self.vertices = [t for t in targets if isinstance(t.destination, compile.Keyword)
+                         and t.destination.name == "VERTEX"]
+        self.variables = [t for t in targets if isinstance(t.destination, compile.Variable)]
+
+    def __repr__(self) -> str:
+        return "BulkLoop(" + str(self.loopvar) + ", " + str(self.targets) + ")"
+
+    def run(self, state: execute.Execute, count: int) -> bool:
+        # returns False when the slow path has to run instead, before anything has been consumed
+        for target in self.variables:
+            if target.destination.name in state.root.values:
+                return False
+        if (self.endpoints or self.vertices) and execute.GRAPH_NAME not in state.values:
+            return False
+        if count <= 0:
+            return True
+        if not self.targets:
+            # tokens nothing reads, as in the pre-scan of test cases
+            state.skip_tokens(count * self.width)
+            return True
+
+        tokens = state.read_tokens(count * self.width)
+        columns = [tokens[j::self.width] for j in range(self.width)]
+
+        outer = state.loopcnts
+        iterations = []
+        for t in range(count):
+            loopcnts = dict(outer)
+            loopcnts[self.loopvar] = t
+            iterations.append(loopcnts)
+
+        if self.endpoints or self.vertices:
+            graph = state.get_graph()
+            for targets, add in ((self.endpoints, graph.add_endpoints), (self.vertices, graph.add_vertices)):
+                if not targets:
+                    continue
+                values = [target.column(columns) for target in targets]
+                dependencies = iterations
+                if len(targets) > 1:
+                    values = [list(chain.from_iterable(zip(*values)))]
+                    dependencies = [loopcnts for loopcnts in iterations for _ in targets]
+                add(values[0], dependencies)
+
+        # this loop is the innermost one running, so each variable gets a single row of its values
+        nesting = list(outer) + [self.loopvar]
+        ancestors = sorted(nesting)
+        prefix = tuple(outer.values())
+        for target in self.variables:
+            name = target.destination.name
+            variable = execute.Variable(name, ancestors, nesting)
+            variable.values.extend_row(prefix, target.column(columns))
+            state.root.values[name] = variable
+            for ancestor in ancestors:
+                state.root.values[ancestor].children.add(name)
+        return True
+
+
+def constant_value(expression: compile.Expression) -> Optional[int]:
+    if isinstance(expression, compile.Constant):
+        return expression.value
+    if isinstance(expression, compile.MathExpression):
+        a = constant_value(expression.lhs)
+        b = constant_value(expression.rhs)
+        if a is None or b is None:
+            return None
+        try:
+            return expression.operator.execute(a, b)
+        except ZeroDivisionError:
+            # leave the error to the slow path, where it is raised at the right point
+            return None
+    return None
+
+
+def plan_target(expression: compile.Expression) -> Optional[Target]:
+    if isinstance(expression, compile.Keyword):
+        if expression.name in GRAPH_KEYWORDS:
+            return Target(0, expression, None)
+        return None
+    if isinstance(expression, compile.Variable):
+        return Target(0, expression, None)
+    if isinstance(expression, compile.MathExpression):
+        a = constant_value(expression.lhs)
+        b = constant_value(expression.rhs)
+        if a is None and b is not None:
+            inner = plan_target(expression.lhs)
+            solve = expression.operator.lookup(compile.GET_LHS)
+            known = b
+        elif b is None and a is not None:
+            inner = plan_target(expression.rhs)
+            solve = expression.operator.lookup(compile.GET_RHS)
+            known = a
+        else:
+            return None
+        if inner is None:
+            return None
+        transform = inner.transform
+        if transform is None:
+            def step(curr_val: int) -> int:
+                return solve(known, curr_val)
+        else:
+            def step(curr_val: int) -> int:
+                return transform(solve(known, curr_val))
+        return Target(0, inner.destination, step)
+    return None
+
+
+def plan_loop(loop: compile.Loop) -> Optional[BulkLoop]:
+    targets = []
+    names = set()
+    for position, statement in enumerate(loop.statements):
+        if not isinstance(statement, compile.Token):
+            return None
+        for expression, numeric in zip(statement.expression_list, statement.numeric):
+            target = plan_target(expression)
+            if target is None:
+                return None
+            target.expression = expression
+            target.numeric = numeric
+            if isinstance(target.destination, compile.Variable):
+                name = target.destination.name
+                if name in names or name == loop.loopvar.name:
+                    return None
+                names.add(name)
+            target.position = position
+            targets.append(target)
+    if not loop.statements:
+        return None
+    return BulkLoop(loop.loopvar.name, len(loop.statements), targets)
@@ -0,0 +1,104 @@
+# coding=utf-8
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Callable, Union
+
+
+def fingerprint(*parts: Union[str, bytes]) -> str:
+    h = hashlib.sha256()
+    for part in parts:
+        data = part if isinstance(part, bytes) else part.encode("utf-8")
+        # length prefix so ("ab", "c") and ("a", "bc") never collide
+        h.update(str(len(data)).encode("ascii") + b":")
+        h.update(data)
+    return h.hexdigest()
+
+
+def setting(name: str, default: int) -> int:
+    # a limit, such as the size of a cache, taken from the environment variable GRAPHVIS_<name> when it is set, so
+    # that deployments can change it without touching the code; read once, when the module using it is imported
+    variable = "GRAPHVIS_" + name
+    value = os.environ.get(variable, "").strip()
+    if not value:
+        return default
+    if not (value.isascii() and value.isdigit()):
+        raise Exception("Setting is not a whole number!", variable, value)
+    return int(value)
+
+
+class LRUCache:
+    entries: OrderedDict
+
+    def __init__(self, max_entries: int = 128, max_bytes: Optional[int] = None,
+                 sizeof: Callable[[Any], int] = None) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof if sizeof is not None else (lambda value: 0)
+        self.entries = OrderedDict()
+        self.sizes = {}
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def put(self, key: str, value: Any) -> None:
+        size = self.sizeof(value)
+        with self.lock:
+            # the old value goes even when the new one is too big to keep, as it is out of date either way
+            if key in self.entries:
+                self.remove(key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+            self.entries[key] = value
+            self.sizes[key] = size
+            self.total_bytes += size
+            self.evict()
+
+    def resize(self, max_entries: int, max_bytes: Optional[int] = None) -> None:
+        # new limits, evicting the least recently used entries until they are met
+        with self.lock:
+            self.max_entries = max_entries
+            self.max_bytes = max_bytes
+            self.evict()
+
+    def evict(self) -> None:
+        # with the lock held
+        while len(self.entries) > self.max_entries or \
+                (self.max_bytes is not None and self.total_bytes > self.max_bytes):
+            self.remove(next(iter(self.entries)))
+            self.evictions += 1
+
+    def remove(self, key: str) -> None:
+        del self.entries[key]
+        self.total_bytes -= self.sizes.pop(key)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.sizes.clear()
+            self.total_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            return {"entries": len(self.entries), "bytes": self.total_bytes, "hits": self.hits,
+                    "misses": self.misses, "evictions": self.evictions}
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __repr__(self) -> str:
+        return "LRUCache(" + str(self.stats()) + ")"
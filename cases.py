@@ -0,0 +1,232 @@
+# coding=utf-8
+from __future__ import annotations
+
+import copy
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Set, Optional, Dict, Iterator, Tuple, Union
+
+import compile
+import execute
+import lower
+import token_source
+
+# A format ending in "testcases T { ... }" reads its header once and then T cases, each into a Root of its own, as if
+# the header and that one case were the whole format. Cases can only run independently once it is known where each
+# one starts, so a pre-scan first runs every case with everything pruned away but what decides how many tokens it
+# reads: loop counts and whatever they are worked out from. Tokens nothing reads are skipped in bulk. The cases then
+# run for real, in parallel when there is enough input, each on its own slice of the source.
+
+CASE_WORKERS = os.cpu_count() or 1
+# characters, or bytes of a mapped file, of cases before they are worth sending to other processes
+PARALLEL_SIZE = 1024 * 1024
+
+# workers are forked with the plan already built, lowered closures included; elsewhere each worker builds its own
+if "fork" in multiprocessing.get_all_start_methods():
+    case_context = multiprocessing.get_context("fork")
+else:
+    case_context = multiprocessing.get_context()
+
+
+class CasePlan:
+    def __init__(self, statements: List[compile.Statement]) -> None:
+        self.ast = statements
+        self.header, testcases = compile.split_cases(statements)
+        if testcases is None:
+            raise Exception("Format has no test cases!")
+        self.count = testcases.count
+        self.statements = testcases.statements
+        self.scan = prune(self.statements, needed_names(self.statements))
+        self.lowered_header = lower.lower_statements(self.header)
+        self.lowered_scan = lower.lower_statements(self.scan)
+        self.lowered = lower.lower_statements(self.statements)
+
+    def __repr__(self) -> str:
+        return "CasePlan(" + str(self.count) + " cases of " + str(len(self.statements)) + " statements)"
+
+
+class Cursor(token_source.TokenSource):
+    # one pass over a source shared by consecutive runs, remembering the offset just past the last token read
+    def __init__(self, source: token_source.TokenSource) -> None:
+        self.source = source
+        self.offset = 0
+        self.stream = self.read()
+
+    def read(self) -> Iterator[str]:
+        for token, end in self.source.positions():
+            self.offset = end
+            yield token
+
+    def __iter__(self) -> Iterator[str]:
+        return self.stream
+
+    def positions(self) -> Iterator[Tuple[str, int]]:
+        for token in self.stream:
+            yield token, self.offset
+
+    def slice(self, start: int, end: int) -> token_source.TokenSource:
+        return self.source.slice(start, end)
+
+    def close(self) -> None:
+        # lets go of the source's scanner now rather than when the cycle through the generator gets collected, since a
+        # mapped file can't be closed while one is still alive
+        self.stream.close()
+
+
+def variable_names(expression: compile.Expression) -> Set[compile.VarName]:
+    if isinstance(expression, compile.Variable):
+        return {expression.name}
+    if isinstance(expression, compile.MathExpression):
+        return variable_names(expression.lhs) | variable_names(expression.rhs)
+    return set()
+
+
+def split_names(expression: compile.Expression) -> Tuple[Set[compile.VarName], Set[compile.VarName]]:
+    # the variables an expression assigns when a token or hint is read into it, and those it reads; a side
+    # compile.plan_solves couldn't settle counts as both
+    if isinstance(expression, compile.Variable):
+        return {expression.name}, set()
+    if isinstance(expression, compile.MathExpression):
+        if expression.solve == "lhs":
+            assigned, read = split_names(expression.lhs)
+            return assigned, read | variable_names(expression.rhs)
+        if expression.solve == "rhs":
+            assigned, read = split_names(expression.rhs)
+            return assigned, read | variable_names(expression.lhs)
+        names = variable_names(expression)
+        return names, names
+    return set(), set()
+
+
+def has_keyword(expression: compile.Expression) -> bool:
+    if isinstance(expression, compile.Keyword):
+        return True
+    if isinstance(expression, compile.MathExpression):
+        return has_keyword(expression.lhs) or has_keyword(expression.rhs)
+    return False
+
+
+def needed_names(statements: List[compile.Statement]) -> Set[compile.VarName]:
+    # the loop counts, and everything they can be solved from through hints and arithmetic
+    needed = set()
+    groups = []
+
+    def visit(statements: List[compile.Statement]) -> None:
+        for statement in statements:
+            if isinstance(statement, compile.Loop):
+                needed.update(variable_names(statement.loopvar))
+                visit(statement.statements)
+            elif isinstance(statement, compile.Hint):
+                groups.append(set().union(*map(variable_names, statement.expression_list)))
+            elif isinstance(statement, compile.Token):
+                groups.extend(map(variable_names, statement.expression_list))
+
+    visit(statements)
+    changed = True
+    while changed:
+        changed = False
+        for names in groups:
+            if names & needed and not names <= needed:
+                needed |= names
+                changed = True
+    return needed
+
+
+def prune(statements: List[compile.Statement], needed: Set[compile.VarName]) -> List[compile.Statement]:
+    # copies of the statements that still read every token but only assign what is needed; the graph never decides
+    # what is read, so initializers go, and with them every expression holding a keyword
+    out = []
+    for statement in statements:
+        if isinstance(statement, compile.Loop):
+            body = prune(statement.statements, needed)
+            if body:
+                loop = copy.copy(statement)
+                loop.statements = body
+                out.append(loop)
+        elif isinstance(statement, compile.Token):
+            keep = [i for i, expression in enumerate(statement.expression_list) if assigns(expression, needed)]
+            token = copy.copy(statement)
+            token.expression_list = [statement.expression_list[i] for i in keep]
+            token.numeric = [statement.numeric[i] for i in keep]
+            out.append(token)
+        elif isinstance(statement, compile.Hint):
+            hint = prune_hint(statement, needed)
+            if hint is not None:
+                out.append(hint)
+    return out
+
+
+def prune_hint(hint: compile.Hint, needed: Set[compile.VarName]) -> Optional[compile.Hint]:
+    # the hint without the expressions that hold keywords, or None when it assigns nothing needed
+    if hint.targets is not None:
+        targets = [expression for expression in hint.targets if assigns(expression, needed)]
+        if not targets:
+            return None
+        if has_keyword(hint.source):
+            raise Exception("Test case length depends on the graph!", hint)
+        out = copy.copy(hint)
+        out.targets = targets
+        return out
+    expressions = [expression for expression in hint.expression_list if not has_keyword(expression)]
+    if not any(assigns(expression, needed) for expression in expressions):
+        return None
+    # with only one left, a value it doesn't already have would have come from the graph, and the hint says so
+    out = copy.copy(hint)
+    out.expression_list = expressions
+    return out
+
+
+def assigns(expression: compile.Expression, needed: Set[compile.VarName]) -> bool:
+    return not has_keyword(expression) and bool(split_names(expression)[0] & needed)
+
+
+def run(ast: List[compile.Statement], source: token_source.TokenSource, program: lower.Command, backend: str,
+        inherited: Optional[Dict[compile.VarName, execute.VarVal]] = None) -> execute.Execute:
+    if backend == "interpreter":
+        return execute.Execute(ast, source, inherited=inherited)
+    elif backend == "closures":
+        return lower.ClosureExecute(ast, source, program, inherited=inherited)
+    else:
+        raise Exception("Unknown backend!", backend)
+
+
+def run_cases(plan: CasePlan, source: Union[str, token_source.TokenSource], backend: str = "closures",
+              parallel: Optional[bool] = None) -> List[execute.Root]:
+    if isinstance(source, str):
+        source = token_source.StringTokens(source)
+    with Cursor(source) as cursor:
+        header = run(plan.header, cursor, plan.lowered_header, backend)
+        count = header.get_value(plan.count)
+        if type(count) is not int:
+            raise Exception("Test case count is not a number!", count)
+        # the header's values in scope are what every case starts from, except the graph, which each case makes itself
+        inherited = {name: value for name, value in header.values.items() if name != execute.GRAPH_NAME}
+
+        bounds = [cursor.offset]
+        for _ in range(count):
+            run(plan.scan, cursor, plan.lowered_scan, backend, inherited)
+            bounds.append(cursor.offset)
+    slices = [source.slice(bounds[i], bounds[i + 1]) for i in range(count)]
+
+    if parallel is None:
+        parallel = count > 1 and CASE_WORKERS > 1 and bounds[-1] - bounds[0] >= PARALLEL_SIZE
+    if not parallel or not count:
+        return [run(plan.statements, case, plan.lowered, backend, inherited).get_data() for case in slices]
+    initargs = (plan,) if case_context.get_start_method() == "fork" else (plan.ast,)
+    with ProcessPoolExecutor(min(CASE_WORKERS, count), case_context, initializer=set_plan, initargs=initargs) as pool:
+        return list(pool.map(run_case, slices, [backend] * count, [inherited] * count))
+
+
+worker_plan = None
+
+
+def set_plan(plan: Union[CasePlan, List[compile.Statement]]) -> None:
+    global worker_plan
+    worker_plan = plan if isinstance(plan, CasePlan) else CasePlan(plan)
+
+
+def run_case(source: token_source.TokenSource, backend: str,
+             inherited: Dict[compile.VarName, execute.VarVal]) -> execute.Root:
+    plan = worker_plan
+    return run(plan.statements, source, plan.lowered, backend, inherited).get_data()
@@ -1,7 +1,8 @@
 # coding=utf-8
 from __future__ import annotations
 
-from typing import Union, NewType, List, Iterable
+import operator
+from typing import Union, NewType, List, Iterable, Dict, Callable, Set, Optional, FrozenSet, Tuple
 
 import parse
 
@@ -10,6 +11,8 @@ class Loop:
     def __init__(self, loopvar: int, statements: List[Statement]) -> None:
         self.loopvar = loopvar
         self.statements = list(statements)
+        # filled in by compile_statement, on every statement: its start and end offsets in the format text
+        self.span = None
 
     def __repr__(self) -> str:
         out = "forall (" + str(self.loopvar) + ")" + "{\n"
@@ -19,9 +22,28 @@ class Loop:
         return out
 
 
+class TestCases:
+    def __init__(self, count: Expression, statements: List[Statement]) -> None:
+        self.count = count
+        self.statements = list(statements)
+        self.span = None
+
+    def __repr__(self) -> str:
+        out = "testcases (" + str(self.count) + ")" + "{\n"
+        for s in self.statements:
+            out += str(s) + "\n"
+        out += "} "
+        return out
+
+
 class Hint:
     def __init__(self, expression_list: Iterable[Expression]) -> None:
         self.expression_list = list(expression_list)
+        # filled in by plan_solves: the expression the value is read from and the ones it is assigned to, in order,
+        # or None when that depends on the input
+        self.source = None
+        self.targets = None
+        self.span = None
 
     def __repr__(self) -> str:
         return "(" + ", ".join(str(x) for x in self.expression_list) + ") "
@@ -30,6 +52,9 @@ class Hint:
 class Token:
     def __init__(self, expression_list: Iterable[Expression]) -> None:
         self.expression_list = list(expression_list)
+        # filled in by infer_types: whether each expression takes the token as an int rather than as raw text
+        self.numeric = [False] * len(self.expression_list)
+        self.span = None
 
     def __repr__(self) -> str:
         return "<" + ", ".join(str(x) for x in self.expression_list) + "> "
@@ -39,6 +64,7 @@ class Initializer:
     def __init__(self, type: ObjType, name: VarName = "") -> None:
         self.type = type
         self.name = name
+        self.span = None
 
     def __repr__(self) -> str:
         return str(self.type) + "(" + str(self.name) + ")"
@@ -49,6 +75,8 @@ class MathExpression:
         self.lhs = lhs
         self.operator = op
         self.rhs = rhs
+        # filled in by plan_solves: "lhs" or "rhs" when that side is always the unknown one on assignment
+        self.solve = None
 
     def __repr__(self) -> str:
         return "(" + str(self.lhs) + " " + str(self.operator) + " " + str(self.rhs) + ")"
@@ -57,6 +85,7 @@ class MathExpression:
 class Variable:
     def __init__(self, name: VarName) -> None:
         self.name = name
+        self.numeric = False
 
     def __repr__(self) -> str:
         return self.name
@@ -85,52 +114,81 @@ class Operator:
     def __repr__(self) -> str:
         return self.operator
 
-    def execute(self, lhs: int, rhs: int) -> int:
-        if self.operator == "*":
-            return lhs * rhs
-        elif self.operator == "/":
-            return lhs // rhs
-        elif self.operator == "+":
-            return lhs + rhs
-        elif self.operator == "-":
-            return lhs - rhs
-        else:
+    def lookup(self, table: Dict[str, Callable[[int, int], int]]) -> Callable[[int, int], int]:
+        if self.operator not in table:
             raise Exception("Unknown operator :(", self.operator)
+        return table[self.operator]
+
+    def execute(self, lhs: int, rhs: int) -> int:
+        return self.lookup(EXECUTE)(lhs, rhs)
 
     def get_rhs(self, lhs: int, result: int) -> int:
-        if self.operator == "*":
-            return result // lhs
-        elif self.operator == "/":
-            return lhs // result
-        elif self.operator == "+":
-            return result - lhs
-        elif self.operator == "-":
-            return lhs - result
-        else:
-            raise Exception("Unknown operator :(", self.operator)
+        return self.lookup(GET_RHS)(lhs, result)
 
     def get_lhs(self, rhs: int, result: int) -> int:
-        if self.operator == "*":
-            return result // rhs
-        elif self.operator == "/":
-            return result * rhs
-        elif self.operator == "+":
-            return result - rhs
-        elif self.operator == "-":
-            return result + rhs
-        else:
-            raise Exception("Unknown operator :(", self.operator)
+        return self.lookup(GET_LHS)(rhs, result)
+
+
+EXECUTE = {
+    "*": operator.mul,
+    "/": operator.floordiv,
+    "+": operator.add,
+    "-": operator.sub,
+}
+
+GET_RHS = {
+    "*": lambda lhs, result: result // lhs,
+    "/": lambda lhs, result: lhs // result,
+    "+": lambda lhs, result: result - lhs,
+    "-": lambda lhs, result: lhs - result,
+}
+
+GET_LHS = {
+    "*": lambda rhs, result: result // rhs,
+    "/": lambda rhs, result: result * rhs,
+    "+": lambda rhs, result: result - rhs,
+    "-": lambda rhs, result: result + rhs,
+}
 
 
-Statement = Union[Initializer, Loop, Hint, Token]
+Statement = Union[Initializer, Loop, TestCases, Hint, Token]
 Expression = Union[Keyword, MathExpression, Variable, Constant]
 VarName = NewType("VarName", str)
 ObjType = NewType("ObjType", str)
 
 
 def compile_tree(parse_tree: parse.ParseNode) -> List[Statement]:
-    statements = parse_tree.children[0]
-    return compile_statement_list(statements)
+    statements = compile_statement_list(parse_tree.children[0])
+    split_cases(statements)
+    infer_types(statements)
+    plan_solves(statements)
+    return statements
+
+
+def split_cases(statements: List[Statement]) -> Tuple[List[Statement], Optional[TestCases]]:
+    # The statements before a testcases block, and the block. Each case runs as if the header and that case were the
+    # whole format, so the block has to come last, at the top level, and the graph belongs to the cases.
+    for i, statement in enumerate(statements):
+        if isinstance(statement, TestCases):
+            if i != len(statements) - 1:
+                raise Exception("Test cases must be the last statement!", statement)
+            if has_cases(statement.statements):
+                raise Exception("Test cases can't be nested!", statement)
+            if any(isinstance(header, Initializer) for header in statements[:i]):
+                raise Exception("Graphs have to be initialized inside the test cases!", statement)
+            return statements[:i], statement
+        if isinstance(statement, Loop) and has_cases(statement.statements):
+            raise Exception("Test cases can't be inside a loop!", statement)
+    return statements, None
+
+
+def has_cases(statements: List[Statement]) -> bool:
+    for statement in statements:
+        if isinstance(statement, TestCases):
+            return True
+        if isinstance(statement, Loop) and has_cases(statement.statements):
+            return True
+    return False
 
 
 def compile_statement_list(statement_list: parse.ParseNode) -> List[Statement]:
@@ -142,7 +200,12 @@ def compile_statement_list(statement_list: parse.ParseNode) -> List[Statement]:
 
 
 def compile_statement(statement: parse.ParseNode) -> Statement:
-    obj = statement.children[0]
+    out = compile_statement_object(statement.children[0])
+    out.span = (statement.start, statement.end)
+    return out
+
+
+def compile_statement_object(obj: parse.ParseNode) -> Statement:
     if obj.type == "INITIALIZER":
         return Initializer(obj.children[0].value)
     elif obj.type == "HINT":
@@ -152,6 +215,8 @@ def compile_statement(statement: parse.ParseNode) -> Statement:
             return Hint(compile_expression(x) for x in obj.children)
     elif obj.type == "LOOP":
         return Loop(compile_expression(obj.children[0]), compile_statement_list(obj.children[1]))
+    elif obj.type == "TESTCASES":
+        return TestCases(compile_expression(obj.children[0]), compile_statement_list(obj.children[1]))
     elif obj.type == "TOKEN":
         if obj.children[0].type == "EXPRESSION_LIST":
             return Token(compile_expression(exp) for exp in obj.children[0].children)
@@ -178,3 +243,237 @@ def compile_expression(expression: parse.ParseNode) -> Expression:
 
 def compile_operator(operator: parse.ParseNode) -> Operator:
     return Operator(operator.children[0].value)
+
+
+class TypeInference:
+    parent: Dict[VarName, VarName]
+    numeric: Set[VarName]
+
+    # A variable is numeric when it counts a loop, appears in arithmetic, or is tied by a hint to anything numeric.
+    # Hints copy one value into all their expressions, so their variables are unified and share a type.
+    def __init__(self) -> None:
+        self.parent = {}
+        self.numeric = set()
+
+    def find(self, name: VarName) -> VarName:
+        self.parent.setdefault(name, name)
+        while self.parent[name] != name:
+            self.parent[name] = self.parent[self.parent[name]]
+            name = self.parent[name]
+        return name
+
+    def union(self, a: VarName, b: VarName) -> None:
+        a = self.find(a)
+        b = self.find(b)
+        if a != b:
+            self.parent[a] = b
+            if a in self.numeric:
+                self.numeric.add(b)
+
+    def mark(self, name: VarName) -> None:
+        self.numeric.add(self.find(name))
+
+    def is_numeric(self, name: VarName) -> bool:
+        return self.find(name) in self.numeric
+
+    def mark_operands(self, expression: Expression) -> None:
+        if isinstance(expression, MathExpression):
+            for side in (expression.lhs, expression.rhs):
+                if isinstance(side, Variable):
+                    self.mark(side.name)
+                else:
+                    self.mark_operands(side)
+
+    def visit(self, statements: List[Statement]) -> None:
+        for statement in statements:
+            if isinstance(statement, Loop):
+                if isinstance(statement.loopvar, Variable):
+                    self.mark(statement.loopvar.name)
+                self.visit(statement.statements)
+            elif isinstance(statement, TestCases):
+                if isinstance(statement.count, Variable):
+                    self.mark(statement.count.name)
+                self.mark_operands(statement.count)
+                self.visit(statement.statements)
+            elif isinstance(statement, Token):
+                for expression in statement.expression_list:
+                    self.mark_operands(expression)
+            elif isinstance(statement, Hint):
+                names = [e.name for e in statement.expression_list if isinstance(e, Variable)]
+                for name in names[1:]:
+                    self.union(names[0], name)
+                for expression in statement.expression_list:
+                    self.mark_operands(expression)
+                    if names and takes_int(expression):
+                        self.mark(names[0])
+
+    def annotate(self, statements: List[Statement]) -> None:
+        for statement in statements:
+            if isinstance(statement, Loop):
+                self.annotate_expression(statement.loopvar)
+                self.annotate(statement.statements)
+            elif isinstance(statement, TestCases):
+                self.annotate_expression(statement.count)
+                self.annotate(statement.statements)
+            elif isinstance(statement, (Token, Hint)):
+                for expression in statement.expression_list:
+                    self.annotate_expression(expression)
+                if isinstance(statement, Token):
+                    statement.numeric = [takes_int(e) or (isinstance(e, Variable) and e.numeric)
+                                         for e in statement.expression_list]
+
+    def annotate_expression(self, expression: Expression) -> None:
+        if isinstance(expression, Variable):
+            expression.numeric = self.is_numeric(expression.name)
+        elif isinstance(expression, MathExpression):
+            self.annotate_expression(expression.lhs)
+            self.annotate_expression(expression.rhs)
+
+
+def takes_int(expression: Expression) -> bool:
+    # expressions that only ever assign or produce ints, whatever the variables around them are
+    if isinstance(expression, Keyword):
+        return expression.name == "VERTICES"
+    return isinstance(expression, (MathExpression, Constant))
+
+
+def infer_types(statements: List[Statement]) -> Set[VarName]:
+    inference = TypeInference()
+    inference.visit(statements)
+    inference.annotate(statements)
+    return {name for name in inference.parent if inference.is_numeric(name)}
+
+
+KNOWN = "known"
+MAYBE = "maybe"
+
+
+class SolvePlanner:
+    sites: Dict[VarName, Set[FrozenSet[VarName]]]
+    ancestors: Dict[VarName, FrozenSet[VarName]]
+    stored: Dict[VarName, str]
+    uncertain: Set[VarName]
+    errors: List[Exception]
+
+    # Follows which variables are in scope at each statement the way Execute does: a value is known from its store
+    # until the iteration of the innermost loop it depends on ends, and comes back in later loops over the same
+    # counters. Variables stored under different loops are scoped by whichever store happens to run first, so they
+    # are left to be checked at runtime, as is everything assigned from them.
+    def __init__(self) -> None:
+        self.uncertain = set()
+        self.reset()
+
+    def reset(self) -> None:
+        self.sites = {}
+        self.ancestors = {}
+        self.stored = {}
+        self.errors = []
+
+    def status(self, expression: Expression, known: Dict[VarName, str]) -> Optional[str]:
+        if isinstance(expression, Constant):
+            return KNOWN
+        elif isinstance(expression, Variable):
+            if expression.name in self.uncertain:
+                return MAYBE
+            return known.get(expression.name)
+        elif isinstance(expression, MathExpression):
+            lhs = self.status(expression.lhs, known)
+            rhs = self.status(expression.rhs, known)
+            if lhs is None or rhs is None:
+                return None
+            return MAYBE if MAYBE in (lhs, rhs) else KNOWN
+        return None
+
+    def store(self, name: VarName, loops: Tuple[VarName, ...], known: Dict[VarName, str], certain: bool) -> None:
+        self.sites.setdefault(name, set()).add(frozenset(loops))
+        self.ancestors.setdefault(name, frozenset(loops))
+        status = KNOWN if certain and name not in self.uncertain else MAYBE
+        if known.get(name) != KNOWN:
+            known[name] = status
+        if self.stored.get(name) != KNOWN:
+            self.stored[name] = status
+
+    def visit(self, statements: List[Statement], loops: Tuple[VarName, ...], known: Dict[VarName, str]) -> None:
+        for statement in statements:
+            if isinstance(statement, Loop):
+                if not isinstance(statement.loopvar, Variable):
+                    continue
+                inner = loops + (statement.loopvar.name,)
+                scope = dict(known)
+                for name, status in self.stored.items():
+                    if statement.loopvar.name in self.ancestors[name] and self.ancestors[name] <= set(inner):
+                        scope[name] = status
+                self.visit(statement.statements, inner, scope)
+            elif isinstance(statement, TestCases):
+                # every case starts from what the header left in scope
+                if self.status(statement.count, known) is None:
+                    self.errors.append(Exception("Test case count is indeterminate!", statement))
+                self.visit(statement.statements, loops, dict(known))
+            elif isinstance(statement, Token):
+                for expression in statement.expression_list:
+                    self.plan_assignment(expression, loops, known, True)
+            elif isinstance(statement, Hint):
+                self.plan_hint(statement, loops, known)
+
+    def plan_hint(self, hint: Hint, loops: Tuple[VarName, ...], known: Dict[VarName, str]) -> None:
+        hint.source = None
+        hint.targets = None
+        source = None
+        for expression in hint.expression_list:
+            status = self.status(expression, known)
+            if status == MAYBE:
+                break
+            if status == KNOWN:
+                source = expression
+                break
+        else:
+            self.errors.append(Exception("Value hint is indeterminate!", hint))
+            return
+        targets = []
+        for expression in hint.expression_list:
+            status = self.status(expression, known)
+            if status == MAYBE or source is None:
+                source = None
+            if status != KNOWN:
+                self.plan_assignment(expression, loops, known, source is not None)
+                targets.append(expression)
+        if source is not None:
+            hint.source = source
+            hint.targets = targets
+
+    def plan_assignment(self, expression: Expression, loops: Tuple[VarName, ...], known: Dict[VarName, str],
+                        certain: bool) -> None:
+        if isinstance(expression, Variable):
+            self.store(expression.name, loops, known, certain)
+        elif isinstance(expression, MathExpression):
+            lhs = self.status(expression.lhs, known)
+            rhs = self.status(expression.rhs, known)
+            expression.solve = None
+            if not certain or MAYBE in (lhs, rhs):
+                for side, status in ((expression.lhs, lhs), (expression.rhs, rhs)):
+                    if status != KNOWN:
+                        self.plan_assignment(side, loops, known, False)
+            elif lhs is None and rhs is None:
+                self.errors.append(Exception("Both sides of an arithmetic expression are indeterminate!", expression))
+            elif lhs is not None and rhs is not None:
+                self.errors.append(Exception("Expression already fully defined!", expression))
+            elif rhs is None:
+                expression.solve = "rhs"
+                self.plan_assignment(expression.rhs, loops, known, True)
+            else:
+                expression.solve = "lhs"
+                self.plan_assignment(expression.lhs, loops, known, True)
+
+
+def plan_solves(statements: List[Statement]) -> None:
+    # statements that can only fail the same way on every input are rejected here, before any input is read
+    planner = SolvePlanner()
+    while True:
+        planner.reset()
+        planner.visit(statements, (), {})
+        uncertain = {name for name, sites in planner.sites.items() if len(sites) > 1}
+        if uncertain <= planner.uncertain:
+            break
+        planner.uncertain |= uncertain
+    if planner.errors:
+        raise planner.errors[0]
@@ -1,6 +1,17 @@
 # coding=utf-8
+from __future__ import annotations
+
+import math
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
-from typing import List, Tuple
+from typing import List, Tuple, Optional, Dict, Any, Iterator
+
+import numpy as np
+
+import cache
 
 
 @dataclass
@@ -9,12 +20,6 @@ class Vertex:
     y: int
 
 
-@dataclass
-class Force:
-    fx: int
-    fy: int
-
-
 D = 200
 K1 = 0.3
 K2 = 1000000
@@ -26,47 +31,722 @@ YHEIGHT = 400
 
 MARGIN = 50
 
+# a quadtree cell pushes as a single body once its width is under THETA times its distance from the vertex
+THETA = 0.8
+# the quadtree stops splitting at 2 ** DEPTH cells a side; vertices closer than that share a leaf
+DEPTH = 16
+# vertices walked down the quadtree together, which bounds the memory of one traversal
+CHUNK = 4096
+
+MAX_ITERATIONS = 500
+TIME_BUDGET = 5.0
+
+MODES = ("force", "multilevel")
+DEFAULT_MODE = "force"
+# the key streamed layouts are cached under, whatever mode was asked for, since they are made without it
+STREAM_MODE = "stream"
+
+# multilevel mode stops coarsening once a graph is this small, or once a round merges too few vertices to be worth it
+COARSEST = 64
+MIN_SHRINK = 0.95
+MATCHING_ROUNDS = 3
+# iterations spent refining each finer level, where the projected coarse layout is already close
+REFINE_ITERATIONS = 50
+
+# components up to this size are laid out in batches, one quadtree per batch with a separate root for each component
+SMALL_COMPONENT = 1000
+BATCH_VERTICES = 20000
+# below this many vertices a process pool costs more to start and feed than it saves
+PARALLEL_THRESHOLD = 20000
+WORKERS = os.cpu_count() or 1
+
+LAYOUT_CACHE_ENTRIES = cache.setting("LAYOUT_CACHE_ENTRIES", 64)
+LAYOUT_CACHE_BYTES = cache.setting("LAYOUT_CACHE_BYTES", 256 * 1024 * 1024)
+# a warm start first moves only the vertices around what changed, then lets the whole layout settle briefly
+LOCAL_ITERATIONS = 100
+SETTLE_ITERATIONS = 50
+
+# streamed layouts send positions every STREAM_EVERY iterations, and get longer than a blocking request to finish
+STREAM_EVERY = 10
+STREAM_TIME_BUDGET = 60.0
+
+# a vertex moves along its force as before, scaled down by its degree so that hubs don't overshoot and oscillate, and
+# never further than the step, which cools from D towards MIN_STEP so that the first iterations can't throw vertices
+# across the layout
+COOLING = 0.99
+MIN_STEP = 10.0
+
+
+def spread_bits(v: np.ndarray) -> np.ndarray:
+    v = v & 0xFFFF
+    v = (v | (v << 8)) & 0x00FF00FF
+    v = (v | (v << 4)) & 0x0F0F0F0F
+    v = (v | (v << 2)) & 0x33333333
+    v = (v | (v << 1)) & 0x55555555
+    return v
+
+
+class QuadTree:
+    # Nodes are stored level by level in flat arrays. Sorting the vertices along a Morton curve makes every cell a
+    # contiguous run [start, end) of the sorted order, so masses and centres of mass come from prefix sums, and the
+    # children of a cell are a contiguous run of the next level.
+    # Vertices in different groups never push each other: the group is the top of every Morton code, so each group
+    # is its own tree, framed by its own bounding square, whose root is node number group.
+    def __init__(self, points: np.ndarray, groups: Optional[np.ndarray] = None) -> None:
+        n = len(points)
+        if groups is None:
+            groups = np.zeros(n, dtype=np.int64)
+        count = int(groups.max()) + 1
+        low = np.full((count, 2), np.inf)
+        high = np.full((count, 2), -np.inf)
+        np.minimum.at(low, groups, points)
+        np.maximum.at(high, groups, points)
+        width = np.maximum((high - low).max(axis=1), 1e-9) * (1 + 1e-9)
+        cells = ((points - low[groups]) / width[groups, None] * (1 << DEPTH)).astype(np.int64)
+        np.clip(cells, 0, (1 << DEPTH) - 1, out=cells)
+        codes = (groups.astype(np.int64) << (2 * DEPTH)) | spread_bits(cells[:, 0]) | (spread_bits(cells[:, 1]) << 1)
+
+        order = np.argsort(codes, kind="stable")
+        self.order = order
+        codes = codes[order]
+        sums = np.zeros((n + 1, 2))
+        np.cumsum(points[order], axis=0, out=sums[1:])
+
+        levels = []
+        alive = np.ones(n, dtype=bool)
+        for level in range(DEPTH + 1):
+            keys = codes >> (2 * (DEPTH - level))
+            change = np.empty(n, dtype=bool)
+            change[0] = True
+            np.not_equal(keys[1:], keys[:-1], out=change[1:])
+            starts = np.flatnonzero(change)
+            ends = np.append(starts[1:], n)
+            # cells holding a single vertex were already leaves on an earlier level
+            keep = alive[starts]
+            starts = starts[keep]
+            ends = ends[keep]
+            levels.append((starts, ends))
+            split = ends - starts > 1
+            if level == DEPTH or not split.any():
+                break
+            delta = np.zeros(n + 1, dtype=np.int64)
+            np.add.at(delta, starts[split], 1)
+            np.add.at(delta, ends[split], -1)
+            alive = np.cumsum(delta[:n]) > 0
+
+        offsets = np.cumsum([0] + [len(starts) for starts, _ in levels])
+        child_lo = []
+        child_hi = []
+        for level, (starts, ends) in enumerate(levels):
+            lo = np.zeros(len(starts), dtype=np.int64)
+            hi = np.zeros(len(starts), dtype=np.int64)
+            if level + 1 < len(levels):
+                split = ends - starts > 1
+                below = levels[level + 1][0]
+                lo[split] = offsets[level + 1] + np.searchsorted(below, starts[split])
+                hi[split] = offsets[level + 1] + np.searchsorted(below, ends[split])
+            child_lo.append(lo)
+            child_hi.append(hi)
+
+        self.start = np.concatenate([starts for starts, _ in levels])
+        self.end = np.concatenate([ends for _, ends in levels])
+        self.child_lo = np.concatenate(child_lo)
+        self.child_hi = np.concatenate(child_hi)
+        self.leaf = self.child_lo == self.child_hi
+        self.mass = (self.end - self.start).astype(float)
+        self.centre = (sums[self.end] - sums[self.start]) / self.mass[:, None]
+        self.group = groups[order]
+        self.width = width[self.group[self.start]] / np.concatenate([np.full(len(starts), float(1 << level))
+                                                                     for level, (starts, _) in enumerate(levels)])
+        # vertices closer than the smallest cell count as coincident and don't push each other in any direction
+        self.resolution = width / (1 << DEPTH)
+
+    def repulsion(self, points: np.ndarray, theta: float = THETA) -> np.ndarray:
+        n = len(points)
+        forces = np.zeros((n, 2))
+        width2 = self.width ** 2 / (theta * theta)
+        # walking vertices in Morton order keeps each chunk in one corner of the tree, so the chunk opens few cells
+        for begin in range(0, n, CHUNK):
+            end = min(n, begin + CHUNK)
+            chunk = self.order[begin:end]
+            vertex = np.arange(end - begin)
+            node = self.group[begin:end].copy()
+            cutoff = self.resolution[node] ** 2
+            xs = points[chunk, 0]
+            ys = points[chunk, 1]
+            fx = np.zeros(end - begin)
+            fy = np.zeros(end - begin)
+            while len(vertex):
+                rank = vertex + begin
+                inside = (self.start[node] <= rank) & (rank < self.end[node])
+                dx = xs[vertex] - self.centre[node, 0]
+                dy = ys[vertex] - self.centre[node, 1]
+                accept = self.leaf[node] | (~inside & (width2[node] < dx * dx + dy * dy))
+
+                a_vertex = vertex[accept]
+                a_node = node[accept]
+                mass = self.mass[a_node]
+                ax = dx[accept]
+                ay = dy[accept]
+                own = inside[accept]
+                if own.any():
+                    # the rest of the leaf a vertex sits in pushes it, with the vertex itself taken out
+                    rest = mass[own] - 1
+                    safe = np.maximum(rest, 1)
+                    ox = (self.centre[a_node[own], 0] * mass[own] - xs[a_vertex[own]]) / safe
+                    oy = (self.centre[a_node[own], 1] * mass[own] - ys[a_vertex[own]]) / safe
+                    ax[own] = xs[a_vertex[own]] - ox
+                    ay[own] = ys[a_vertex[own]] - oy
+                    mass[own] = rest
+                a2 = ax * ax + ay * ay
+                close = a2 > cutoff[a_vertex]
+                weight = np.zeros(len(a2))
+                weight[close] = K2 * mass[close] / (a2[close] * np.sqrt(a2[close]))
+                fx += np.bincount(a_vertex, weight * ax, end - begin)
+                fy += np.bincount(a_vertex, weight * ay, end - begin)
+
+                e_vertex = vertex[~accept]
+                e_node = node[~accept]
+                counts = self.child_hi[e_node] - self.child_lo[e_node]
+                total = int(counts.sum())
+                firsts = np.repeat(np.cumsum(counts) - counts, counts)
+                vertex = np.repeat(e_vertex, counts)
+                node = np.repeat(self.child_lo[e_node], counts) + np.arange(total) - firsts
+            forces[chunk, 0] = fx
+            forces[chunk, 1] = fy
+        return forces
+
+
+def spring_forces(points: np.ndarray, heads: np.ndarray, tails: np.ndarray) -> np.ndarray:
+    n = len(points)
+    forces = np.zeros((n, 2))
+    if not len(heads):
+        return forces
+    diff = points[tails] - points[heads]
+    d = np.hypot(diff[:, 0], diff[:, 1])
+    scale = np.zeros(len(d))
+    apart = d > 0
+    scale[apart] = K1 * (d[apart] - D) / d[apart]
+    for axis in (0, 1):
+        pull = scale * diff[:, axis]
+        forces[:, axis] += np.bincount(heads, pull, n) - np.bincount(tails, pull, n)
+    return forces
+
+
+def initial_points(num_vertices: int) -> np.ndarray:
+    # a sunflower spiral: distinct positions about D / 2 apart, whatever the vertex count
+    i = np.arange(num_vertices)
+    r = D / 2 * np.sqrt(i)
+    angle = i * math.pi * (3 - math.sqrt(5))
+    return np.stack([r * np.cos(angle), r * np.sin(angle)], axis=1)
+
+
+def layout(points: np.ndarray, heads: np.ndarray, tails: np.ndarray,
+           max_iterations: int = MAX_ITERATIONS, time_budget: float = TIME_BUDGET, step: float = D,
+           groups: Optional[np.ndarray] = None, movable: Optional[np.ndarray] = None) -> int:
+    # moves points in place until no vertex feels a force over THRESHOLD, returning the iterations run; with movable,
+    # only those vertices move, and only their forces count towards stopping
+    iterations = 0
+    for iterations in layout_steps(points, heads, tails, max_iterations, time_budget, step, groups, movable):
+        pass
+    return iterations
+
+
+def layout_steps(points: np.ndarray, heads: np.ndarray, tails: np.ndarray,
+                 max_iterations: int = MAX_ITERATIONS, time_budget: float = TIME_BUDGET, step: float = D,
+                 groups: Optional[np.ndarray] = None, movable: Optional[np.ndarray] = None) -> Iterator[int]:
+    # layout, yielding the iterations run so far after every iteration; the time budget only counts while it runs
+    if len(points) < 2:
+        return
+    deadline = time.perf_counter() + time_budget
+    degree = np.bincount(heads, minlength=len(points)) + np.bincount(tails, minlength=len(points))
+    gain = 1 / (1 + 2 * K1 * degree)
+    if movable is not None:
+        gain = gain * movable
+    iterations = 0
+    while iterations < max_iterations and time.perf_counter() < deadline:
+        forces = QuadTree(points, groups).repulsion(points) + spring_forces(points, heads, tails)
+        iterations += 1
+        strength = (forces ** 2).sum(axis=1)
+        length = np.sqrt(strength) * gain
+        points += forces * (gain * np.minimum(1, step / np.maximum(length, 1e-12)))[:, None]
+        if (strength if movable is None else strength[movable]).max(initial=0) <= THRESHOLD:
+            yield iterations
+            return
+        step = max(step * COOLING, MIN_STEP)
+        paused = time.perf_counter()
+        yield iterations
+        deadline += time.perf_counter() - paused
+
+
+def coarsen(num_vertices: int, heads: np.ndarray, tails: np.ndarray,
+            rng: np.random.Generator) -> Tuple[np.ndarray, int]:
+    # Returns the coarse vertex of every vertex, and the coarse vertex count. Each round, every vertex picks the
+    # lowest priority edge to an unmatched neighbour, and edges picked from both ends become matches; the lowest edge
+    # overall always is, so every round makes progress. Unmatched leaves then join their neighbour, which is what
+    # shrinks stars and long paths that matching alone barely touches.
+    loops = heads == tails
+    heads = heads[~loops]
+    tails = tails[~loops]
+    vertices = np.arange(num_vertices)
+    matched = np.full(num_vertices, -1, dtype=np.int64)
+    priority = rng.random(len(heads))
+    src = np.concatenate([heads, tails])
+    dst = np.concatenate([tails, heads])
+    order = np.argsort(np.concatenate([priority, priority]), kind="stable")
+    src = src[order]
+    dst = dst[order]
+    for _ in range(MATCHING_ROUNDS):
+        free = (matched[src] < 0) & (matched[dst] < 0)
+        if not free.any():
+            break
+        chooser, first = np.unique(src[free], return_index=True)
+        choice = np.full(num_vertices, -1, dtype=np.int64)
+        choice[chooser] = dst[free][first]
+        mutual = np.flatnonzero((choice >= 0) & (choice[choice] == vertices) & (vertices < choice))
+        matched[mutual] = choice[mutual]
+        matched[choice[mutual]] = mutual
+
+    group = np.where(matched >= 0, np.minimum(vertices, matched), vertices)
+    degree = np.bincount(heads, minlength=num_vertices) + np.bincount(tails, minlength=num_vertices)
+    leaves = (degree == 1) & (matched < 0)
+    if leaves.any():
+        neighbour = np.zeros(num_vertices, dtype=np.int64)
+        neighbour[heads] = tails
+        neighbour[tails] = heads
+        group[leaves] = group[neighbour[leaves]]
+    _, parent = np.unique(group, return_inverse=True)
+    return parent.reshape(-1), int(parent.max()) + 1 if num_vertices else 0
+
+
+def coarse_edges(parent: np.ndarray, count: int, heads: np.ndarray, tails: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    a = parent[heads]
+    b = parent[tails]
+    keys = np.unique(np.minimum(a, b) * count + np.maximum(a, b))
+    a, b = np.divmod(keys, count)
+    kept = a != b
+    return a[kept], b[kept]
+
+
+def multilevel(num_vertices: int, heads: np.ndarray, tails: np.ndarray,
+               max_iterations: int = MAX_ITERATIONS, time_budget: float = TIME_BUDGET) -> Tuple[np.ndarray, int]:
+    # coarsen until the graph is small, lay that out in full, then project each level back down and refine it
+    deadline = time.perf_counter() + time_budget
+    rng = np.random.default_rng(0)
+    levels = []
+    count = num_vertices
+    while count > COARSEST:
+        parent, coarse = coarsen(count, heads, tails, rng)
+        if coarse > count * MIN_SHRINK:
+            break
+        levels.append((parent, count, heads, tails))
+        heads, tails = coarse_edges(parent, coarse, heads, tails)
+        count = coarse
+
+    points = initial_points(count)
+    iterations = layout(points, heads, tails, max_iterations, deadline - time.perf_counter())
+    for parent, count, heads, tails in reversed(levels):
+        # a finer level has more vertices to fit in, so spread the coarse layout out with the area it needs
+        scale = math.sqrt(count / len(points))
+        points = points[parent] * scale + rng.normal(scale=D / 10, size=(count, 2))
+        iterations += layout(points, heads, tails, min(max_iterations, REFINE_ITERATIONS),
+                             deadline - time.perf_counter(), D / 4)
+    return points, iterations
+
+
+def layout_points(num_vertices: int, heads: np.ndarray, tails: np.ndarray, mode: str = DEFAULT_MODE,
+                  max_iterations: int = MAX_ITERATIONS, time_budget: float = TIME_BUDGET) -> Tuple[np.ndarray, int]:
+    if mode == "multilevel":
+        return multilevel(num_vertices, heads, tails, max_iterations, time_budget)
+    points = initial_points(num_vertices)
+    return points, layout(points, heads, tails, max_iterations, time_budget)
+
+
+def components(num_vertices: int, heads: np.ndarray, tails: np.ndarray) -> Tuple[np.ndarray, int]:
+    # hooks every root under the smallest root it shares an edge with, then flattens, until nothing changes
+    label = np.arange(num_vertices)
+    while True:
+        a = label[heads]
+        b = label[tails]
+        low = np.minimum(a, b)
+        hooked = label.copy()
+        np.minimum.at(hooked, a, low)
+        np.minimum.at(hooked, b, low)
+        while True:
+            flat = hooked[hooked]
+            if np.array_equal(flat, hooked):
+                break
+            hooked = flat
+        if np.array_equal(hooked, label):
+            break
+        label = hooked
+    _, label = np.unique(label, return_inverse=True)
+    return label.reshape(-1), int(label.max()) + 1 if num_vertices else 0
+
+
+def layout_job(sizes: List[int], heads: np.ndarray, tails: np.ndarray, mode: str, max_iterations: int,
+               time_budget: float) -> Tuple[np.ndarray, int]:
+    # one large component, or a batch of small ones numbered one after another; runs in the worker processes
+    if len(sizes) == 1 and sizes[0] > SMALL_COMPONENT:
+        return layout_points(sizes[0], heads, tails, mode, max_iterations, time_budget)
+    points = np.concatenate([initial_points(size) for size in sizes])
+    groups = np.repeat(np.arange(len(sizes)), sizes)
+    return points, layout(points, heads, tails, max_iterations, time_budget, groups=groups)
+
+
+pool = None
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global pool
+    if pool is None:
+        pool = ProcessPoolExecutor(WORKERS)
+    return pool
+
+
+def pack(layouts: List[np.ndarray]) -> List[np.ndarray]:
+    # shelf packing: tallest boxes first, left to right along rows about as wide as the whole packing is tall
+    low = [points.min(axis=0) for points in layouts]
+    boxes = [points.max(axis=0) - corner + D for points, corner in zip(layouts, low)]
+    limit = max(max(box[0] for box in boxes), math.sqrt(sum(box[0] * box[1] for box in boxes)))
+    out = [None] * len(layouts)
+    x = y = shelf = 0
+    for i in sorted(range(len(layouts)), key=lambda i: -boxes[i][1]):
+        if x and x + boxes[i][0] > limit:
+            y += shelf
+            x = shelf = 0
+        out[i] = layouts[i] - low[i] + (x, y)
+        x += boxes[i][0]
+        shelf = max(shelf, boxes[i][1])
+    return out
+
+
+def place(num_vertices: int, heads: np.ndarray, tails: np.ndarray, mode: str = DEFAULT_MODE,
+          max_iterations: int = MAX_ITERATIONS, time_budget: float = TIME_BUDGET,
+          parallel: Optional[bool] = None) -> Tuple[np.ndarray, int]:
+    # lays every connected component out on its own and packs the results side by side, returning the most
+    # iterations any of the layouts took
+    label, count = components(num_vertices, heads, tails)
+    if count == 1:
+        return layout_points(num_vertices, heads, tails, mode, max_iterations, time_budget)
+
+    # renumber vertices and edges component by component, each component counting its vertices from 0
+    sizes = np.bincount(label, minlength=count)
+    starts = np.cumsum(sizes) - sizes
+    order = np.argsort(label, kind="stable")
+    local = np.empty(num_vertices, dtype=np.int64)
+    local[order] = np.arange(num_vertices) - np.repeat(starts, sizes)
+    edge_label = label[heads]
+    edge_order = np.argsort(edge_label, kind="stable")
+    edge_counts = np.bincount(edge_label, minlength=count)
+    edge_starts = np.cumsum(edge_counts) - edge_counts
+    local_heads = local[heads[edge_order]]
+    local_tails = local[tails[edge_order]]
+
+    jobs = []
+    batch = []
+    batch_vertices = 0
+    for component in range(count):
+        size = int(sizes[component])
+        if size > SMALL_COMPONENT:
+            jobs.append([component])
+            continue
+        batch.append(component)
+        batch_vertices += size
+        if batch_vertices >= BATCH_VERTICES:
+            jobs.append(batch)
+            batch = []
+            batch_vertices = 0
+    if batch:
+        jobs.append(batch)
+
+    if parallel is None:
+        parallel = num_vertices >= PARALLEL_THRESHOLD and len(jobs) > 1 and WORKERS > 1
+    workers = WORKERS if parallel else 1
+    tasks = []
+    for job in jobs:
+        job_sizes = [int(sizes[component]) for component in job]
+        job_heads = []
+        job_tails = []
+        offset = 0
+        for component, size in zip(job, job_sizes):
+            edges = slice(edge_starts[component], edge_starts[component] + edge_counts[component])
+            job_heads.append(local_heads[edges] + offset)
+            job_tails.append(local_tails[edges] + offset)
+            offset += size
+        # every job gets the share of the budget its vertices would get if the workers split them evenly
+        budget = time_budget * min(1.0, workers * offset / num_vertices)
+        tasks.append((job_sizes, np.concatenate(job_heads), np.concatenate(job_tails), mode, max_iterations, budget))
+    if parallel:
+        results = list(get_pool().map(layout_job, *zip(*tasks)))
+    else:
+        results = [layout_job(*task) for task in tasks]
+
+    layouts = [None] * count
+    for job, (points, _) in zip(jobs, results):
+        offset = 0
+        for component in job:
+            layouts[component] = points[offset:offset + sizes[component]]
+            offset += sizes[component]
+    packed = np.concatenate(pack(layouts))
+    points = np.empty((num_vertices, 2))
+    points[order] = packed
+    return points, max(iterations for _, iterations in results)
+
+
+class CachedLayout:
+    def __init__(self, names: List[str], points: np.ndarray, heads: np.ndarray, tails: np.ndarray,
+                 iterations: int) -> None:
+        self.names = names
+        self.points = points
+        self.heads = heads
+        self.tails = tails
+        # what laying this graph out from scratch took, which warm starts from it are measured against
+        self.iterations = iterations
+
+    def nbytes(self) -> int:
+        return self.points.nbytes + self.heads.nbytes + self.tails.nbytes + sum(49 + len(name) for name in self.names)
+
+
+# finished layouts keyed by mode, vertex names and edges, before they are scaled into the canvas
+layout_cache = cache.LRUCache(LAYOUT_CACHE_ENTRIES, LAYOUT_CACHE_BYTES, lambda layout: layout.nbytes())
+# the key of the latest layout made under each context, such as an input format, for edited graphs to start from
+latest_layouts = cache.LRUCache(LAYOUT_CACHE_ENTRIES)
+warm_stats = {"warm_starts": 0, "iterations_saved": 0}
+warm_stats_lock = threading.Lock()
+
+
+def layout_key(names: List[str], heads: np.ndarray, tails: np.ndarray, mode: str) -> str:
+    # edges are compared as unordered pairs of names, so renumbering or reordering the input keeps the key
+    distinct, rank = np.unique(np.array(names), return_inverse=True)
+    rank = rank.reshape(-1)
+    a = rank[heads]
+    b = rank[tails]
+    pairs = np.sort(np.minimum(a, b) * len(distinct) + np.maximum(a, b))
+    return cache.fingerprint(mode, "\n".join(sorted(names)), pairs.astype("<i8").tobytes())
+
+
+def warm_start(previous: CachedLayout, names: List[str], heads: np.ndarray, tails: np.ndarray,
+               max_iterations: int = MAX_ITERATIONS,
+               time_budget: float = TIME_BUDGET) -> Optional[Tuple[np.ndarray, int]]:
+    # returns None when no name carries over
+    deadline = time.perf_counter() + time_budget
+    seed = warm_seed(previous, names, heads, tails)
+    if seed is None:
+        return None
+    points, movable = seed
+    groups, _ = components(len(names), heads, tails)
+    iterations = layout(points, heads, tails, min(max_iterations, LOCAL_ITERATIONS), deadline - time.perf_counter(),
+                        D / 4, groups, movable)
+    iterations += layout(points, heads, tails, min(max_iterations, SETTLE_ITERATIONS),
+                         deadline - time.perf_counter(), MIN_STEP, groups)
+    return points, iterations
+
+
+def warm_seed(previous: CachedLayout, names: List[str], heads: np.ndarray,
+              tails: np.ndarray) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    # starts every vertex whose name was laid out before where it was, returning the points and which vertices are
+    # near a change, or None when no name carries over
+    index = {name: i for i, name in enumerate(previous.names)}
+    old = np.array([index.get(name, -1) for name in names], dtype=np.int64)
+    known = old >= 0
+    if not known.any():
+        return None
+    n = len(names)
+
+    # the neighbourhood of a vertex changed if it is new, or gained or lost an edge
+    m = len(previous.names)
+    new_keys = np.where((old[heads] >= 0) & (old[tails] >= 0),
+                        np.minimum(old[heads], old[tails]) * m + np.maximum(old[heads], old[tails]), -1)
+    old_keys = np.minimum(previous.heads, previous.tails) * m + np.maximum(previous.heads, previous.tails)
+    added = ~np.isin(new_keys, old_keys)
+    removed = ~np.isin(old_keys, new_keys)
+    changed = ~known
+    changed[heads[added]] = True
+    changed[tails[added]] = True
+    renumber = np.full(m, -1, dtype=np.int64)
+    renumber[old[known]] = np.flatnonzero(known)
+    for column in (previous.heads[removed], previous.tails[removed]):
+        moved = renumber[column]
+        changed[moved[moved >= 0]] = True
+    movable = changed.copy()
+    movable[heads[changed[tails]]] = True
+    movable[tails[changed[heads]]] = True
+
+    # new vertices start beside their placed neighbours, a ring at a time; any left over start beside the layout
+    points = np.zeros((n, 2))
+    points[known] = previous.points[old[known]]
+    placed = known.copy()
+    rng = np.random.default_rng(0)
+    while not placed.all():
+        counts = np.bincount(heads, placed[tails], n) + np.bincount(tails, placed[heads], n)
+        ready = ~placed & (counts > 0)
+        if not ready.any():
+            break
+        for axis in (0, 1):
+            total = np.bincount(heads, points[tails, axis] * placed[tails], n) + \
+                np.bincount(tails, points[heads, axis] * placed[heads], n)
+            points[ready, axis] = total[ready] / counts[ready]
+        points[ready] += rng.normal(scale=D / 10, size=(int(ready.sum()), 2))
+        placed |= ready
+    if not placed.all():
+        spiral = initial_points(int((~placed).sum()))
+        corner = points[placed].max(axis=0)
+        points[~placed] = spiral - spiral.min(axis=0) + (corner[0] + D, points[placed, 1].min())
+    return points, movable
+
+
+def cached_position(names: List[str], edges: List[Tuple[int, int]], mode: str = DEFAULT_MODE, context: str = "",
+                    max_iterations: int = MAX_ITERATIONS,
+                    time_budget: float = TIME_BUDGET) -> Tuple[List[Vertex], Dict[str, Any]]:
+    ends = np.array(edges, dtype=np.int64).reshape(-1, 2)
+    points, report = cached_points(names, ends[:, 0], ends[:, 1], mode, context, max_iterations, time_budget)
+    return [Vertex(x, y) for x, y in points.tolist()], report
+
+
+def cached_points(names: List[str], heads: np.ndarray, tails: np.ndarray, mode: str = DEFAULT_MODE, context: str = "",
+                  max_iterations: int = MAX_ITERATIONS,
+                  time_budget: float = TIME_BUDGET) -> Tuple[np.ndarray, Dict[str, Any]]:
+    # canvas coordinates, one row per vertex, reusing the layout of the same graph or warm starting from the latest
+    # layout made under context
+    if mode not in MODES:
+        raise Exception("Unknown layout mode!", mode)
+    report = {"warm": False, "iterations": 0, "saved": 0}
+    if not names:
+        return np.zeros((0, 2), dtype=np.int64), report
+    heads = np.asarray(heads, dtype=np.int64)
+    tails = np.asarray(tails, dtype=np.int64)
+    key = layout_key(names, heads, tails, mode)
+
+    cached = layout_cache.get(key)
+    if cached is not None:
+        points = cached_order(cached, names)
+        report.update(warm=True, saved=cached.iterations)
+    else:
+        previous = previous_layout(context)
+        warm = None
+        if previous is not None:
+            warm = warm_start(previous, names, heads, tails, max_iterations, time_budget)
+        if warm is not None:
+            points, iterations = warm
+            baseline = previous.iterations
+            report.update(warm=True, iterations=iterations, saved=max(0, baseline - iterations))
+        else:
+            points, iterations = place(len(names), heads, tails, mode, max_iterations, time_budget)
+            baseline = iterations
+            report.update(iterations=iterations)
+        layout_cache.put(key, CachedLayout(list(names), points.copy(), heads, tails, baseline))
+    remember(context, key, report)
+    return scale(points), report
+
+
+def stream_points(names: List[str], heads: np.ndarray, tails: np.ndarray, mode: str = DEFAULT_MODE,
+                  context: str = "", every: int = STREAM_EVERY, cancelled: Optional[threading.Event] = None,
+                  max_iterations: int = MAX_ITERATIONS,
+                  time_budget: float = STREAM_TIME_BUDGET) -> Iterator[Tuple[np.ndarray, Dict[str, Any]]]:
+    # Canvas coordinates as the layout goes: where it starts, then every `every` iterations, then where it ends, each
+    # with a report like cached_points gives plus whether it is the last. The layout runs as one force simulation
+    # over the whole graph, from a cached layout, a warm start or the spiral, whatever the mode, so it is cached as a
+    # streamed layout rather than one in the mode; only finished layouts are cached, so setting cancelled or closing
+    # the iterator just stops it.
+    if mode not in MODES:
+        raise Exception("Unknown layout mode!", mode)
+    report = {"warm": False, "iterations": 0, "saved": 0, "done": False}
+    heads = np.asarray(heads, dtype=np.int64)
+    tails = np.asarray(tails, dtype=np.int64)
+    if not names:
+        report["done"] = True
+        yield np.zeros((0, 2), dtype=np.int64), report
+        return
+    # one made in the mode does as well as a streamed one
+    key = layout_key(names, heads, tails, mode)
+    cached = layout_cache.get(key)
+    if cached is None:
+        key = layout_key(names, heads, tails, STREAM_MODE)
+        cached = layout_cache.get(key)
+    if cached is not None:
+        report.update(warm=True, saved=cached.iterations, done=True)
+        remember(context, key, report)
+        yield scale(cached_order(cached, names)), report
+        return
+    previous = previous_layout(context)
+    seed = None
+    if previous is not None:
+        seed = warm_seed(previous, names, heads, tails)
+    if seed is not None:
+        points, movable = seed
+        groups, _ = components(len(names), heads, tails)
+        phases = [(min(max_iterations, LOCAL_ITERATIONS), D / 4, groups, movable),
+                  (min(max_iterations, SETTLE_ITERATIONS), MIN_STEP, groups, None)]
+        report["warm"] = True
+    else:
+        points = initial_points(len(names))
+        phases = [(max_iterations, D, None, None)]
+    yield scale(points), dict(report)
+
+    deadline = time.perf_counter() + time_budget
+    iterations = 0
+    for phase_iterations, step, groups, movable in phases:
+        done = iterations
+        for run in layout_steps(points, heads, tails, phase_iterations, deadline - time.perf_counter(), step, groups,
+                                movable):
+            iterations = done + run
+            if cancelled is not None and cancelled.is_set():
+                return
+            if iterations % every == 0:
+                report["iterations"] = iterations
+                paused = time.perf_counter()
+                yield scale(points), dict(report)
+                deadline += time.perf_counter() - paused
+
+    baseline = previous.iterations if seed is not None else iterations
+    report.update(iterations=iterations, saved=max(0, baseline - iterations) if seed is not None else 0, done=True)
+    layout_cache.put(key, CachedLayout(list(names), points.copy(), heads, tails, baseline))
+    remember(context, key, report)
+    yield scale(points), report
+
+
+def cached_order(cached: CachedLayout, names: List[str]) -> np.ndarray:
+    index = {name: i for i, name in enumerate(cached.names)}
+    return cached.points[[index[name] for name in names]]
+
+
+def previous_layout(context: str) -> Optional[CachedLayout]:
+    previous_key = latest_layouts.get(context)
+    if previous_key is None:
+        return None
+    return layout_cache.get(previous_key)
+
+
+def remember(context: str, key: str, report: Dict[str, Any]) -> None:
+    latest_layouts.put(context, key)
+    if report["warm"]:
+        with warm_stats_lock:
+            warm_stats["warm_starts"] += 1
+            warm_stats["iterations_saved"] += report["saved"]
+
+
+def get_layout_stats() -> Dict[str, int]:
+    stats = layout_cache.stats()
+    with warm_stats_lock:
+        stats.update(warm_stats)
+    return stats
+
+
+def position(num_vertices: int, edges: List[Tuple[int, int]], mode: str = DEFAULT_MODE,
+             max_iterations: int = MAX_ITERATIONS, time_budget: float = TIME_BUDGET) -> List[Vertex]:
+    if mode not in MODES:
+        raise Exception("Unknown layout mode!", mode)
+    if not num_vertices:
+        return []
+    ends = np.array(edges, dtype=np.int64).reshape(-1, 2)
+    points, _ = place(num_vertices, ends[:, 0], ends[:, 1], mode, max_iterations, time_budget)
+    return [Vertex(x, y) for x, y in scale(points).tolist()]
+
 
-def dist(v1: Vertex, v2: Vertex) -> float:
-    return ((v2.x - v1.x) ** 2 + (v2.y - v1.y) ** 2) ** (1 / 2)
-
-
-def position(num_vertices: int, edges: List[Tuple[int, int]]) -> List[Vertex]:
-    vertices = [Vertex(100 + i ** 2, 100 * i) for i in range(num_vertices)]
-
-    bigMove = False  # True
-    while bigMove:
-        bigMove = False
-        forces = [Force(0, 0) for _ in range(num_vertices)]
-        for edge in edges:
-            for (a, b) in [(edge[0], edge[1]), (edge[1], edge[0])]:
-                d = dist(vertices[a], vertices[b])
-                F = K1 * (d - D)
-                forces[a].fx += F * (vertices[b].x - vertices[a].x) / d
-                forces[a].fy += F * (vertices[b].y - vertices[a].y) / d
-        for i, v1 in enumerate(vertices):
-            for j, v2 in enumerate(vertices):
-                if v1 == v2:
-                    continue
-                forces[i].fx += K2 / (dist(v1, v2) ** 3) * (v1.x - v2.x)
-                forces[i].fy += K2 / (dist(v1, v2) ** 3) * (v1.y - v2.y)
-                forces[j].fx += K2 / (dist(v1, v2) ** 3) * (v2.x - v1.x)
-                forces[j].fy += K2 / (dist(v1, v2) ** 3) * (v2.y - v1.y)
-        for i, force in enumerate(forces):
-            if force.fx ** 2 + force.fy ** 2 > THRESHOLD:
-                bigMove = True
-            vertices[i].x += force.fx
-            vertices[i].y += force.fy
-
-    minX = min(v.x for v in vertices)
-    maxX = max(v.x for v in vertices)
-    minY = min(v.y for v in vertices)
-    maxY = max(v.y for v in vertices)
-
-    print(minX, minY, maxX, maxY)
-
-    for i, vertex in enumerate(vertices):
-        vertices[i] = Vertex(int(MARGIN / 2 + (vertex.x - minX) / (maxX - minX) * XHEIGHT),
-                             int(MARGIN / 2 + (vertex.y - minY) / (maxY - minY) * YHEIGHT))
-
-    return vertices
+def scale(points: np.ndarray) -> np.ndarray:
+    minX, minY = points.min(axis=0)
+    maxX, maxY = points.max(axis=0)
+    xs = MARGIN / 2 + (points[:, 0] - minX) / ((maxX - minX) or 1) * XHEIGHT
+    ys = MARGIN / 2 + (points[:, 1] - minY) / ((maxY - minY) or 1) * YHEIGHT
+    return np.stack([xs, ys], axis=1).astype(np.int64)
@@ -3,12 +3,74 @@
 from __future__ import annotations
 
 import json
-from typing import Dict, Any, List, Tuple
+import os
+import struct
+import multiprocessing
+import threading
+import time
+import uuid
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby
+from typing import Dict, Any, List, Tuple, Union, Iterator, Optional
 
+import numpy as np
+
+import analysis
+import cache
+import cases
 import compile
 import draw_graph
 import execute
-import parse
+import lower
+import metrics
+import parse_gen
+import profiler
+import testdata
+import token_source
+
+
+PROGRAM_CACHE_ENTRIES = cache.setting("PROGRAM_CACHE_ENTRIES", 128)
+RESULT_CACHE_ENTRIES = cache.setting("RESULT_CACHE_ENTRIES", 4096)
+RESULT_CACHE_BYTES = cache.setting("RESULT_CACHE_BYTES", 64 * 1024 * 1024)
+
+DEFAULT_BACKEND = "closures"
+
+WIRE_FORMATS = ("json", "binary")
+DEFAULT_WIRE_FORMAT = "json"
+JSON_TYPE = "application/json"
+COLUMNAR_TYPE = "application/x-graphvis-columnar"
+
+# The binary format is the magic, the length of a JSON header as a little-endian uint32, the header itself padded with
+# spaces to a multiple of 4 bytes, then the columns the header lists. Each column is a packed little-endian typed array
+# starting on a multiple of 4 bytes, at an offset counted from the end of the header.
+COLUMNAR_MAGIC = b"GVC1"
+
+MAX_BATCH = 256
+# vertices and edges over all the test cases of one generated data set, and tokens written for it; the data goes into a
+# textarea on the page, and an edge is two tokens
+MAX_GENERATED = 10 ** 6
+MAX_GENERATED_TOKENS = 2 * 10 ** 6
+BATCH_WORKERS = os.cpu_count() or 1
+
+# batch workers are forked after the format is compiled, so they inherit it from program_cache instead of compiling it
+# again; elsewhere each worker compiles it once
+if "fork" in multiprocessing.get_all_start_methods():
+    batch_context = multiprocessing.get_context("fork")
+else:
+    batch_context = multiprocessing.get_context()
+
+# the cancel flags of the layout streams running, by stream id
+streams = {}
+streams_lock = threading.Lock()
+
+# print every response as it is built
+DEBUG = bool(os.environ.get("GRAPHVIS_DEBUG"))
+
+# compiled ASTs keyed by the format text; Execute never mutates an AST, so they are safe to share
+program_cache = cache.LRUCache(PROGRAM_CACHE_ENTRIES)
+# finished responses keyed by (format, data, wire format); JSON responses are ASCII so len() is their size in bytes
+result_cache = cache.LRUCache(RESULT_CACHE_ENTRIES, RESULT_CACHE_BYTES, len)
 
 
 def build_vertex(name: str, position: draw_graph.Vertex, single_attrs: Dict[str, str] = {}, mult_attrs={}):
@@ -19,23 +81,65 @@ def build_edge(a: int, b: int, directed: bool, single_attrs: Dict[str, str] = {}
     return {"directed": directed, "head": a, "tail": b, "single_attrs": single_attrs, "mult_attrs": mult_attrs}
 
 
-def get_graph(graph: execute.Graph) -> Dict[str, Any]:
+def get_graph(graph: execute.Graph, mode: str = draw_graph.DEFAULT_MODE, context: str = "") -> Dict[str, Any]:
     out = {"vertices": [], "edges": []}
 
-    vlookup = {}
+    names, heads, tails, points, out["layout"] = layout_graph(graph, mode, context)
 
-    for i, vertex in enumerate(graph.vertices):
-        vlookup[vertex.id] = i
+    for name, (x, y) in zip(names, points.tolist()):
+        out["vertices"].append(build_vertex(name, draw_graph.Vertex(x, y)))
 
-    positions = draw_graph.position(len(graph.vertices), [(vlookup[edge.a], vlookup[edge.b]) for edge in graph.edges])
+    for a, b in zip(heads, tails):
+        out["edges"].append(build_edge(a, b, False))
 
-    for i, vertex in enumerate(graph.vertices):
-        out["vertices"].append(build_vertex(vertex.id, positions[i]))
+    return out
 
-    for edge in graph.edges:
-        out["edges"].append(build_edge(vlookup[edge.a], vlookup[edge.b], False))
 
-    return out
+def layout_graph(graph: execute.Graph, mode: str,
+                 context: str) -> Tuple[List[str], array, array, np.ndarray, Dict[str, Any]]:
+    # layouts are cached by vertex names, and an edited graph starts from the latest layout made in the same context
+    names, heads, tails = graph_structure(graph)
+    metrics.size("vertices", len(names))
+    metrics.size("edges", len(heads))
+    with metrics.stage("layout"):
+        points, report = draw_graph.cached_points(names, np.frombuffer(heads, dtype=np.intc),
+                                                  np.frombuffer(tails, dtype=np.intc), mode, context)
+    return names, heads, tails, points, report
+
+
+def graph_structure(graph: execute.Graph) -> Tuple[List[str], array, array]:
+    heads, tails = graph.edge_vertex_indices()
+    return [graph.names[name_id] for name_id in graph.vertex_names], heads, tails
+
+
+def get_columnar_graph(graph: execute.Graph, mode: str = draw_graph.DEFAULT_MODE,
+                       context: str = "") -> Tuple[Dict[str, Any], List[Tuple[str, np.ndarray]]]:
+    # the graph as a small header plus one column per field, names being UTF-8 bytes split by a column of offsets
+    names, heads, tails, points, report = layout_graph(graph, mode, context)
+    encoded = [name.encode("utf-8") for name in names]
+    name_offsets = np.zeros(len(encoded) + 1, dtype="<u4")
+    np.cumsum([len(name) for name in encoded], out=name_offsets[1:])
+    columns = [("x", points[:, 0].astype("<i4")), ("y", points[:, 1].astype("<i4")),
+               ("head", np.frombuffer(heads, dtype=np.intc).astype("<i4")),
+               ("tail", np.frombuffer(tails, dtype=np.intc).astype("<i4")),
+               ("name_offsets", name_offsets), ("names", np.frombuffer(b"".join(encoded), dtype=np.uint8))]
+    header = {"vertices": len(names), "edges": len(heads), "directed": False, "layout": report}
+    return header, columns
+
+
+def pack_columnar(header: str, columns: List[Tuple[str, np.ndarray]]) -> bytes:
+    # header is JSON text for an object, which gets a "columns" entry describing where each column is
+    layout = []
+    body = []
+    offset = 0
+    for name, column in columns:
+        data = column.tobytes()
+        layout.append({"name": name, "type": column.dtype.name, "offset": offset, "length": len(column)})
+        body.append(data + b"\0" * (-len(data) % 4))
+        offset += len(body[-1])
+    encoded = (header[:-1] + ', "columns": ' + json.dumps(layout) + "}").encode("utf-8")
+    encoded += b" " * (-len(encoded) % 4)
+    return COLUMNAR_MAGIC + struct.pack("<I", len(encoded)) + encoded + b"".join(body)
 
 
 def get_vargraph(root: execute.Root) -> Dict[compile.VarName, List[compile.VarName]]:
@@ -45,45 +149,393 @@ def get_vargraph(root: execute.Root) -> Dict[compile.VarName, List[compile.VarNa
     return out
 
 
-# I'm so sorry about the variable names I genuinely thought they were understandable
-def get_varvals(root: execute.Root) -> Dict[compile.VarName, Dict[Tuple[int], int]]:
-    out = {}
+def get_varvals(root: execute.Root) -> str:
+    # written as JSON text straight from each variable's value arrays, without building nested dicts first
+    parts = []
     for var_name, var in root.values.items():
-        if isinstance(next(iter(var.values.values())), execute.Graph):
+        if isinstance(var.values.data[0], execute.Graph):
             continue
-        var: execute.Variable
-        if var_name not in out:
-            out[var_name] = {}
-        for vals, value in var.values.items():
-            prev = None
-            curr = out[var_name]
-            for val in vals:
-                if val not in curr:
-                    curr[val] = {}
-                prev, curr = curr, curr[val]
-            if prev is None:
-                out[var_name] = var.values[tuple()]
+        parts.append(json.dumps(var_name) + ": " + get_varval(var.values))
+    return "{" + ", ".join(parts) + "}"
+
+
+def get_varval(values: Union[execute.LoopValues, execute.KeyedValues]) -> str:
+    if isinstance(values, execute.KeyedValues):
+        return json.dumps(nest_keys(values))
+    if not values.depth:
+        return dump_value(values.data[0])
+    if values.ordered:
+        return nest_rows(values, 0, len(values.starts), 0)
+    items = nested_order(list(values.items()), values.depth)
+    return nest_values(iter(items), 0, values.depth)
+
+
+def nest_keys(values: execute.KeyedValues) -> Any:
+    # nested dicts built key by key, where a value under fewer counters replaces whatever was nested there
+    out = {}
+    for key, value in values.items():
+        if not key:
+            out = value
+            continue
+        if not isinstance(out, dict):
+            out = {}
+        level = out
+        for counter in key[:-1]:
+            if not isinstance(level.get(counter), dict):
+                level[counter] = {}
+            level = level[counter]
+        level[key[-1]] = value
+    return out
+
+
+def nest_rows(values: execute.LoopValues, lo: int, hi: int, level: int) -> str:
+    # rows lo..hi - 1 share their first level counters, and rows are in key order
+    parts = []
+    if level == values.depth - 1:
+        for row in range(lo, hi):
+            row_values = values.data[values.offsets[row]:values.offsets[row + 1]]
+            parts.extend('"' + str(i) + '": ' + dump_value(value)
+                         for i, value in enumerate(row_values, values.starts[row]))
+        return "{" + ", ".join(parts) + "}"
+    column = values.prefixes[level]
+    row = lo
+    while row < hi:
+        end = row + 1
+        while end < hi and column[end] == column[row]:
+            end += 1
+        parts.append('"' + str(column[row]) + '": ' + nest_rows(values, row, end, level + 1))
+        row = end
+    return "{" + ", ".join(parts) + "}"
+
+
+def nested_order(items: List[Tuple[Tuple[int, ...], execute.VarVal]],
+                 depth: int) -> List[Tuple[Tuple[int, ...], execute.VarVal]]:
+    # nested dicts list each level's counters in order of first appearance, which sorting by counter can't reproduce
+    first = {}
+    ranks = []
+    for i, (key, _) in enumerate(items):
+        ranks.append(tuple(first.setdefault(key[:level + 1], i) for level in range(depth)))
+    return [items[i] for i in sorted(range(len(items)), key=ranks.__getitem__)]
+
+
+def nest_values(items: Iterator[Tuple[Tuple[int, ...], execute.VarVal]], level: int, depth: int) -> str:
+    parts = []
+    for counter, group in groupby(items, key=lambda item: item[0][level]):
+        if level == depth - 1:
+            inner = dump_value(next(group)[1])
+        else:
+            inner = nest_values(group, level + 1, depth)
+        parts.append('"' + str(counter) + '": ' + inner)
+    return "{" + ", ".join(parts) + "}"
+
+
+def dump_value(value: execute.VarVal) -> str:
+    if type(value) is int:
+        return str(value)
+    return json.dumps(value)
+
+
+class Program:
+    def __init__(self, ast: List[compile.Statement]) -> None:
+        self.ast = ast
+        self.lowered = lower.lower_statements(ast)
+        # formats ending in test cases run through a plan of their own instead
+        self.cases = cases.CasePlan(ast) if compile.split_cases(ast)[1] is not None else None
+
+    def execute(self, source: Union[str, token_source.TokenSource], backend: str = DEFAULT_BACKEND) -> execute.Root:
+        if backend == "interpreter":
+            return execute.Execute(self.ast, source).get_data()
+        elif backend == "closures":
+            return lower.ClosureExecute(self.ast, source, self.lowered).get_data()
+        else:
+            raise Exception("Unknown backend!", backend)
+
+    def execute_cases(self, source: Union[str, token_source.TokenSource],
+                      backend: str = DEFAULT_BACKEND) -> List[execute.Root]:
+        return cases.run_cases(self.cases, source, backend)
+
+    def profile(self, source: Union[str, token_source.TokenSource]) -> Tuple[execute.Root, profiler.Profiler]:
+        # always through the interpreter, which runs the statements one by one
+        stats = profiler.Profiler()
+        return execute.Execute(self.ast, source, profile=stats).get_data(), stats
+
+
+def get_program(program: str) -> Program:
+    key = cache.fingerprint(program)
+    compiled = program_cache.get(key)
+    if compiled is None:
+        with metrics.stage("compile"):
+            parse_tree = parse_gen.parse_generated(program)
+            compiled = Program(compile.compile_tree(parse_tree))
+        program_cache.put(key, compiled)
+    return compiled
+
+
+def has_cases(program: str) -> bool:
+    # test cases only fit in JSON responses, so a client that takes either gets JSON for them
+    return get_program(program).cases is not None
+
+
+def get_cache_stats() -> Dict[str, Dict[str, int]]:
+    return {"programs": program_cache.stats(), "results": result_cache.stats(),
+            "layouts": draw_graph.get_layout_stats(), "indexes": analysis.index_cache.stats(),
+            "overlays": analysis.overlay_cache.stats()}
+
+
+def get_data(program: str, string: str, backend: str = DEFAULT_BACKEND, mode: str = draw_graph.DEFAULT_MODE,
+             wire: str = DEFAULT_WIRE_FORMAT, profile: bool = False) -> Union[str, bytes]:
+    # profiles are timings of this one run, so they skip the cache
+    if profile:
+        return build_data(program, string, backend, mode, wire, profile)
+    key = cache.fingerprint(program, string, backend, mode, wire)
+    result = result_cache.get(key)
+    if result is None:
+        result = build_data(program, string, backend, mode, wire)
+        result_cache.put(key, result)
+    return result
+
+
+def get_data_from_file(program: str, path: str, backend: str = DEFAULT_BACKEND,
+                       mode: str = draw_graph.DEFAULT_MODE, wire: str = DEFAULT_WIRE_FORMAT,
+                       profile: bool = False) -> Union[str, bytes]:
+    # uploads skip the result cache, since hashing them would cost as much as reading them
+    with token_source.MappedTokens(path) as tokens:
+        return build_data(program, tokens, backend, mode, wire, profile)
+
+
+def build_data(program: str, source: Union[str, token_source.TokenSource], backend: str = DEFAULT_BACKEND,
+               mode: str = draw_graph.DEFAULT_MODE, wire: str = DEFAULT_WIRE_FORMAT,
+               profile: bool = False) -> Union[str, bytes]:
+    # with profile, the response also gets the statements of the format ranked by the time spent in them
+    if wire not in WIRE_FORMATS:
+        raise Exception("Unknown wire format!", wire)
+
+    compiled = get_program(program)
+    if compiled.cases is not None:
+        if profile:
+            raise Exception("Profiling doesn't support test cases!")
+        if wire == "binary":
+            raise Exception("Binary responses can't hold test cases!")
+        out = cases_json(compiled, program, source, backend, mode)
+    else:
+        source = metrics.counted(source)
+        stats = None
+        with metrics.stage("execute"):
+            if profile:
+                data, stats = compiled.profile(source)
+            else:
+                data = compiled.execute(source, backend)
+        metrics.tokens_read(source)
+        with metrics.stage("serialize"):
+            extra = ""
+            if stats is not None:
+                extra = ', "profile": ' + json.dumps(stats.report(compiled.ast, program))
+            if wire == "binary":
+                graph = data.values[execute.GRAPH_NAME].values[tuple()]
+                header, columns = get_columnar_graph(graph, mode, cache.fingerprint(program))
+                out = pack_columnar('{"vargraph": ' + json.dumps(get_vargraph(data)) + ', "varvals": '
+                                    + get_varvals(data) + ', "graph": ' + json.dumps(header) + extra + "}", columns)
             else:
-                prev[vals[-1]] = value
+                out = root_json(data, mode, cache.fingerprint(program), extra)
+
+    if DEBUG:
+        print(out)
+
     return out
 
 
-def get_data(program: str, string: str) -> dict:
-    parse_tree = parse.parse(program)
-    ast = compile.compile_tree(parse_tree)
-    data = execute.Execute(ast, string).get_data()
+def cases_json(compiled: Program, program: str, source: Union[str, token_source.TokenSource], backend: str,
+               mode: str) -> str:
+    context = cache.fingerprint(program)
+    with metrics.stage("execute"):
+        roots = compiled.execute_cases(source, backend)
+    with metrics.stage("serialize"):
+        return '{"cases": [' + ", ".join(root_json(data, mode, context) for data in roots) + "]}"
 
-    out = {}
 
-    vargraph = get_vargraph(data)
-    out["vargraph"] = vargraph
+def root_json(data: execute.Root, mode: str, context: str, extra: str = "") -> str:
+    # extra is more fields, each starting with a comma
+    graph = data.values[execute.GRAPH_NAME].values[tuple()]
+    return '{"vargraph": ' + json.dumps(get_vargraph(data)) + ', "varvals": ' + get_varvals(data) + ', "graph": ' \
+           + json.dumps(get_graph(graph, mode, context)) + extra + "}"
+
+
+def stream_data(program: str, source: Union[str, token_source.TokenSource], backend: str = DEFAULT_BACKEND,
+                mode: str = draw_graph.DEFAULT_MODE, every: int = draw_graph.STREAM_EVERY) -> Iterator[str]:
+    # Runs the program now, so that errors raise before anything is sent, and returns the Server-Sent Events to send:
+    # a "graph" event like a JSON response with the starting positions and the stream id, "positions" events as the
+    # layout goes, and a "converged" event with the layout report once it is done. Formats with test cases aren't
+    # streamed: they get a single "cases" event like their JSON response, with every layout already done.
+    if every < 1:
+        raise Exception("Stream interval must be positive!", every)
+    compiled = get_program(program)
+    if compiled.cases is not None:
+        return iter([event("cases", cases_json(compiled, program, source, backend, mode))])
+    source = metrics.counted(source)
+    with metrics.stage("execute"):
+        data = compiled.execute(source, backend)
+    metrics.tokens_read(source)
+    head = '"vargraph": ' + json.dumps(get_vargraph(data)) + ', "varvals": ' + get_varvals(data)
+    names, heads, tails = graph_structure(data.values[execute.GRAPH_NAME].values[tuple()])
+    stream_id = uuid.uuid4().hex
+    cancelled = threading.Event()
+    with streams_lock:
+        streams[stream_id] = cancelled
+    return stream_events(stream_id, cancelled, head, names, heads, tails, mode, cache.fingerprint(program), every)
+
+
+def stream_data_from_file(program: str, path: str, backend: str = DEFAULT_BACKEND, mode: str = draw_graph.DEFAULT_MODE,
+                          every: int = draw_graph.STREAM_EVERY) -> Iterator[str]:
+    with token_source.MappedTokens(path) as tokens:
+        return stream_data(program, tokens, backend, mode, every)
+
+
+def stream_events(stream_id: str, cancelled: threading.Event, head: str, names: List[str], heads: array, tails: array,
+                  mode: str, context: str, every: int) -> Iterator[str]:
+    try:
+        updates = draw_graph.stream_points(names, np.frombuffer(heads, dtype=np.intc),
+                                           np.frombuffer(tails, dtype=np.intc), mode, context, every, cancelled)
+        points, report = next(updates)
+        vertices = [build_vertex(name, draw_graph.Vertex(x, y)) for name, (x, y) in zip(names, points.tolist())]
+        graph = {"vertices": vertices, "edges": [build_edge(a, b, False) for a, b in zip(heads, tails)],
+                 "layout": report}
+        yield event("graph", '{"id": ' + json.dumps(stream_id) + ", " + head + ', "graph": ' + json.dumps(graph) + "}")
+        sent = report["iterations"]
+        for points, report in updates:
+            # the last positions can be the ones already sent for the last interval
+            if report["iterations"] != sent:
+                sent = report["iterations"]
+                yield event("positions", json.dumps({"iterations": sent, "x": points[:, 0].tolist(),
+                                                     "y": points[:, 1].tolist()}))
+        # a cancelled layout just stops
+        if report["done"]:
+            yield event("converged", json.dumps(report))
+    finally:
+        with streams_lock:
+            streams.pop(stream_id, None)
+
+
+def event(name: str, data: str) -> str:
+    return "event: " + name + "\ndata: " + data + "\n\n"
+
+
+def cancel_stream(stream_id: str) -> bool:
+    # stops the layout of a stream at its next iteration, returning whether the stream was still running
+    with streams_lock:
+        cancelled = streams.get(stream_id)
+    if cancelled is None:
+        return False
+    cancelled.set()
+    return True
+
+
+def get_batch(program: str, strings: List[str], backend: str = DEFAULT_BACKEND, mode: str = draw_graph.DEFAULT_MODE,
+              parallel: Optional[bool] = None) -> str:
+    # Runs every data set against one format, compiled once, and answers with a JSON result or error per data set, in
+    # order, plus timings. A bad data set only fails its own item; a format that doesn't compile fails the batch.
+    if len(strings) > MAX_BATCH:
+        raise Exception("Batch is too large!", len(strings))
+    start = time.perf_counter()
+    get_program(program)
+    compiled = time.perf_counter() - start
+
+    keys = [cache.fingerprint(program, string, backend, mode, DEFAULT_WIRE_FORMAT) for string in strings]
+    results = [None] * len(strings)
+    pending = []
+    for i, key in enumerate(keys):
+        cached = result_cache.get(key)
+        if cached is not None:
+            results[i] = (True, cached, 0.0)
+        else:
+            pending.append(i)
+    if parallel is None:
+        parallel = len(pending) > 1 and BATCH_WORKERS > 1
+    if parallel:
+        with ProcessPoolExecutor(min(BATCH_WORKERS, len(pending)), batch_context) as pool:
+            futures = [(i, pool.submit(run_batch_item, program, strings[i], backend, mode)) for i in pending]
+            for i, future in futures:
+                try:
+                    results[i] = future.result()
+                except Exception as e:
+                    # the worker died, taking the pool with it
+                    results[i] = (False, describe_error(e), 0.0)
+    else:
+        for i in pending:
+            results[i] = run_batch_item(program, strings[i], backend, mode)
+    for i in pending:
+        ok, out, _ = results[i]
+        if ok:
+            result_cache.put(keys[i], out)
+
+    items = []
+    for i, (ok, out, seconds) in enumerate(results):
+        if ok:
+            items.append('{"index": ' + str(i) + ', "ok": true, "seconds": ' + json.dumps(seconds) + ', "data": ' + out
+                         + "}")
+        else:
+            items.append(json.dumps({"index": i, "ok": False, "seconds": seconds, "error": out}))
+    succeeded = sum(ok for ok, _, _ in results)
+    seconds = [item_seconds for _, _, item_seconds in results]
+    timing = {"compile": compiled, "wall": time.perf_counter() - start, "items": sum(seconds),
+              "slowest": max(seconds, default=0.0), "cached": len(strings) - len(pending), "parallel": parallel}
+    return '{"succeeded": ' + str(succeeded) + ', "failed": ' + str(len(results) - succeeded) + ', "timing": ' \
+           + json.dumps(timing) + ', "results": [' + ", ".join(items) + "]}"
+
+
+def run_batch_item(program: str, string: str, backend: str, mode: str) -> Tuple[bool, str, float]:
+    # runs in the batch workers, returning whether the data set worked, its response or error, and the time it took
+    start = time.perf_counter()
+    try:
+        out = build_data(program, string, backend, mode)
+        return True, out, time.perf_counter() - start
+    except Exception as e:
+        return False, describe_error(e), time.perf_counter() - start
+
+
+def get_analysis(program: str, string: str, name: str, source: Optional[str] = None, target: Optional[str] = None,
+                 case: int = 0, backend: str = DEFAULT_BACKEND) -> str:
+    # an overlay for the graph the data makes, see analysis.GraphIndex.overlay; source and target are vertex names,
+    # and case picks the test case of formats that have them
+    if name not in analysis.ANALYSES:
+        raise Exception("Unknown analysis!", name)
+    graph_key = cache.fingerprint(program, string, str(case))
+    key = cache.fingerprint(graph_key, name, "" if source is None else "=" + source,
+                            "" if target is None else "=" + target)
+    out = analysis.overlay_cache.get(key)
+    if out is not None:
+        return out
+    index = analysis.index_cache.get(graph_key)
+    if index is None:
+        compiled = get_program(program)
+        with metrics.stage("execute"):
+            if compiled.cases is not None:
+                roots = compiled.execute_cases(string, backend)
+                if not 0 <= case < len(roots):
+                    raise Exception("No such test case!", case, len(roots))
+                data = roots[case]
+            else:
+                data = compiled.execute(string, backend)
+        with metrics.stage("index"):
+            names, heads, tails = graph_structure(data.values[execute.GRAPH_NAME].values[tuple()])
+            index = analysis.GraphIndex(names, np.frombuffer(heads, dtype=np.intc),
+                                        np.frombuffer(tails, dtype=np.intc))
+        analysis.index_cache.put(graph_key, index)
+    with metrics.stage("analyze"):
+        out = index.overlay(name, source, target)
+    analysis.overlay_cache.put(key, out)
+    return out
 
-    varvals = get_varvals(data)
-    out["varvals"] = varvals
 
-    graph = get_graph(data.values[execute.GRAPH_NAME].values[tuple()])
-    out["graph"] = graph
+def generate_data(program: str, sizes: Dict[str, int], shape: List[str], seed: int = 0) -> str:
+    # test data for the format, see testdata.generate; the same seed gives the same data
+    compiled = get_program(program)
+    case_count = max(sizes.get("cases", testdata.DEFAULT_CASES), 1) if compiled.cases is not None else 1
+    vertices = sizes.get("vertices", testdata.DEFAULT_VERTICES)
+    if case_count * (vertices + sizes.get("edges", 2 * vertices)) > MAX_GENERATED:
+        raise Exception("Too much test data asked for!", sizes)
+    with metrics.stage("generate"):
+        return testdata.generate_string(compiled.ast, sizes, shape, seed, max_tokens=MAX_GENERATED_TOKENS)
 
-    print(out)
 
-    return json.dumps(out)
+def describe_error(e: Exception) -> str:
+    return type(e).__name__ + ": " + ", ".join(map(str, e.args))
@@ -1,55 +1,341 @@
 # coding=utf-8
 from __future__ import annotations
 
-from typing import List, Dict, NewType, Union, Optional, Tuple
+from array import array
+from collections import deque
+from collections.abc import Sequence
+from itertools import islice
+from typing import List, Dict, NewType, Union, Optional, Tuple, Iterable, Callable, Any, Iterator
 
+import bulk
 import compile
+import profiler
+import token_source
 
 GRAPH_NAME = "newgraph"
 VERTEX_COUNT = "VERTICES"
 EDGE_COUNT = "EDGES"
 
 
+class LoopValues:
+    rows: Dict[Tuple[int, ...], List[int]]
+
+    # A variable's values keyed by loop counters, behaving like the Dict[Tuple[int], VarVal] it replaces.
+    # Values are kept in storage order, in an int64 array until anything else is stored. Keys are kept as rows of
+    # consecutive innermost-loop counters that share their outer counters (ragged offsets), so a nested forall
+    # costs a few ints per row instead of a tuple and a dict entry per value.
+    def __init__(self, order: List[int]) -> None:
+        # order lists key positions from the outermost loop to the innermost one
+        self.order = order
+        self.depth = len(order)
+        self.prefixes = [array("i") for _ in range(max(self.depth - 1, 0))]
+        self.starts = array("i")
+        self.offsets = array("q", [0])
+        self.rows = {}
+        self.data = array("q")
+        self.last_prefix = None
+        self.ordered = order == sorted(order)
+
+    def split(self, key: Tuple[int, ...]) -> Tuple[Tuple[int, ...], int]:
+        if not self.depth:
+            return (), 0
+        nested = tuple(key[p] for p in self.order)
+        return nested[:-1], nested[-1]
+
+    def join(self, prefix: Tuple[int, ...], inner: int) -> Tuple[int, ...]:
+        if not self.depth:
+            return ()
+        nested = prefix + (inner,)
+        key = [0] * self.depth
+        for position, counter in zip(self.order, nested):
+            key[position] = counter
+        return tuple(key)
+
+    def find(self, prefix: Tuple[int, ...], inner: int) -> Optional[int]:
+        for row in self.rows.get(prefix, ()):
+            start = self.starts[row]
+            if start <= inner < start + self.offsets[row + 1] - self.offsets[row]:
+                return self.offsets[row] + inner - start
+        return None
+
+    def put(self, index: Optional[int], value: VarVal) -> None:
+        try:
+            if index is None:
+                self.data.append(value)
+            else:
+                self.data[index] = value
+        except (TypeError, OverflowError):
+            self.data = list(self.data)
+            self.put(index, value)
+
+    def __setitem__(self, key: Tuple[int, ...], value: VarVal) -> None:
+        prefix, inner = self.split(key)
+        index = self.find(prefix, inner)
+        if index is not None:
+            self.put(index, value)
+            return
+        last = len(self.starts) - 1
+        if last < 0 or prefix != self.last_prefix or inner != self.starts[last] + len(self.data) - self.offsets[last]:
+            self.add_row(prefix, inner)
+        self.put(None, value)
+        self.offsets[-1] += 1
+
+    def add_row(self, prefix: Tuple[int, ...], start: int) -> None:
+        last = len(self.starts) - 1
+        if last >= 0 and (prefix, start) <= (self.last_prefix, self.starts[last] + len(self.data) - self.offsets[last]):
+            self.ordered = False
+        for column, counter in zip(self.prefixes, prefix):
+            column.append(counter)
+        self.starts.append(start)
+        self.offsets.append(self.offsets[-1])
+        self.rows.setdefault(prefix, []).append(last + 1)
+        self.last_prefix = prefix
+
+    def extend_row(self, prefix: Tuple[int, ...], values: List[VarVal]) -> None:
+        # stores values under innermost counters 0..len(values) - 1, which must not be stored yet
+        self.add_row(prefix, 0)
+        try:
+            self.data.extend(values)
+        except (TypeError, OverflowError):
+            self.data = list(self.data)
+            self.data.extend(values)
+        self.offsets[-1] += len(values)
+
+    def __getitem__(self, key: Tuple[int, ...]) -> VarVal:
+        index = self.find(*self.split(key))
+        if index is None:
+            raise KeyError(key)
+        return self.data[index]
+
+    def get(self, key: Tuple[int, ...], default: VarVal = None) -> Optional[VarVal]:
+        index = self.find(*self.split(key))
+        return default if index is None else self.data[index]
+
+    def __contains__(self, key: Tuple[int, ...]) -> bool:
+        return self.find(*self.split(key)) is not None
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def keys(self) -> Iterator[Tuple[int, ...]]:
+        for row, start in enumerate(self.starts):
+            prefix = tuple(column[row] for column in self.prefixes)
+            for inner in range(start, start + self.offsets[row + 1] - self.offsets[row]):
+                yield self.join(prefix, inner)
+
+    def __iter__(self) -> Iterator[Tuple[int, ...]]:
+        return self.keys()
+
+    def values(self) -> Iterator[VarVal]:
+        return iter(self.data)
+
+    def items(self) -> Iterator[Tuple[Tuple[int, ...], VarVal]]:
+        return zip(self.keys(), self.data)
+
+    def nbytes(self) -> int:
+        out = sum(column.itemsize * len(column) for column in self.prefixes + [self.starts, self.offsets])
+        if isinstance(self.data, array):
+            return out + self.data.itemsize * len(self.data)
+        return out + 8 * len(self.data)
+
+    def __repr__(self) -> str:
+        return repr(dict(self.items()))
+
+
+class KeyedValues(dict):
+    # A variable stored again under loops of another depth, which rows of one depth can't hold, so its values go back
+    # to a plain dict keyed by counters. Values stored under fewer loops replace what was nested under them, as they
+    # always have when the variable is serialized.
+    depth = None
+    ordered = False
+
+    @property
+    def data(self) -> List[VarVal]:
+        return list(self.values())
+
+    def nbytes(self) -> int:
+        return sum(64 + 8 * len(key) for key in self)
+
+
 class Variable:
-    values: Dict[Tuple[int], VarVal]
+    values: Union[LoopValues, KeyedValues]
 
-    def __init__(self, name: compile.VarName, ancestors: List[compile.VarName]) -> None:
+    def __init__(self, name: compile.VarName, ancestors: List[compile.VarName],
+                 nesting: List[compile.VarName] = None) -> None:
+        # nesting lists the ancestors from the outermost loop inwards, when it differs from their sorted order
+        if nesting is None:
+            nesting = ancestors
         self.ancestors = ancestors
         self.children = set()
-        self.values = {}
+        self.values = LoopValues([ancestors.index(loopvar) for loopvar in nesting])
         self.name = name
 
     def __repr__(self) -> str:
         return self.name + ": " + str(self.values)
 
 
+class LoopColumns:
+    columns: Dict[compile.VarName, array]
+
+    # loop counters of every element in a graph, one int32 column per loop, -1 where that loop wasn't running
+    def __init__(self) -> None:
+        self.columns = {}
+        self.size = 0
+
+    def add_columns(self, names: Iterable[compile.VarName]) -> None:
+        for name in names:
+            if name not in self.columns:
+                self.columns[name] = array("i", [-1]) * self.size
+
+    def append(self, loopcnts: LoopCounts) -> None:
+        self.add_columns(loopcnts)
+        for name, column in self.columns.items():
+            column.append(loopcnts.get(name, -1))
+        self.size += 1
+
+    def extend(self, dependencies: List[LoopCounts]) -> None:
+        for loopcnts in dependencies:
+            self.add_columns(loopcnts)
+        for name, column in self.columns.items():
+            column.extend(loopcnts.get(name, -1) for loopcnts in dependencies)
+        self.size += len(dependencies)
+
+    def extend_counted(self, loopcnts: LoopCounts, count: int, counter: compile.VarName) -> None:
+        # count rows sharing loopcnts, plus a counter column running from 0 to count - 1
+        self.add_columns(loopcnts)
+        self.add_columns((counter,))
+        for name, column in self.columns.items():
+            if name == counter:
+                column.extend(range(count))
+            else:
+                column.extend(array("i", [loopcnts.get(name, -1)]) * count)
+        self.size += count
+
+    def get(self, i: int) -> LoopCounts:
+        out = {}
+        for name, column in self.columns.items():
+            if column[i] != -1:
+                out[name] = column[i]
+        return LoopCounts(out)
+
+    def nbytes(self) -> int:
+        return sum(column.itemsize * len(column) for column in self.columns.values())
+
+
+class ElementView(Sequence):
+    def __init__(self, size: Callable[[], int], build: Callable[[int], Any]) -> None:
+        self.size = size
+        self.build = build
+
+    def __len__(self) -> int:
+        return self.size()
+
+    def __getitem__(self, i: Union[int, slice]) -> Any:
+        if isinstance(i, slice):
+            return [self.build(j) for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self.build(i)
+
+    def __repr__(self) -> str:
+        return str(list(self))
+
+
 class Graph:
-    edges: List[Edge]
-    vertices: List[Vertex]
+    names: List[VertexName]
+    name_ids: Dict[VertexName, int]
 
+    # vertex names are interned to dense ids, and vertices and edges are stored as int32 columns of those ids
     def __init__(self) -> None:
         self.directed = False
-        self.vertices = []
-        self.edges = []
-        self.nextEdge = None
+        self.names = []
+        self.name_ids = {}
+        self.vertex_names = array("i")
+        self.edge_heads = array("i")
+        self.edge_tails = array("i")
+        self.vertex_loops = LoopColumns()
+        self.edge_loops = LoopColumns()
+        self.pending = None
+        self.vertices = ElementView(self.vertex_count, self.get_vertex)
+        self.edges = ElementView(self.edge_count, self.get_edge)
+
+    def intern(self, name: VertexName) -> int:
+        if name not in self.name_ids:
+            self.name_ids[name] = len(self.names)
+            self.names.append(name)
+        return self.name_ids[name]
+
+    def vertex_count(self) -> int:
+        return len(self.vertex_names)
+
+    def edge_count(self) -> int:
+        return len(self.edge_heads)
+
+    def get_vertex(self, i: int) -> Vertex:
+        return Vertex(self.names[self.vertex_names[i]], self.vertex_loops.get(i))
+
+    def get_edge(self, i: int) -> Edge:
+        return Edge(self.names[self.edge_heads[i]], self.names[self.edge_tails[i]], self.edge_loops.get(i))
+
+    @property
+    def nextEdge(self) -> Optional[Edge]:
+        if self.pending is None:
+            return None
+        return Edge(self.names[self.pending[0]], None, self.pending[1])
 
     def add_endpoint(self, endpoint: VertexName, loopcnts: LoopCounts) -> None:
-        if self.nextEdge is None:
-            self.nextEdge = Edge(endpoint, None, loopcnts)
+        if self.pending is None:
+            self.pending = (self.intern(endpoint), loopcnts.copy())
         else:
-            self.nextEdge.b = endpoint
-            self.edges.append(self.nextEdge)
-            self.nextEdge = None
+            self.edge_heads.append(self.pending[0])
+            self.edge_tails.append(self.intern(endpoint))
+            self.edge_loops.append(self.pending[1])
+            self.pending = None
+
+    def add_endpoints(self, endpoints: List[VertexName], dependencies: List[LoopCounts]) -> None:
+        i = 0
+        if self.pending is not None and endpoints:
+            self.add_endpoint(endpoints[0], dependencies[0])
+            i = 1
+        last = len(endpoints) - (len(endpoints) - i) % 2
+        ids = [self.intern(endpoint) for endpoint in endpoints[i:last]]
+        self.edge_heads.extend(ids[0::2])
+        self.edge_tails.extend(ids[1::2])
+        self.edge_loops.extend(dependencies[i:last:2])
+        if last != len(endpoints):
+            self.add_endpoint(endpoints[last], dependencies[last])
 
     def add_vertex(self, vertex: VertexName, loopcnts: LoopCounts) -> None:
-        self.vertices.append(Vertex(vertex, loopcnts))
+        self.vertex_names.append(self.intern(vertex))
+        self.vertex_loops.append(loopcnts)
+
+    def add_vertices(self, vertices: List[VertexName], dependencies: List[LoopCounts]) -> None:
+        self.vertex_names.extend(self.intern(vertex) for vertex in vertices)
+        self.vertex_loops.extend(dependencies)
 
     def set_vertices(self, vertices: int, loopcnts: LoopCounts) -> None:
-        if self.vertices:
+        if self.vertex_names:
             raise Exception("Vertices have already been added")
-        for i in range(vertices):
-            self.vertices.append(Vertex(VertexName(str(i)), loopcnts))
-            self.vertices[-1].dependencies[VERTEX_COUNT] = i
+        self.vertex_names.extend(self.intern(VertexName(str(i))) for i in range(vertices))
+        self.vertex_loops.extend_counted(loopcnts, vertices, compile.VarName(VERTEX_COUNT))
+
+    def edge_vertex_indices(self) -> Tuple[array, array]:
+        # maps both columns of edge endpoints from name ids to vertex positions, the last vertex winning a name
+        index_of = array("i", [-1]) * len(self.names)
+        for i, name_id in enumerate(self.vertex_names):
+            index_of[name_id] = i
+        heads = array("i", [index_of[name_id] for name_id in self.edge_heads])
+        tails = array("i", [index_of[name_id] for name_id in self.edge_tails])
+        for column, name_ids in ((heads, self.edge_heads), (tails, self.edge_tails)):
+            if -1 in column:
+                raise Exception("Edge endpoint is not a vertex!", self.names[name_ids[column.index(-1)]])
+        return heads, tails
+
+    def nbytes(self) -> int:
+        return sum(column.itemsize * len(column) for column in (self.vertex_names, self.edge_heads, self.edge_tails)) \
+            + self.vertex_loops.nbytes() + self.edge_loops.nbytes()
 
     def __repr__(self) -> str:
         return "Vertices = " + str(self.vertices) + ", Edges = " + str(self.edges)
@@ -85,17 +371,40 @@ class Root:
 
 
 class Execute:
-    def __init__(self, ast: List[compile.Statement], S: str) -> None:
+    def __init__(self, ast: List[compile.Statement], S: Union[str, token_source.TokenSource],
+                 bulk: bool = True, inherited: Optional[Dict[compile.VarName, VarVal]] = None,
+                 profile: Optional[profiler.Profiler] = None) -> None:
+        # bulk=False forces every loop through the slow path, for checking the fast path against it; inherited values
+        # are stored before anything runs, the way a test case gets the values its header read
+        self.profile = profile
+        if profile is not None:
+            # an instance attribute, so that runs without a profiler don't pay for checking for one
+            self.run_commands = self.run_profiled
         self.values = {}
         self.loopcnts = {}
         self.root = Root()
-        self.S = S.strip()
-        self.i = 0
+        self.bulk = bulk
+        self.bulk_plans = {}
+        self.frames = []
+        self.orphans = {}
+        if isinstance(S, str):
+            S = token_source.StringTokens(S)
+        self.tokens = iter(S)
+        for name, value in (inherited or {}).items():
+            self.store(name, value)
+        self.run(ast)
+
+    def run(self, ast: List[compile.Statement]) -> None:
         self.run_commands(ast)
 
     def get_data(self) -> Root:
         return self.root
 
+    def get_graph(self) -> Graph:
+        if GRAPH_NAME not in self.values:
+            raise Exception("Graph not yet initialized!")
+        return self.values[GRAPH_NAME]
+
     def run_commands(self, commands: List[compile.Statement]) -> None:
         for command in commands:
             if isinstance(command, compile.Initializer):
@@ -107,16 +416,19 @@ class Execute:
                     raise Exception("Unknown initializer!", command.type)
 
             elif isinstance(command, compile.Token):
-                T = ""
-                while self.i != len(self.S) and not self.S[self.i].isspace():
-                    T += self.S[self.i]
-                    self.i += 1
-                while self.i != len(self.S) and self.S[self.i].isspace():
-                    self.i += 1
-                for expression in command.expression_list:
-                    self.assign_expression(expression, T)
+                T = self.read_token()
+                N = None
+                if True in command.numeric:
+                    N = parse_int(T, command.expression_list[command.numeric.index(True)])
+                for expression, numeric in zip(command.expression_list, command.numeric):
+                    self.assign_expression(expression, N if numeric else T)
 
             elif isinstance(command, compile.Hint):
+                if command.targets is not None:
+                    T = self.get_value(command.source)
+                    for expression in command.targets:
+                        self.assign_expression(expression, T)
+                    continue
                 T = None
                 for expression in command.expression_list:
                     if self.get_value(expression) is not None:
@@ -129,37 +441,95 @@ class Execute:
                         self.assign_expression(expression, T)
 
             elif isinstance(command, compile.Loop):
-                loopvar = command.loopvar.name
-                cnt = self.values[loopvar]
-                if loopvar in self.loopcnts:
-                    raise Exception("Loop variable already defined!", command.loopvar)
-                self.loopcnts[loopvar] = 0
-                for _ in range(int(cnt)):
-                    for child_name in self.root.values[loopvar].children:
-                        ok = True
-                        child = self.root.values[child_name]
-                        for ancestor in child.ancestors:
-                            if ancestor not in self.loopcnts:
-                                ok = False
-                                break
-                        if ok:
-                            key = tuple()
-                            for ancestor in child.ancestors:
-                                key = key + (self.loopcnts[ancestor],)
-                            if key in child.values:
-                                self.values[child_name] = child.values[key]
-                    self.run_commands(command.statements)
-                    self.loopcnts[loopvar] += 1
-                    to_remove = []
-                    for value in self.values:
-                        if loopvar in self.root.values[value].ancestors:
-                            to_remove.append(value)
-                    for value in to_remove:
-                        del self.values[value]
-                del self.loopcnts[loopvar]
+                self.run_loop(command, lambda: self.run_commands(command.statements))
+            elif isinstance(command, compile.TestCases):
+                raise Exception("Test cases run through cases.run_cases!")
             else:
                 raise Exception("Statement type unknown!", type(command))
 
+    def run_profiled(self, commands: List[compile.Statement]) -> None:
+        for command in commands:
+            self.profile.enter(command)
+            try:
+                Execute.run_commands(self, [command])
+            finally:
+                self.profile.leave()
+
+    def run_loop(self, command: compile.Loop, body: Callable[[], None]) -> None:
+        loopvar = command.loopvar.name
+        cnt = self.values[loopvar]
+        if loopvar in self.loopcnts:
+            raise Exception("Loop variable already defined!", command.loopvar)
+        if self.run_bulk(command, cnt):
+            if self.profile is not None:
+                self.profile.bulk.add(id(command))
+            return
+        self.loopcnts[loopvar] = 0
+        restores = self.plan_restores(loopvar)
+        frame = []
+        self.frames.append((loopvar, frame))
+        for t in range(cnt):
+            for name, values, prefix, suffix in restores:
+                value = values.get(prefix + (t,) + suffix)
+                if value is not None:
+                    self.values[name] = value
+                    frame.append(name)
+            body()
+            self.loopcnts[loopvar] += 1
+            for name in frame:
+                self.values.pop(name, None)
+            frame.clear()
+            for name in self.orphans.get(loopvar, ()):
+                self.values.pop(name, None)
+        self.frames.pop()
+        del self.loopcnts[loopvar]
+
+    def plan_restores(self, loopvar: compile.VarName) -> List[Tuple[compile.VarName, LoopValues, Tuple, Tuple]]:
+        # values an earlier loop over the same variable stored for these outer counters come back into scope
+        # each iteration; everything but this loop's counter is fixed for the whole loop, so keys are split around it
+        out = []
+        for child_name in self.root.values[loopvar].children:
+            child = self.root.values[child_name]
+            if all(ancestor in self.loopcnts for ancestor in child.ancestors):
+                index = child.ancestors.index(loopvar)
+                prefix = tuple(self.loopcnts[ancestor] for ancestor in child.ancestors[:index])
+                suffix = tuple(self.loopcnts[ancestor] for ancestor in child.ancestors[index + 1:])
+                out.append((child_name, child.values, prefix, suffix))
+        return out
+
+    def bind(self, name: compile.VarName) -> None:
+        # a value lives until the current iteration of the innermost running loop it depends on ends
+        ancestors = self.root.values[name].ancestors
+        for loopvar, frame in reversed(self.frames):
+            if loopvar in ancestors:
+                frame.append(name)
+                break
+        for ancestor in ancestors:
+            if ancestor not in self.loopcnts:
+                # only reachable when a variable is reused under different loops
+                self.orphans.setdefault(ancestor, set()).add(name)
+
+    def read_token(self) -> str:
+        # running out of input reads as an empty token, like the end of a string would
+        return next(self.tokens, "")
+
+    def skip_tokens(self, count: int) -> None:
+        deque(islice(self.tokens, count), maxlen=0)
+
+    def read_tokens(self, count: int) -> List[str]:
+        tokens = list(islice(self.tokens, count))
+        if len(tokens) < count:
+            tokens.extend("" for _ in range(count - len(tokens)))
+        return tokens
+
+    def run_bulk(self, command: compile.Loop, cnt: VarVal) -> bool:
+        if not self.bulk:
+            return False
+        if id(command) not in self.bulk_plans:
+            self.bulk_plans[id(command)] = bulk.plan_loop(command)
+        plan = self.bulk_plans[id(command)]
+        return plan is not None and plan.run(self, cnt)
+
     def get_value(self, expression: compile.Expression) -> Union[VarVal, None]:
         if isinstance(expression, compile.Constant):
             return expression.value
@@ -173,7 +543,7 @@ class Execute:
             b = self.get_value(expression.rhs)
             if a is None or b is None:
                 return None
-            return expression.operator.execute(int(a), int(b))
+            return expression.operator.execute(a, b)
         elif isinstance(expression, compile.Keyword):
             return None
         else:
@@ -188,6 +558,14 @@ class Execute:
             self.store(expression.name, curr_val)
 
         elif isinstance(expression, compile.MathExpression):
+            if expression.solve == "rhs":
+                a = self.get_value(expression.lhs)
+                self.assign_expression(expression.rhs, expression.operator.get_rhs(a, curr_val))
+                return
+            elif expression.solve == "lhs":
+                b = self.get_value(expression.rhs)
+                self.assign_expression(expression.lhs, expression.operator.get_lhs(b, curr_val))
+                return
             a = self.get_value(expression.lhs)
             b = self.get_value(expression.rhs)
             if a is None and b is None:
@@ -196,24 +574,18 @@ class Execute:
                 raise Exception("Expression already fully defined!")
             else:
                 if b is None:
-                    self.assign_expression(expression.rhs, expression.operator.get_rhs(int(a), int(curr_val)))
+                    self.assign_expression(expression.rhs, expression.operator.get_rhs(a, curr_val))
                 else:
-                    self.assign_expression(expression.lhs, expression.operator.get_lhs(int(b), int(curr_val)))
+                    self.assign_expression(expression.lhs, expression.operator.get_lhs(b, curr_val))
 
         elif isinstance(expression, compile.Keyword):
             # decode keyword, access + store in graph!
             if expression.name == "ENDPOINT":
-                if GRAPH_NAME not in self.values:
-                    raise Exception("Graph not yet initialized!")
-                self.values[GRAPH_NAME].add_endpoint(str(curr_val), self.loopcnts)
+                self.get_graph().add_endpoint(str(curr_val), self.loopcnts)
             elif expression.name == "VERTEX":
-                if GRAPH_NAME not in self.values:
-                    raise Exception("Graph not yet initialized!")
-                self.values[GRAPH_NAME].add_vertex(str(curr_val), self.loopcnts)
+                self.get_graph().add_vertex(str(curr_val), self.loopcnts)
             elif expression.name == "VERTICES":
-                if GRAPH_NAME not in self.values:
-                    raise Exception("Graph not yet initialized!")
-                self.values[GRAPH_NAME].set_vertices(int(curr_val), self.loopcnts)
+                self.get_graph().set_vertices(curr_val, self.loopcnts)
             elif expression.name == "HEAD":
                 raise Exception("Directed graphs not yet supported!")
             elif expression.name == "TAIL":
@@ -227,13 +599,25 @@ class Execute:
         if name in self.values:
             raise Exception("Variable name already defined!", name)
         if name not in self.root.values:
-            self.root.values[name] = Variable(name, sorted(self.loopcnts))
+            self.root.values[name] = Variable(name, sorted(self.loopcnts), list(self.loopcnts))
         key = tuple()
         for loopvar in sorted(self.loopcnts):
             self.root.values[loopvar].children.add(name)
             key = key + (self.loopcnts[loopvar],)
-        self.root.values[name].values[key] = value
+        values = self.root.values[name].values
+        if isinstance(values, LoopValues) and len(key) != values.depth:
+            values = self.root.values[name].values = KeyedValues(values.items())
+        values[key] = value
         self.values[name] = value
+        self.bind(name)
+
+
+def parse_int(token: str, expression: compile.Expression) -> int:
+    # the one place a token becomes a number; compile.infer_types decides which tokens come through here
+    try:
+        return int(token)
+    except ValueError:
+        raise Exception("Token used as a number is not an integer!", token, expression) from None
 
 
 LoopCounts = NewType("LoopCounts", Dict[compile.VarName, int])
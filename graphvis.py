@@ -1,10 +1,35 @@
 # coding=utf-8
-from flask import Flask, send_from_directory, request
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from typing import Iterator, Optional
 
+from flask import Flask, Response, send_from_directory, request, jsonify
+
+import draw_graph
 import endpoint
+import jobs
+import metrics
 
 app = Flask(__name__)
 
+METRICS_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@app.before_request
+def start_timing():
+    metrics.start_request()
+
+
+@app.after_request
+def add_timing(response: Response) -> Response:
+    # streamed responses get their header before the stream runs, so it only covers the work done up front
+    header = metrics.finish_request(request.endpoint or "unknown", response.status_code)
+    if header is not None:
+        response.headers["Server-Timing"] = header
+    return response
+
 
 @app.route('/')
 def hello_world():
@@ -16,12 +41,186 @@ def graph_test():
     return send_from_directory("static", "index.html")
 
 
+def wire_format(program: str) -> str:
+    # ?format= wins, otherwise an Accept header preferring the columnar type over JSON asks for it, unless the program
+    # has test cases, which only JSON holds, and the header takes JSON too
+    if "format" in request.args:
+        return request.args["format"]
+    if request.accept_mimetypes.best_match([endpoint.JSON_TYPE, endpoint.COLUMNAR_TYPE]) == endpoint.COLUMNAR_TYPE:
+        if not request.accept_mimetypes[endpoint.JSON_TYPE] or not endpoint.has_cases(program):
+            return "binary"
+    return endpoint.DEFAULT_WIRE_FORMAT
+
+
+def flag(name: str) -> bool:
+    # a form field or query argument, as sent by a checkbox or by hand
+    return request.values.get(name, "").lower() in ("1", "true", "on")
+
+
+@contextmanager
+def uploaded_file() -> Iterator[Optional[str]]:
+    # the path of the uploaded test file while it exists, or None without one
+    upload = request.files.get("graphfile")
+    if upload is None or not upload.filename:
+        yield None
+        return
+    # stream the upload to disk so execution can mmap it instead of holding it in memory
+    fd, path = tempfile.mkstemp(prefix="graphvis-", suffix=".txt")
+    os.close(fd)
+    try:
+        upload.save(path)
+        yield path
+    finally:
+        os.remove(path)
+
+
 @app.route("/process_graph", methods=["POST"])
 def process_graph():
-    S = request.form.get("graphdata")
     fmt = request.form.get("graphformat")
-    data = endpoint.get_data(fmt, S)
-    return data
+    backend = request.form.get("backend", endpoint.DEFAULT_BACKEND)
+    mode = request.form.get("mode", draw_graph.DEFAULT_MODE)
+    wire = wire_format(fmt)
+    profile = flag("profile")
+    with uploaded_file() as path:
+        if path is not None:
+            data = endpoint.get_data_from_file(fmt, path, backend, mode, wire, profile)
+        else:
+            S = request.form.get("graphdata")
+            data = endpoint.get_data(fmt, S, backend, mode, wire, profile)
+    if wire == "binary":
+        return Response(data, mimetype=endpoint.COLUMNAR_TYPE)
+    return Response(data, mimetype=endpoint.JSON_TYPE)
+
+
+@app.route("/stream_graph", methods=["POST"])
+def stream_graph():
+    fmt = request.form.get("graphformat")
+    backend = request.form.get("backend", endpoint.DEFAULT_BACKEND)
+    mode = request.form.get("mode", draw_graph.DEFAULT_MODE)
+    every = int(request.form.get("every", draw_graph.STREAM_EVERY))
+    with uploaded_file() as path:
+        if path is not None:
+            events = endpoint.stream_data_from_file(fmt, path, backend, mode, every)
+        else:
+            events = endpoint.stream_data(fmt, request.form.get("graphdata"), backend, mode, every)
+    return Response(events, mimetype="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@app.route("/cancel_stream/<stream_id>", methods=["POST"])
+def cancel_stream(stream_id: str):
+    return jsonify({"cancelled": endpoint.cancel_stream(stream_id)})
+
+
+@app.route("/batch", methods=["POST"])
+def process_batch():
+    # one graphformat, with data sets as repeated graphdata fields and graphfiles uploads, in that order
+    fmt = request.form.get("graphformat")
+    backend = request.form.get("backend", endpoint.DEFAULT_BACKEND)
+    mode = request.form.get("mode", draw_graph.DEFAULT_MODE)
+    strings = request.form.getlist("graphdata")
+    strings += [upload.read().decode("utf-8") for upload in request.files.getlist("graphfiles") if upload.filename]
+    return Response(endpoint.get_batch(fmt, strings, backend, mode), mimetype=endpoint.JSON_TYPE)
+
+
+@app.route("/analyze", methods=["POST"])
+def analyze_graph():
+    # one of analysis.ANALYSES over the graph of graphformat and graphdata, from the vertex named source
+    fmt = request.form.get("graphformat")
+    data = request.form.get("graphdata")
+    name = request.form.get("analysis")
+    source = request.form.get("source") or None
+    target = request.form.get("target") or None
+    case = int(request.form.get("case") or 0)
+    backend = request.form.get("backend", endpoint.DEFAULT_BACKEND)
+    return Response(endpoint.get_analysis(fmt, data, name, source, target, case, backend),
+                    mimetype=endpoint.JSON_TYPE)
+
+
+@app.route("/generate", methods=["POST"])
+def generate_data():
+    # sizes as a JSON object of names to numbers, or the vertices, edges and cases fields; shape as a comma separated
+    # list of testdata.SHAPES
+    fmt = request.form.get("graphformat")
+    sizes = json.loads(request.form.get("sizes") or "{}")
+    for name in ("vertices", "edges", "cases"):
+        if request.form.get(name):
+            sizes[name] = request.form[name]
+    sizes = {name: int(float(value)) for name, value in sizes.items()}
+    shape = [name.strip() for name in request.form.get("shape", "").split(",") if name.strip()]
+    seed = request.form.get("seed") or "0"
+    if not (seed.isascii() and seed.isdigit()):
+        return jsonify({"error": "Seed must be a whole number, from 0!"}), 400
+    return Response(endpoint.generate_data(fmt, sizes, shape, int(seed)), mimetype="text/plain")
+
+
+@app.route("/jobs", methods=["POST"])
+def submit_job():
+    # answers at once with the job id; 429 when the queue is full, checked before an upload is even saved
+    queue = jobs.get_queue()
+    if queue.full():
+        queue.reject()
+        return jsonify({"error": "Job queue is full!"}), 429
+    fmt = request.form.get("graphformat")
+    backend = request.form.get("backend", endpoint.DEFAULT_BACKEND)
+    mode = request.form.get("mode", draw_graph.DEFAULT_MODE)
+    wire = wire_format(fmt)
+    upload = request.files.get("graphfile")
+    if upload is not None and upload.filename:
+        # the job deletes the file once it finishes
+        fd, path = tempfile.mkstemp(prefix="graphvis-", suffix=".txt")
+        os.close(fd)
+        upload.save(path)
+        job = queue.submit(fmt, path=path, backend=backend, mode=mode, wire=wire)
+        if job is None:
+            os.remove(path)
+    else:
+        job = queue.submit(fmt, request.form.get("graphdata"), backend=backend, mode=mode, wire=wire)
+    if job is None:
+        return jsonify({"error": "Job queue is full!"}), 429
+    return jsonify(job.status()), 202
+
+
+@app.route("/jobs")
+def job_stats():
+    return jsonify(jobs.get_queue().stats())
+
+
+@app.route("/jobs/<job_id>")
+def job_status(job_id: str):
+    # ?wait=seconds holds the request until the job finishes or the time is up
+    job = jobs.get_queue().wait(job_id, float(request.args.get("wait", 0)))
+    if job is None:
+        return jsonify({"error": "Unknown job!"}), 404
+    return jsonify(job.status())
+
+
+@app.route("/jobs/<job_id>/result")
+def job_result(job_id: str):
+    job = jobs.get_queue().get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job!"}), 404
+    if job.state != jobs.DONE:
+        return jsonify(job.status()), 409
+    if job.wire == "binary":
+        return Response(job.result, mimetype=endpoint.COLUMNAR_TYPE)
+    return Response(job.result, mimetype=endpoint.JSON_TYPE)
+
+
+@app.route("/jobs/<job_id>/cancel", methods=["POST"])
+def cancel_job(job_id: str):
+    return jsonify({"cancelled": jobs.get_queue().cancel(job_id)})
+
+
+@app.route("/cache_stats")
+def cache_stats():
+    return jsonify(endpoint.get_cache_stats())
+
+
+@app.route("/metrics")
+def get_metrics():
+    caches = metrics.gauges("graphvis_cache", "Entries, bytes, hits and misses of the server's caches.",
+                            endpoint.get_cache_stats())
+    return Response(metrics.exposition(caches), content_type=METRICS_TYPE)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,305 @@
+# coding=utf-8
+from __future__ import annotations
+
+import atexit
+import multiprocessing
+import os
+import signal
+import threading
+import time
+import uuid
+from collections import deque
+from multiprocessing.connection import Connection
+from typing import Any, Deque, Dict, Optional, Union
+
+import cache
+import draw_graph
+import endpoint
+
+try:
+    import resource
+except ImportError:
+    # no rlimits outside Unix, so jobs there only get the wall clock limit
+    resource = None
+
+# Every job runs in a fresh process of its own, started by a fork server that has already imported endpoint, or
+# spawned where there is no fork server, so a job that runs out of CPU time or memory, or gets cancelled, is killed
+# without touching the web server or any other job. At most WORKERS jobs run at once and at most MAX_QUEUED wait; a
+# full queue turns new jobs away straight away.
+
+WORKERS = os.cpu_count() or 1
+MAX_QUEUED = 64
+CPU_SECONDS = 60
+MEMORY_BYTES = 2 * 1024 * 1024 * 1024
+# catches jobs that are stuck without using CPU
+WALL_SECONDS = 120.0
+MAX_WAIT = 30.0
+
+FINISHED_JOBS = cache.setting("FINISHED_JOBS", 256)
+FINISHED_BYTES = cache.setting("FINISHED_BYTES", 256 * 1024 * 1024)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+if "forkserver" in multiprocessing.get_all_start_methods():
+    context = multiprocessing.get_context("forkserver")
+    context.set_forkserver_preload(["endpoint"])
+else:
+    context = multiprocessing.get_context("spawn")
+
+
+class Job:
+    def __init__(self, program: str, data: Optional[str], path: Optional[str], backend: str, mode: str,
+                 wire: str) -> None:
+        self.id = uuid.uuid4().hex
+        self.program = program
+        self.data = data
+        # an uploaded file the job owns, deleted once the job finishes
+        self.path = path
+        self.backend = backend
+        self.mode = mode
+        self.wire = wire
+        self.state = QUEUED
+        self.result = None
+        self.error = None
+        self.process = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.done = threading.Event()
+
+    def key(self) -> Optional[str]:
+        # the result cache key, which uploads don't get
+        if self.data is None:
+            return None
+        return cache.fingerprint(self.program, self.data, self.backend, self.mode, self.wire)
+
+    def status(self) -> Dict[str, Any]:
+        now = time.time()
+        out = {"id": self.id, "state": self.state, "wire": self.wire,
+               "queued_for": (self.started or self.finished or now) - self.submitted}
+        if self.started is not None:
+            out["ran_for"] = (self.finished or now) - self.started
+        if self.error is not None:
+            out["error"] = self.error
+        return out
+
+    def nbytes(self) -> int:
+        return len(self.result or "") + len(self.data or "") + len(self.program)
+
+    def __repr__(self) -> str:
+        return "Job(" + self.id + ", " + self.state + ")"
+
+
+class JobQueue:
+    def __init__(self, workers: int = WORKERS, max_queued: int = MAX_QUEUED, cpu_seconds: int = CPU_SECONDS,
+                 memory_bytes: int = MEMORY_BYTES, wall_seconds: float = WALL_SECONDS) -> None:
+        self.workers = workers
+        self.max_queued = max_queued
+        self.cpu_seconds = cpu_seconds
+        self.memory_bytes = memory_bytes
+        self.wall_seconds = wall_seconds
+        self.queue: Deque[Job] = deque()
+        self.running: Dict[str, Job] = {}
+        # queued and running jobs by id; finished ones move to an LRU cache so their results don't pile up
+        self.active: Dict[str, Job] = {}
+        self.finished = cache.LRUCache(FINISHED_JOBS, FINISHED_BYTES, lambda job: job.nbytes())
+        self.rejected = 0
+        self.completed = {DONE: 0, FAILED: 0, CANCELLED: 0}
+        self.lock = threading.Lock()
+
+    def full(self) -> bool:
+        return len(self.queue) >= self.max_queued
+
+    def reject(self) -> None:
+        # counts a job turned away before it got to submit
+        with self.lock:
+            self.rejected += 1
+
+    def submit(self, program: str, data: Optional[str] = None, path: Optional[str] = None,
+               backend: str = endpoint.DEFAULT_BACKEND, mode: str = draw_graph.DEFAULT_MODE,
+               wire: str = endpoint.DEFAULT_WIRE_FORMAT) -> Optional[Job]:
+        # returns None, without queueing anything, when the queue is full
+        job = Job(program, data, path, backend, mode, wire)
+        key = job.key()
+        result = endpoint.result_cache.get(key) if key is not None else None
+        with self.lock:
+            if result is not None:
+                job.started = job.submitted
+                self.finish(job, DONE, result, None)
+                return job
+            if self.full():
+                self.rejected += 1
+                return None
+            self.queue.append(job)
+            self.active[job.id] = job
+            self.schedule()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self.lock:
+            job = self.active.get(job_id)
+        if job is None:
+            job = self.finished.get(job_id)
+        return job
+
+    def wait(self, job_id: str, timeout: float) -> Optional[Job]:
+        # long polling: returns once the job is finished or timeout seconds have gone by
+        job = self.get(job_id)
+        if job is not None:
+            job.done.wait(min(max(timeout, 0), MAX_WAIT))
+        return job
+
+    def cancel(self, job_id: str) -> bool:
+        # returns whether the job was still queued or running
+        with self.lock:
+            job = self.active.get(job_id)
+            if job is None:
+                return False
+            if job.state == QUEUED:
+                self.queue.remove(job)
+                self.finish(job, CANCELLED, None, None)
+                return True
+            job.state = CANCELLED
+            process = job.process
+        if process is not None:
+            process.kill()
+        return True
+
+    def schedule(self) -> None:
+        # with the lock held
+        while self.queue and len(self.running) < self.workers:
+            job = self.queue.popleft()
+            job.state = RUNNING
+            job.started = time.time()
+            self.running[job.id] = job
+            threading.Thread(target=self.run, args=(job,), daemon=True).start()
+
+    def run(self, job: Job) -> None:
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(target=work, args=(sender, job.program, job.data, job.path, job.backend, job.mode,
+                                                     job.wire, self.cpu_seconds, self.memory_bytes))
+        try:
+            process.start()
+        except Exception as e:
+            receiver.close()
+            sender.close()
+            with self.lock:
+                del self.running[job.id]
+                self.finish(job, FAILED, None, endpoint.describe_error(e))
+                self.schedule()
+            return
+        sender.close()
+        with self.lock:
+            job.process = process
+            cancelled = job.state == CANCELLED
+        if cancelled:
+            process.kill()
+
+        try:
+            if receiver.poll(self.wall_seconds):
+                state, value = receiver.recv()
+            else:
+                state, value = FAILED, "Wall clock limit exceeded!"
+        except EOFError:
+            # the process died without answering
+            process.join()
+            state, value = FAILED, exit_reason(process)
+        finally:
+            receiver.close()
+        if process.is_alive():
+            process.kill()
+        process.join()
+
+        with self.lock:
+            if job.state == CANCELLED:
+                state, value = CANCELLED, None
+            del self.running[job.id]
+            if state == DONE:
+                self.finish(job, DONE, value, None)
+            else:
+                self.finish(job, state, None, value)
+            self.schedule()
+        if state == DONE and job.key() is not None:
+            endpoint.result_cache.put(job.key(), value)
+
+    def finish(self, job: Job, state: str, result: Optional[Union[str, bytes]], error: Optional[str]) -> None:
+        # with the lock held; a result too big to keep fails the job, which keeps it known
+        if state == DONE and self.finished.max_bytes is not None and \
+                len(result) + job.nbytes() > self.finished.max_bytes:
+            state, result, error = FAILED, None, "Result is too large to keep!"
+        job.state = state
+        job.result = result
+        job.error = error
+        job.process = None
+        job.finished = time.time()
+        self.completed[state] += 1
+        self.active.pop(job.id, None)
+        self.finished.put(job.id, job)
+        if job.path is not None:
+            os.remove(job.path)
+            job.path = None
+        job.done.set()
+
+    def shutdown(self) -> None:
+        with self.lock:
+            for job in list(self.queue):
+                self.finish(job, CANCELLED, None, None)
+            self.queue.clear()
+            processes = [job.process for job in self.running.values() if job.process is not None]
+            for job in self.running.values():
+                job.state = CANCELLED
+        for process in processes:
+            process.kill()
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {"queued": len(self.queue), "running": len(self.running), "workers": self.workers,
+                    "max_queued": self.max_queued, "rejected": self.rejected, "completed": dict(self.completed),
+                    "finished": self.finished.stats()}
+
+
+def work(sender: Connection, program: str, data: Optional[str], path: Optional[str], backend: str, mode: str,
+         wire: str, cpu_seconds: int, memory_bytes: int) -> None:
+    # runs in the job's own process
+    if resource is not None:
+        # the soft CPU limit sends SIGXCPU, which kills the process, and the hard one a second later SIGKILL
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 1))
+        # RLIMIT_DATA rather than RLIMIT_AS, so mapping a large upload read-only doesn't count against the job
+        resource.setrlimit(resource.RLIMIT_DATA, (memory_bytes, memory_bytes))
+    try:
+        if path is not None:
+            result = endpoint.get_data_from_file(program, path, backend, mode, wire)
+        else:
+            result = endpoint.build_data(program, data, backend, mode, wire)
+        sender.send((DONE, result))
+    except MemoryError:
+        sender.send((FAILED, "Memory limit exceeded!"))
+    except Exception as e:
+        sender.send((FAILED, endpoint.describe_error(e)))
+    finally:
+        sender.close()
+
+
+def exit_reason(process: multiprocessing.Process) -> str:
+    if process.exitcode == -getattr(signal, "SIGXCPU", 0):
+        return "CPU time limit exceeded!"
+    if process.exitcode == -getattr(signal, "SIGKILL", 0):
+        return "Worker was killed!"
+    return "Worker exited with code " + str(process.exitcode) + "!"
+
+
+queue = None
+queue_lock = threading.Lock()
+
+
+def get_queue() -> JobQueue:
+    global queue
+    with queue_lock:
+        if queue is None:
+            queue = JobQueue()
+            atexit.register(queue.shutdown)
+        return queue
@@ -0,0 +1,206 @@
+# coding=utf-8
+from __future__ import annotations
+
+import difflib
+from typing import List, Callable, Optional, NewType, Union, Dict
+
+import compile
+import execute
+import token_source
+
+
+# Lowers a compiled statement list into nested closures once, so that running it never dispatches on AST node types.
+# The closures operate on a ClosureExecute, which shares its storage and graph handling with execute.Execute.
+
+
+def fail(*args) -> Callable:
+    def run(*_) -> None:
+        raise Exception(*args)
+    return run
+
+
+def lower_statements(commands: List[compile.Statement]) -> Command:
+    lowered = tuple(lower_statement(command) for command in commands)
+
+    def run(state: ClosureExecute) -> None:
+        for command in lowered:
+            command(state)
+    return Command(run)
+
+
+def lower_statement(command: compile.Statement) -> Command:
+    if isinstance(command, compile.Initializer):
+        if command.type == "newgraph":
+            def run(state: ClosureExecute) -> None:
+                if execute.GRAPH_NAME in state.values:
+                    raise Exception("Attempting to initialize graph when one already exists!")
+                state.store(compile.VarName(execute.GRAPH_NAME), execute.Graph())
+            return Command(run)
+        return Command(fail("Unknown initializer!", command.type))
+
+    elif isinstance(command, compile.Token):
+        assigners = tuple((lower_assignment(expression), numeric)
+                          for expression, numeric in zip(command.expression_list, command.numeric))
+        typed = [expression for expression, numeric in zip(command.expression_list, command.numeric) if numeric]
+
+        if not typed:
+            def run(state: ClosureExecute) -> None:
+                T = state.read_token()
+                for assign, _ in assigners:
+                    assign(state, T)
+        else:
+            def run(state: ClosureExecute) -> None:
+                T = state.read_token()
+                N = execute.parse_int(T, typed[0])
+                for assign, numeric in assigners:
+                    assign(state, N if numeric else T)
+        return Command(run)
+
+    elif isinstance(command, compile.Hint):
+        if command.targets is not None:
+            source = lower_value(command.source)
+            targets = tuple(lower_assignment(expression) for expression in command.targets)
+
+            def run(state: ClosureExecute) -> None:
+                T = source(state)
+                for assign in targets:
+                    assign(state, T)
+            return Command(run)
+
+        pairs = tuple((lower_value(expression), lower_assignment(expression))
+                      for expression in command.expression_list)
+
+        def run(state: ClosureExecute) -> None:
+            T = None
+            for get, _ in pairs:
+                T = get(state)
+                if T is not None:
+                    break
+            if T is None:
+                raise Exception("Value hint is indeterminate!")
+            for get, assign in pairs:
+                if get(state) is None:
+                    assign(state, T)
+        return Command(run)
+
+    elif isinstance(command, compile.Loop):
+        body = lower_statements(command.statements)
+
+        def run(state: ClosureExecute) -> None:
+            state.run_loop(command, lambda: body(state))
+        return Command(run)
+
+    elif isinstance(command, compile.TestCases):
+        return Command(fail("Test cases run through cases.run_cases!"))
+
+    return Command(fail("Statement type unknown!", type(command)))
+
+
+def lower_value(expression: compile.Expression) -> Getter:
+    if isinstance(expression, compile.Constant):
+        value = expression.value
+        return Getter(lambda state: value)
+
+    elif isinstance(expression, compile.Variable):
+        name = expression.name
+        return Getter(lambda state: state.values.get(name))
+
+    elif isinstance(expression, compile.MathExpression):
+        lhs = lower_value(expression.lhs)
+        rhs = lower_value(expression.rhs)
+        op = expression.operator.lookup(compile.EXECUTE)
+
+        def get(state: ClosureExecute) -> Optional[execute.VarVal]:
+            a = lhs(state)
+            b = rhs(state)
+            if a is None or b is None:
+                return None
+            return op(a, b)
+        return Getter(get)
+
+    elif isinstance(expression, compile.Keyword):
+        return Getter(lambda state: None)
+
+    return Getter(fail("Expression type unknown!", type(expression), expression))
+
+
+def lower_assignment(expression: compile.Expression) -> Assigner:
+    if isinstance(expression, compile.Constant):
+        return Assigner(fail("Unable to assign to constant!"))
+
+    elif isinstance(expression, compile.Variable):
+        name = expression.name
+        return Assigner(lambda state, curr_val: state.store(name, curr_val))
+
+    elif isinstance(expression, compile.MathExpression):
+        get_lhs = lower_value(expression.lhs)
+        get_rhs = lower_value(expression.rhs)
+        assign_lhs = lower_assignment(expression.lhs)
+        assign_rhs = lower_assignment(expression.rhs)
+        solve_lhs = expression.operator.lookup(compile.GET_LHS)
+        solve_rhs = expression.operator.lookup(compile.GET_RHS)
+
+        if expression.solve == "rhs":
+            def assign(state: ClosureExecute, curr_val: execute.VarVal) -> None:
+                assign_rhs(state, solve_rhs(get_lhs(state), curr_val))
+            return Assigner(assign)
+        elif expression.solve == "lhs":
+            def assign(state: ClosureExecute, curr_val: execute.VarVal) -> None:
+                assign_lhs(state, solve_lhs(get_rhs(state), curr_val))
+            return Assigner(assign)
+
+        def assign(state: ClosureExecute, curr_val: execute.VarVal) -> None:
+            a = get_lhs(state)
+            b = get_rhs(state)
+            if a is None and b is None:
+                raise Exception("Both sides of an arithmetic expression are indeterminate!", expression)
+            elif a is not None and b is not None:
+                raise Exception("Expression already fully defined!")
+            elif b is None:
+                assign_rhs(state, solve_rhs(a, curr_val))
+            else:
+                assign_lhs(state, solve_lhs(b, curr_val))
+        return Assigner(assign)
+
+    elif isinstance(expression, compile.Keyword):
+        if expression.name == "ENDPOINT":
+            def assign(state: ClosureExecute, curr_val: execute.VarVal) -> None:
+                state.get_graph().add_endpoint(str(curr_val), state.loopcnts)
+        elif expression.name == "VERTEX":
+            def assign(state: ClosureExecute, curr_val: execute.VarVal) -> None:
+                state.get_graph().add_vertex(str(curr_val), state.loopcnts)
+        elif expression.name == "VERTICES":
+            def assign(state: ClosureExecute, curr_val: execute.VarVal) -> None:
+                state.get_graph().set_vertices(curr_val, state.loopcnts)
+        elif expression.name in ("HEAD", "TAIL"):
+            assign = fail("Directed graphs not yet supported!")
+        else:
+            assign = fail("Keyword type unknown!")
+        return Assigner(assign)
+
+    return Assigner(fail("Expression type unknown!", expression, type(expression)))
+
+
+class ClosureExecute(execute.Execute):
+    def __init__(self, ast: List[compile.Statement], S: Union[str, token_source.TokenSource],
+                 program: Command = None, bulk: bool = True,
+                 inherited: Optional[Dict[compile.VarName, execute.VarVal]] = None) -> None:
+        # pass a program from lower_statements to reuse it across inputs
+        self.program = program
+        super().__init__(ast, S, bulk, inherited)
+
+    def run(self, ast: List[compile.Statement]) -> None:
+        if self.program is None:
+            self.program = lower_statements(ast)
+        self.program(self)
+
+
+def diff_backends(ast: List[compile.Statement], S: str) -> List[str]:
+    expected = repr(execute.Execute(ast, S).get_data()).splitlines()
+    actual = repr(ClosureExecute(ast, S).get_data()).splitlines()
+    return list(difflib.unified_diff(expected, actual, "interpreter", "closures", lineterm=""))
+
+
+Command = NewType("Command", Callable[[ClosureExecute], None])
+Getter = NewType("Getter", Callable[[ClosureExecute], Optional[execute.VarVal]])
+Assigner = NewType("Assigner", Callable[[ClosureExecute, execute.VarVal], None])
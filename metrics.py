@@ -0,0 +1,198 @@
+# coding=utf-8
+from __future__ import annotations
+
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, List, Optional, Tuple, Union
+
+import token_source
+
+# Wall clock and CPU time of each stage of a request, and the size of its input, kept as histograms for /metrics in
+# the Prometheus text format and as the Server-Timing header of the request they came from. Stages nest, and each
+# only counts its own time, so "serialize" doesn't include the layout made while serializing. GRAPHVIS_METRICS=0
+# turns it all off, leaving a flag check per stage. Jobs and parallel batches run in other processes and aren't seen.
+
+ENABLED = os.environ.get("GRAPHVIS_METRICS", "1") != "0"
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = tuple(float(10 ** i) for i in range(1, 9))
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...]) -> None:
+        self.buckets = buckets
+        # not cumulative; the last is everything above the largest bucket
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Family:
+    # histograms of one metric, one per set of label values
+    def __init__(self, name: str, description: str, labels: Tuple[str, ...], buckets: Tuple[float, ...]) -> None:
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets = buckets
+        self.histograms: Dict[Tuple[str, ...], Histogram] = {}
+
+    def observe(self, values: Tuple[str, ...], value: float) -> None:
+        with lock:
+            histogram = self.histograms.get(values)
+            if histogram is None:
+                histogram = self.histograms[values] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    def exposition(self) -> List[str]:
+        out = ["# HELP " + self.name + " " + self.description, "# TYPE " + self.name + " histogram"]
+        with lock:
+            for values, histogram in sorted(self.histograms.items()):
+                labels = ",".join(label + '="' + value + '"' for label, value in zip(self.labels, values))
+                total = 0
+                for bound, count in zip(self.buckets + (float("inf"),), histogram.counts):
+                    total += count
+                    le = "+Inf" if bound == float("inf") else format_number(bound)
+                    out.append(self.name + "_bucket{" + labels + (',' if labels else '') + 'le="' + le + '"} '
+                               + str(total))
+                out.append(self.name + "_sum{" + labels + "} " + format_number(histogram.sum))
+                out.append(self.name + "_count{" + labels + "} " + str(histogram.count))
+        return out
+
+
+lock = threading.Lock()
+stage_seconds = Family("graphvis_stage_seconds", "Time spent in each stage of a request, not counting nested stages.",
+                       ("stage", "clock"), SECONDS_BUCKETS)
+request_seconds = Family("graphvis_request_seconds", "Wall clock time of whole requests.", ("route", "status"),
+                         SECONDS_BUCKETS)
+input_size = Family("graphvis_input_size", "Tokens read, and vertices and edges laid out, per graph.", ("dimension",),
+                    SIZE_BUCKETS)
+FAMILIES = [stage_seconds, request_seconds, input_size]
+
+
+class Timings:
+    # the stages of one request, in the order they finished, for its Server-Timing header
+    def __init__(self) -> None:
+        self.start = time.perf_counter()
+        self.stages: List[Tuple[str, float, float]] = []
+
+    def header(self) -> str:
+        out = [stage + ";dur=" + "%.3f" % (1000 * wall) + ';desc="cpu ' + "%.3f" % (1000 * cpu) + 'ms"'
+               for stage, wall, cpu in self.stages]
+        out.append("total;dur=" + "%.3f" % (1000 * (time.perf_counter() - self.start)))
+        return ", ".join(out)
+
+
+class Stage:
+    def __init__(self, name: str) -> None:
+        self.name = name
+        # time spent in stages nested inside this one, taken off its own
+        self.nested_wall = 0.0
+        self.nested_cpu = 0.0
+
+    def __enter__(self) -> Stage:
+        stack = getattr(local, "stack", None)
+        if stack is None:
+            stack = local.stack = []
+        stack.append(self)
+        self.wall = time.perf_counter()
+        self.cpu = time.thread_time()
+        return self
+
+    def __exit__(self, *_) -> None:
+        wall = time.perf_counter() - self.wall
+        cpu = time.thread_time() - self.cpu
+        stack = local.stack
+        stack.pop()
+        if stack:
+            stack[-1].nested_wall += wall
+            stack[-1].nested_cpu += cpu
+        wall -= self.nested_wall
+        cpu -= self.nested_cpu
+        stage_seconds.observe((self.name, "wall"), wall)
+        stage_seconds.observe((self.name, "cpu"), cpu)
+        timings = getattr(local, "timings", None)
+        if timings is not None:
+            timings.stages.append((self.name, wall, cpu))
+
+
+class NoStage:
+    def __enter__(self) -> NoStage:
+        return self
+
+    def __exit__(self, *_) -> None:
+        pass
+
+
+local = threading.local()
+NO_STAGE = NoStage()
+
+
+def stage(name: str) -> Union[Stage, NoStage]:
+    if not ENABLED:
+        return NO_STAGE
+    return Stage(name)
+
+
+def size(dimension: str, value: int) -> None:
+    if ENABLED:
+        input_size.observe((dimension,), value)
+
+
+def counted(source: Union[str, token_source.TokenSource]) -> Union[str, token_source.TokenSource]:
+    # the source, counting the tokens read from it when metrics are on; see tokens_read
+    if not ENABLED:
+        return source
+    if isinstance(source, str):
+        source = token_source.StringTokens(source)
+    return token_source.CountingTokens(source)
+
+
+def tokens_read(source: Union[str, token_source.TokenSource]) -> None:
+    if isinstance(source, token_source.CountingTokens):
+        size("tokens", source.taken())
+
+
+def start_request() -> Optional[Timings]:
+    if not ENABLED:
+        return None
+    local.timings = Timings()
+    local.stack = []
+    return local.timings
+
+
+def finish_request(route: str, status: int) -> Optional[str]:
+    # the Server-Timing header of the request the thread was handling
+    timings = getattr(local, "timings", None)
+    if timings is None:
+        return None
+    local.timings = None
+    request_seconds.observe((route, str(status)), time.perf_counter() - timings.start)
+    return timings.header()
+
+
+def format_number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def gauges(name: str, description: str, values: Dict[str, Dict[str, int]]) -> List[str]:
+    # a two level dictionary of numbers, like endpoint.get_cache_stats, as one gauge labelled by both keys
+    out = ["# HELP " + name + " " + description, "# TYPE " + name + " gauge"]
+    for group, stats in sorted(values.items()):
+        for stat, value in sorted(stats.items()):
+            out.append(name + '{group="' + group + '",stat="' + stat + '"} ' + format_number(value))
+    return out
+
+
+def exposition(extra: List[str] = ()) -> str:
+    out = []
+    for family in FAMILIES:
+        out += family.exposition()
+    out += extra
+    return "\n".join(out) + "\n"
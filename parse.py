@@ -6,11 +6,12 @@ from typing import List, Dict, Union, Optional, NewType, Tuple
 GRAMMAR = '''
 GOAL = STATEMENTS
 STATEMENTS = [STATEMENT]
-STATEMENT = INITIALIZER | HINT | LOOP | TOKEN
+STATEMENT = INITIALIZER | HINT | LOOP | TESTCASES | TOKEN
 TOKEN = VALUE | "<" EXPRESSION_LIST ">"
 EXPRESSION_LIST = [EXPRESSION, ","]
 HINT = "(" EXPRESSION "=" EXPRESSION ")" | "(" EXPRESSION_LIST ")"
 LOOP = "forall" VALUE "{" STATEMENTS "}"
+TESTCASES = "testcases" VALUE "{" STATEMENTS "}"
 EXPRESSION = SECOND_EXPRESSION FIRST_OPERATOR EXPRESSION | SECOND_EXPRESSION
 SECOND_EXPRESSION = SINGLETON SECOND_OPERATOR SECOND_EXPRESSION | SINGLETON
 SINGLETON = "(" EXPRESSION ")" | VALUE
@@ -78,6 +79,9 @@ class ParseNode:
         self.type = type
         self.value = value
         self.children = []
+        # where the rule matched in the text, trailing whitespace included; words and literals don't get one
+        self.start = None
+        self.end = None
 
     def add_child(self, node: "ParseNode") -> None:
         self.children.append(node)
@@ -99,6 +103,18 @@ class ParseNode:
         return out
 
 
+class PackratCache:
+    table: Dict[Tuple[NodeType, int], IsMatch]
+
+    def __init__(self) -> None:
+        self.table = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self) -> str:
+        return "PackratCache(hits=" + str(self.hits) + ", misses=" + str(self.misses) + ")"
+
+
 NodeType = NewType("NodeType", str)
 Target = NewType("Target", Union[Array, OneOf])
 Grammar = NewType("Grammar", Dict[NodeType, Target])
@@ -180,33 +196,49 @@ def build_proc_grammar(raw_grammar: str) -> Grammar:
     return Grammar(proc_grammar)
 
 
-def build_parse_tree(S: str, proc_grammar: Grammar) -> IsMatch:
-    return match(NodeType("GOAL"), S, proc_grammar)
+def build_parse_tree(S: str, proc_grammar: Grammar, cache: PackratCache = None) -> IsMatch:
+    return match(NodeType("GOAL"), S, proc_grammar, 0, cache)
 
 
-def match_array(goal: NodeType, S: str, grammar: Grammar, i: int) -> IsMatch:
+def match_array(goal: NodeType, S: str, grammar: Grammar, i: int, cache: PackratCache = None) -> IsMatch:
     element = grammar[goal].element
     delim = grammar[goal].delim
-    if not match(element, S, grammar, i):
+    if not match(element, S, grammar, i, cache):
         return None
     out = ParseNode(goal)
+    out.start = i
     while True:
-        x = match(element, S, grammar, i)
+        x = match(element, S, grammar, i, cache)
         if not x:
+            out.end = i
             return out, i
         out.add_child(x[0])
         i = x[1]
         if delim:
             if S[i:i+len(delim)] != delim:
+                out.end = i
                 return out, i
             i += len(delim)
         while i != len(S) and S[i].isspace():
             i += 1
 
 
-def match(goal: NodeType, S: str, grammar: Grammar, i: int = 0) -> IsMatch:
+def match(goal: NodeType, S: str, grammar: Grammar, i: int = 0, cache: PackratCache = None) -> IsMatch:
+    if cache is None:
+        return match_uncached(goal, S, grammar, i, cache)
+    key = (goal, i)
+    if key in cache.table:
+        cache.hits += 1
+        return cache.table[key]
+    cache.misses += 1
+    out = match_uncached(goal, S, grammar, i, cache)
+    cache.table[key] = out
+    return out
+
+
+def match_uncached(goal: NodeType, S: str, grammar: Grammar, i: int, cache: Optional[PackratCache]) -> IsMatch:
     if type(grammar[goal]) is Array:
-        return match_array(goal, S, grammar, i)
+        return match_array(goal, S, grammar, i, cache)
     for possibility in grammar[goal].possibilities:
         pos = i
         out = ParseNode(goal)
@@ -232,18 +264,23 @@ def match(goal: NodeType, S: str, grammar: Grammar, i: int = 0) -> IsMatch:
                     break
                 out.add_child(ParseNode(NodeType("<WORD>"), curr))
             else:
-                x = match(element, S, grammar, pos)
+                x = match(element, S, grammar, pos, cache)
                 if not x:
                     fail = True
                     break
                 out.add_child(x[0])
                 pos = x[1]
         if not fail:
+            out.start = i
+            out.end = pos
             return out, pos
     return None
 
 
-def parse(S: str, proc_grammar: Grammar = None) -> IsMatch:
+def parse(S: str, proc_grammar: Grammar = None, packrat: bool = False, cache: PackratCache = None) -> IsMatch:
+    # pass in a cache to read back its hit / miss counts after the parse
     if proc_grammar is None:
         proc_grammar = build_proc_grammar(GRAMMAR)
-    return match(NodeType("GOAL"), S, proc_grammar)[0]
+    if packrat and cache is None:
+        cache = PackratCache()
+    return match(NodeType("GOAL"), S, proc_grammar, 0, cache)[0]
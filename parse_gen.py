@@ -0,0 +1,165 @@
+# coding=utf-8
+from __future__ import annotations
+
+import re
+from typing import List, Dict, Callable
+
+import parse
+
+WORD_PATTERN = r"[^\W_]+"  # same characters as str.isalnum
+WHITESPACE_PATTERN = r"\s*"  # same characters as str.isspace
+
+HEADER = '''# coding=utf-8
+# Generated by parse_gen.py - do not edit by hand.
+import re
+
+from parse import ParseNode
+
+WHITESPACE = re.compile(r"''' + WHITESPACE_PATTERN + '''")
+'''
+
+
+class Generator:
+    patterns: Dict[str, str]
+    lines: List[str]
+
+    def __init__(self, grammar: parse.Grammar) -> None:
+        self.grammar = grammar
+        self.patterns = {}
+        self.lines = []
+
+    def pattern(self, regex: str) -> str:
+        if regex not in self.patterns:
+            self.patterns[regex] = "PATTERN_" + str(len(self.patterns))
+        return self.patterns[regex]
+
+    def emit(self, indent: int, line: str) -> None:
+        self.lines.append("    " * indent + line)
+
+    def source(self) -> str:
+        out = HEADER
+        for regex, name in self.patterns.items():
+            out += name + " = re.compile(" + repr(regex) + ")\n"
+        out += "\n\n" + "\n".join(self.lines) + "\n"
+        return out
+
+    def rule_name(self, goal: parse.NodeType) -> str:
+        if goal not in self.grammar:
+            raise Exception("Unknown grammar rule!", goal)
+        return "match_" + goal
+
+    def generate(self) -> str:
+        # every rule gets its own packrat memo, indexed by the rule's position in the grammar
+        for slot, (goal, target) in enumerate(self.grammar.items()):
+            self.emit(0, "def " + self.rule_name(goal) + "(S, i, memo):")
+            self.emit(1, "seen = memo[" + str(slot) + "]")
+            self.emit(1, "if i in seen:")
+            self.emit(2, "return seen[i]")
+            if isinstance(target, parse.Array):
+                self.generate_array(goal, target)
+            else:
+                self.generate_one_of(goal, target)
+            self.lines.append("")
+            self.lines.append("")
+        self.emit(0, "RULES = {")
+        for goal in self.grammar:
+            self.emit(1, repr(goal) + ": " + self.rule_name(goal) + ",")
+        self.emit(0, "}")
+        self.lines.append("")
+        self.lines.append("")
+        self.emit(0, "def match(goal, S, i=0):")
+        self.emit(1, "return RULES[goal](S, i, [{} for _ in range(" + str(len(self.grammar)) + ")])")
+        return self.source()
+
+    def generate_array(self, goal: parse.NodeType, target: parse.Array) -> None:
+        element = self.rule_name(target.element)
+        self.emit(1, "x = " + element + "(S, i, memo)")
+        self.emit(1, "if x is None:")
+        self.emit(2, "seen[i] = None")
+        self.emit(2, "return None")
+        self.emit(1, "start = i")
+        self.emit(1, "out = ParseNode(" + repr(goal) + ")")
+        self.emit(1, "out.start = i")
+        self.emit(1, "while True:")
+        self.emit(2, "out.children.append(x[0])")
+        self.emit(2, "i = x[1]")
+        if target.delim:
+            self.emit(2, "m = " + self.pattern(re.escape(target.delim)) + ".match(S, i)")
+            self.emit(2, "if m is None:")
+            self.emit(3, "out.end = i")
+            self.emit(3, "seen[start] = out, i")
+            self.emit(3, "return out, i")
+            self.emit(2, "i = m.end()")
+        self.emit(2, "i = WHITESPACE.match(S, i).end()")
+        self.emit(2, "x = " + element + "(S, i, memo)")
+        self.emit(2, "if x is None:")
+        self.emit(3, "out.end = i")
+        self.emit(3, "seen[start] = out, i")
+        self.emit(3, "return out, i")
+
+    def generate_one_of(self, goal: parse.NodeType, target: parse.OneOf) -> None:
+        for possibility in target.possibilities:
+            self.emit(1, "while True:")
+            self.emit(2, "pos = i")
+            self.emit(2, "out = ParseNode(" + repr(goal) + ")")
+            elements = possibility.elements
+            j = 0
+            while j < len(elements):
+                element = elements[j]
+                # a terminal swallows the whitespace that follows it in the same regex
+                trailing = ""
+                if isinstance(element, (parse.Literal, parse.Value)):
+                    while j + 1 < len(elements) and isinstance(elements[j + 1], parse.WhiteSpace):
+                        trailing = WHITESPACE_PATTERN
+                        j += 1
+                if isinstance(element, parse.Literal):
+                    self.emit(2, "m = " + self.pattern(re.escape(element.value) + trailing) + ".match(S, pos)")
+                    self.emit(2, "if m is None:")
+                    self.emit(3, "break")
+                    self.emit(2, "pos = m.end()")
+                    if target.hold_literals:
+                        self.emit(2, "out.children.append(ParseNode('LITERAL', " + repr(element.value) + "))")
+                elif isinstance(element, parse.WhiteSpace):
+                    self.emit(2, "pos = WHITESPACE.match(S, pos).end()")
+                elif isinstance(element, parse.Value):
+                    self.emit(2, "m = " + self.pattern("(" + WORD_PATTERN + ")" + trailing) + ".match(S, pos)")
+                    self.emit(2, "if m is None:")
+                    self.emit(3, "break")
+                    self.emit(2, "out.children.append(ParseNode('<WORD>', m.group(1)))")
+                    self.emit(2, "pos = m.end()")
+                else:
+                    self.emit(2, "x = " + self.rule_name(element) + "(S, pos, memo)")
+                    self.emit(2, "if x is None:")
+                    self.emit(3, "break")
+                    self.emit(2, "out.children.append(x[0])")
+                    self.emit(2, "pos = x[1]")
+                j += 1
+            self.emit(2, "out.start = i")
+            self.emit(2, "out.end = pos")
+            self.emit(2, "seen[i] = out, pos")
+            self.emit(2, "return out, pos")
+        self.emit(1, "seen[i] = None")
+        self.emit(1, "return None")
+
+
+def generate_source(raw_grammar: str) -> str:
+    return Generator(parse.build_proc_grammar(raw_grammar)).generate()
+
+
+def write_parser(raw_grammar: str, path: str) -> None:
+    with open(path, "w") as f:
+        f.write(generate_source(raw_grammar))
+
+
+def build_parser(raw_grammar: str) -> Callable[[parse.NodeType, str, int], parse.IsMatch]:
+    namespace = {}
+    exec(compile(generate_source(raw_grammar), "<parse_gen>", "exec"), namespace)
+    return namespace["match"]
+
+
+# built once at import so requests never touch the grammar string again
+MATCH = build_parser(parse.GRAMMAR)
+
+
+def parse_generated(S: str) -> parse.ParseNode:
+    return MATCH(parse.NodeType("GOAL"), S, 0)[0]
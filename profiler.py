@@ -0,0 +1,74 @@
+# coding=utf-8
+from __future__ import annotations
+
+import time
+from typing import Any, Dict, List, Set, Tuple
+
+import compile
+
+# Counts and times every statement the interpreter runs. A loop counts once each time it is entered and its total time
+# includes its body; self time is what is left once the statements run inside it are taken away, which is where the
+# time actually went. Loops that go through the bulk fast path never run their bodies statement by statement, so all
+# of their time is their own.
+
+
+class Profiler:
+    def __init__(self) -> None:
+        self.counts: Dict[int, int] = {}
+        self.total: Dict[int, float] = {}
+        self.own: Dict[int, float] = {}
+        # loops that ran in bulk at least once
+        self.bulk: Set[int] = set()
+        # [statement id, start, time of the statements run inside it so far] for every statement still running
+        self.stack: List[list] = []
+
+    def enter(self, statement: compile.Statement) -> None:
+        self.stack.append([id(statement), time.perf_counter(), 0.0])
+
+    def leave(self) -> None:
+        key, start, inner = self.stack.pop()
+        elapsed = time.perf_counter() - start
+        self.counts[key] = self.counts.get(key, 0) + 1
+        self.total[key] = self.total.get(key, 0.0) + elapsed
+        self.own[key] = self.own.get(key, 0.0) + elapsed - inner
+        if self.stack:
+            self.stack[-1][2] += elapsed
+
+    def report(self, ast: List[compile.Statement], text: str) -> Dict[str, Any]:
+        # every statement of the format, hottest first, with where it is in the format text; statements that never
+        # ran come last
+        statements = []
+        for statement, depth in walk(ast, 0):
+            key = id(statement)
+            out = {"kind": type(statement).__name__.lower(), "depth": depth, "count": self.counts.get(key, 0),
+                   "self": self.own.get(key, 0.0), "total": self.total.get(key, 0.0)}
+            if isinstance(statement, compile.Loop):
+                out["bulk"] = key in self.bulk
+            if statement.span is not None and statement.span[0] is not None:
+                out.update(locate(text, *statement.span))
+            statements.append(out)
+        statements.sort(key=lambda out: (-out["self"], -out["count"]))
+        return {"backend": "interpreter", "seconds": sum(out["self"] for out in statements), "statements": statements}
+
+
+def walk(statements: List[compile.Statement], depth: int) -> List[Tuple[compile.Statement, int]]:
+    out = []
+    for statement in statements:
+        out.append((statement, depth))
+        if isinstance(statement, (compile.Loop, compile.TestCases)):
+            out += walk(statement.statements, depth + 1)
+    return out
+
+
+def locate(text: str, start: int, end: int) -> Dict[str, Any]:
+    # offsets, and 1-based lines and columns, without the whitespace the parser took after the statement; clients
+    # that turn newlines into CRLF can still place the statement by line and column
+    end = start + len(text[start:end].rstrip())
+    start_line, start_column = line_column(text, start)
+    end_line, end_column = line_column(text, end)
+    return {"start": start, "end": end, "line": start_line, "column": start_column, "end_line": end_line,
+            "end_column": end_column, "text": text[start:end].split("\n", 1)[0]}
+
+
+def line_column(text: str, offset: int) -> Tuple[int, int]:
+    return text.count("\n", 0, offset) + 1, offset - text.rfind("\n", 0, offset)
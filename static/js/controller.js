@@ -1,13 +1,152 @@
+let stream_id = null;
+let stream_abort = null;
+
 $("#graphdata").submit((e) => {
-    $.ajax("/process_graph", {
+    // profiles only come with whole responses
+    if ($("#stream").prop("checked") && !$("#profile_run").prop("checked")) {
+        hide_profile();
+        stream_graph();
+        return false;
+    }
+    fetch("/process_graph", {
         method: "post",
-        dataType: "json",
-        data: $("#graphdata").serialize(),
-        success: (data, status, xhr) => {
-            console.log(data);
-            draw_graph(data["graph"]);
-            load_data(data["varvals"], data["vargraph"]);
+        headers: {"Accept": COLUMNAR_TYPE + ", application/json;q=0.5"},
+        body: new FormData($("#graphdata")[0])
+    }).then((response) => {
+        if (response.headers.get("Content-Type") === COLUMNAR_TYPE) {
+            return response.arrayBuffer().then(decode_columnar);
+        }
+        return response.json();
+    }).then((data) => {
+        console.log(data);
+        show_data(data);
+        if ("profile" in data) {
+            show_profile(data["profile"], $("#graphformat").val());
+        } else {
+            hide_profile();
         }
     });
     return false;
-});
\ No newline at end of file
+});
+
+$("#case").change(() => {
+    show_case(Number($("#case").val()));
+});
+
+// formats with test cases answer with a graph for each case, shown one at a time, and the case shown is the one
+// analyses are asked about
+let cases = null;
+
+function show_data(data) {
+    if ("cases" in data) {
+        cases = data["cases"];
+        let select = $("#case").empty();
+        cases.forEach((_, i) => select.append($("<option>").val(i).text("Test case " + (i + 1))));
+        $("#case_group").toggle(cases.length !== 0);
+        if (cases.length !== 0) {
+            show_case(0);
+        }
+        return;
+    }
+    cases = null;
+    $("#case").empty();
+    $("#case_group").hide();
+    draw_graph(data["graph"]);
+    load_data(data["varvals"], data["vargraph"]);
+}
+
+function show_case(i) {
+    clear_overlay();
+    draw_graph(cases[i]["graph"]);
+    load_data(cases[i]["varvals"], cases[i]["vargraph"]);
+}
+
+$("#cancel_stream").click(() => {
+    cancel_stream();
+});
+
+// fills the test data with data generated from the format on the server, a different data set every time
+$("#generate").click(() => {
+    let body = new FormData();
+    body.append("graphformat", $("#graphformat").val());
+    body.append("seed", Math.floor(Math.random() * 2 ** 31));
+    fetch("/generate", {method: "post", body: body}).then((response) => response.text()).then((text) => {
+        $("textarea[name=graphdata]").val(text);
+    });
+});
+
+function stream_graph() {
+    cancel_stream();
+    stream_abort = new AbortController();
+    $("#cancel_stream").prop("disabled", false);
+    fetch("/stream_graph", {
+        method: "post",
+        body: new FormData($("#graphdata")[0]),
+        signal: stream_abort.signal
+    }).then((response) => {
+        let reader = response.body.getReader();
+        let decoder = new TextDecoder();
+        let buffer = "";
+        let read = () => reader.read().then(({done, value}) => {
+            if (done) {
+                stream_finished();
+                return;
+            }
+            buffer += decoder.decode(value, {stream: true});
+            let end;
+            while ((end = buffer.indexOf("\n\n")) !== -1) {
+                handle_event(buffer.slice(0, end));
+                buffer = buffer.slice(end + 2);
+            }
+            return read();
+        });
+        return read();
+    }).catch((error) => {
+        if (error.name !== "AbortError") {
+            throw error;
+        }
+    });
+}
+
+function handle_event(text) {
+    let name = "message";
+    let data = "";
+    for (let line of text.split("\n")) {
+        if (line.startsWith("event: ")) {
+            name = line.slice(7);
+        } else if (line.startsWith("data: ")) {
+            data += line.slice(6);
+        }
+    }
+    data = JSON.parse(data);
+    if (name === "graph") {
+        stream_id = data["id"];
+        show_data(data);
+    } else if (name === "cases") {
+        // test cases come whole, already laid out
+        show_data(data);
+        stream_finished();
+    } else if (name === "positions") {
+        update_positions(data["x"], data["y"]);
+    } else if (name === "converged") {
+        console.log(data);
+        stream_finished();
+    }
+}
+
+function cancel_stream() {
+    // the server stops laying the graph out, and closing the connection stops whatever it had sent already
+    if (stream_id !== null) {
+        fetch("/cancel_stream/" + stream_id, {method: "post"});
+    }
+    if (stream_abort !== null) {
+        stream_abort.abort();
+    }
+    stream_finished();
+}
+
+function stream_finished() {
+    stream_id = null;
+    stream_abort = null;
+    $("#cancel_stream").prop("disabled", true);
+}
\ No newline at end of file
@@ -37,3 +37,35 @@ function get_vars() {
 function select_var(v) {
     active_vars.push(v);
 }
+
+
+const COLUMNAR_TYPE = "application/x-graphvis-columnar";
+const COLUMNAR_MAGIC = "GVC1";
+const COLUMN_TYPES = {"int32": Int32Array, "uint32": Uint32Array, "uint8": Uint8Array};
+
+// Typed arrays read in the platform's byte order, which is little-endian everywhere a browser runs.
+function decode_columnar(buffer) {
+    let view = new DataView(buffer);
+    let magic = String.fromCharCode(...new Uint8Array(buffer, 0, 4));
+    if (magic !== COLUMNAR_MAGIC) {
+        throw new Error("Not a columnar response: " + magic);
+    }
+    let length = view.getUint32(4, true);
+    let data = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 8, length)));
+    let start = 8 + length;
+    let columns = {};
+    for (let column of data["columns"]) {
+        columns[column["name"]] = new COLUMN_TYPES[column["type"]](buffer, start + column["offset"], column["length"]);
+    }
+
+    let decoder = new TextDecoder();
+    let names = [];
+    for (let i = 0; i !== data["graph"]["vertices"]; ++i) {
+        names.push(decoder.decode(columns["names"].subarray(columns["name_offsets"][i], columns["name_offsets"][i + 1])));
+    }
+    data["graph"]["names"] = names;
+    for (let name of ["x", "y", "head", "tail"]) {
+        data["graph"][name] = columns[name];
+    }
+    return data;
+}
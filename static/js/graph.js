@@ -8,6 +8,8 @@ let graph = []; // [vertex_index -> [adjacent vertex indices]
 let vertex_pos = []; // [{"x" : x, "y" : y}]
 let vertex_vel = []; // [{"x" : x, "y" : y}]
 let edge_list = []; // [[v_index_1, v_index_2]]
+let edge_lines = []; // [edge_index -> edge canvas object]
+let animating = false;
 
 const RADIUS = 20;
 
@@ -77,6 +79,7 @@ function addEdge(i, j, v) {
     edges[i].push([path, label]);
     edges[j].push([path, label]);
     edge_list.push([i, j]);
+    edge_lines.push(path);
 }
 
 function redrawEdges(i) {
@@ -120,6 +123,7 @@ function positionNodes(now) {
     }
     canvas.renderAll();
     if (stop) {
+        animating = false;
         return;
     }
     requestAnimationFrame(positionNodes);
@@ -132,11 +136,38 @@ function draw_graph(g) {
     graph = [];
     vertex_pos = [];
     edge_list = [];
-    for (let vertex of g["vertices"]) {
-        addNode(vertex["name"], vertex["x"], vertex["y"]);
+    edge_lines = [];
+    if ("names" in g) {
+        // a columnar graph, from decode_columnar
+        for (let i = 0; i !== g["vertices"]; ++i) {
+            addNode(g["names"][i], g["x"][i], g["y"][i]);
+        }
+        for (let i = 0; i !== g["edges"]; ++i) {
+            addEdge(g["head"][i], g["tail"][i], "")
+        }
+    } else {
+        for (let vertex of g["vertices"]) {
+            addNode(vertex["name"], vertex["x"], vertex["y"]);
+        }
+        for (let edge of g["edges"]) {
+            addEdge(edge["head"], edge["tail"], "")
+        }
     }
-    for (let edge of g["edges"]) {
-        addEdge(edge["head"], edge["tail"], "")
+    animate();
+}
+
+function animate() {
+    if (!animating) {
+        animating = true;
+        requestAnimationFrame(positionNodes);
     }
-    requestAnimationFrame(positionNodes);
+}
+
+function update_positions(xs, ys) {
+    // positions streamed from the server replace the ones being animated here
+    for (let i = 0; i !== nodes.length; ++i) {
+        vertex_pos[i] = {"x": xs[i], "y": ys[i]};
+        vertex_vel[i] = {"x": 0, "y": 0};
+    }
+    animate();
 }
\ No newline at end of file
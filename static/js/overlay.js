@@ -0,0 +1,84 @@
+// Paints an analysis from /analyze over the graph drawn: vertices are filled by the per-vertex values of the analysis,
+// edges it singles out are drawn thicker, and its totals are shown below the graph.
+const UNREACHED = "#cccccc";
+const PICKED = "#dc3545";
+const TREE = "#007bff";
+
+$("#analysis").submit(() => {
+    let body = new FormData($("#analysis")[0]);
+    body.append("graphformat", $("#graphformat").val());
+    body.append("graphdata", $("textarea[name=graphdata]").val());
+    fetch("/analyze", {method: "post", body: body}).then((response) => response.json()).then(show_overlay);
+    return false;
+});
+
+$("#clear_analysis").click(() => {
+    clear_overlay();
+});
+
+function show_overlay(data) {
+    clear_overlay();
+    let vertices = data["vertices"];
+    let edges = data["edges"] || {};
+    let analysis = data["analysis"];
+    if (analysis === "components") {
+        fill_vertices(vertices["component"], (c) => hue(c));
+        stroke_edges(edges["component"], (c) => hue(c));
+    } else if (analysis === "bipartite") {
+        fill_vertices(vertices["side"], (side) => side === 0 ? "#ffc107" : "#17a2b8");
+        stroke_edges(edges["conflict"], (conflict) => conflict ? PICKED : null);
+    } else if (analysis === "degrees") {
+        let most = Math.max(data["summary"]["max"], 1);
+        fill_vertices(vertices["degree"], (degree) => shade(degree / most));
+    } else {
+        // searches and shortest paths, shaded by how far from the source each vertex is
+        let far = vertices["distance"] || vertices["rank"];
+        let most = Math.max(...far, 1);
+        fill_vertices(far, (value) => value < 0 ? UNREACHED : shade(value / most));
+        stroke_edges(edges["tree"], (tree) => tree ? TREE : null);
+        if ("path" in data) {
+            let path = new Set(data["path"]["edges"]);
+            stroke_edges(edge_lines.map((_, i) => path.has(i)), (on) => on ? PICKED : null);
+        }
+    }
+    canvas.renderAll();
+    $("#analysis_summary").text(JSON.stringify(data["summary"], null, 1)).show();
+}
+
+function fill_vertices(values, colour) {
+    for (let i = 0; i !== nodes.length && i !== values.length; ++i) {
+        nodes[i].item(0).set("fill", colour(values[i]));
+    }
+}
+
+function stroke_edges(values, colour) {
+    if (values === undefined) {
+        return;
+    }
+    for (let i = 0; i !== edge_lines.length && i !== values.length; ++i) {
+        let stroke = colour(values[i]);
+        if (stroke !== null) {
+            edge_lines[i].set({"stroke": stroke, "strokeWidth": 3});
+        }
+    }
+}
+
+function hue(i) {
+    return "hsl(" + ((i * 137) % 360) + ", 70%, 70%)";
+}
+
+function shade(fraction) {
+    // from faint at 0 to the picked colour at 1
+    return "rgba(220, 53, 69, " + (0.1 + 0.8 * fraction) + ")";
+}
+
+function clear_overlay() {
+    for (let node of nodes) {
+        node.item(0).set("fill", "white");
+    }
+    for (let line of edge_lines) {
+        line.set({"stroke": "black", "strokeWidth": 1});
+    }
+    canvas.renderAll();
+    $("#analysis_summary").empty().hide();
+}
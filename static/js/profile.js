@@ -0,0 +1,63 @@
+// Shows a profile from /process_graph over the format text: every character is shaded by the self time of the
+// innermost statement it belongs to, with the counts and times in its tooltip, and the hottest statements are listed.
+const PROFILE_RANKED = 10;
+
+function show_profile(profile, text) {
+    // the server may have been sent CRLF newlines, so statements are placed by line and column
+    text = text.replace(/\r\n/g, "\n");
+    let line_starts = [0];
+    for (let i = 0; i !== text.length; ++i) {
+        if (text[i] === "\n") {
+            line_starts.push(i + 1);
+        }
+    }
+    let offset = (line, column) => line_starts[line - 1] + column - 1;
+
+    let statements = profile["statements"].filter((statement) => statement["count"] > 0 && "line" in statement);
+    let hottest = Math.max(...statements.map((statement) => statement["self"]), 1e-9);
+    // outer statements first, so inner ones take over the characters they cover
+    let spans = statements.map((statement) => ({
+        start: offset(statement["line"], statement["column"]),
+        end: offset(statement["end_line"], statement["end_column"]),
+        statement: statement
+    }));
+    spans.sort((a, b) => (b.end - b.start) - (a.end - a.start));
+    let owner = new Array(text.length).fill(null);
+    for (let span of spans) {
+        owner.fill(span.statement, span.start, span.end);
+    }
+
+    let overlay = $("#profile").empty().show();
+    for (let i = 0; i < text.length;) {
+        let j = i;
+        while (j < text.length && owner[j] === owner[i]) {
+            ++j;
+        }
+        let piece = $("<span>").text(text.slice(i, j));
+        if (owner[i] !== null) {
+            piece.css("background-color", "rgba(220, 53, 69, " + (0.6 * owner[i]["self"] / hottest) + ")");
+            piece.attr("title", describe_statement(owner[i]));
+        }
+        overlay.append(piece);
+        i = j;
+    }
+
+    let ranking = $("#profile_ranking").empty().show();
+    for (let statement of statements.slice(0, PROFILE_RANKED)) {
+        ranking.append($("<li>").text(describe_statement(statement) + ": " + statement["text"]));
+    }
+}
+
+function describe_statement(statement) {
+    let out = (1000 * statement["self"]).toFixed(2) + " ms self, " + (1000 * statement["total"]).toFixed(2)
+        + " ms total, run " + statement["count"] + " times";
+    if (statement["bulk"]) {
+        out += " in bulk";
+    }
+    return out;
+}
+
+function hide_profile() {
+    $("#profile").empty().hide();
+    $("#profile_ranking").empty().hide();
+}
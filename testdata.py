@@ -0,0 +1,1068 @@
+# coding=utf-8
+# Run from the repository root with: python -m testdata format.txt [--vertices 1000] [--edges 5000] [--shape tree]
+#                                                                   [--size n=10] [--seed 1] [--files 10 --output dir]
+from __future__ import annotations
+
+import argparse
+import io
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, FrozenSet, Iterable, Iterator, List, Optional, Set, TextIO, Tuple, Union
+
+import numpy as np
+
+import cases
+import compile
+import parse_gen
+
+# Test data for a format, made by running the format backwards: instead of reading tokens into values, the generator
+# picks the values and writes out the tokens that read into them. The graph comes first, from a generator for the
+# requested shape, and the format's VERTEX and ENDPOINT keywords take its vertices and endpoints in order, so that
+# reading the data back builds exactly that graph. Counts of loops that read vertices or endpoints are chosen to use
+# the graph up, split at random between loops running more than once; other counts, and values nothing depends on, come
+# from the sizes given or are made up.
+#
+# A value reaches a token through its expression: <ENDPOINT + 1> is written as the endpoint plus one, and checked
+# against what Execute will work out from it with the operator's get_lhs and get_rhs. A token read into a variable that
+# a later hint passes on to the graph, like a in (ENDPOINT, a - 1), is held back until the hint has solved the same way
+# what it has to be. Loops made only of tokens and hints, and loops of those, run a block of iterations at a time, on
+# columns of values.
+
+SHAPES = ("tree", "connected", "simple", "dag")
+DEFAULT_VERTICES = 10
+# count of loops that don't read the graph, and of test cases, when no size is given for them
+DEFAULT_COUNT = 10
+DEFAULT_CASES = 3
+# values are made up from 1 to this
+FREE_VALUES = 1000
+# iterations of a loop run at once on columns
+BLOCK_ROWS = 1 << 16
+# characters the writer holds before writing them out
+BUFFER_SIZE = 1 << 20
+MAX_ELEMENTS = 10 ** 8
+STREAM_KEYWORDS = ("ENDPOINT", "VERTEX")
+
+GENERATE_WORKERS = os.cpu_count() or 1
+# vertices and edges of all the cases together before they are worth generating in other processes
+PARALLEL_SIZE = 200000
+
+# workers are forked with the plan already built; elsewhere each worker builds its own
+if "fork" in multiprocessing.get_all_start_methods():
+    generate_context = multiprocessing.get_context("fork")
+else:
+    generate_context = multiprocessing.get_context()
+
+
+def make_graph(vertices: int, edges: Optional[int], shape: FrozenSet[str], rng: np.random.Generator) -> np.ndarray:
+    # (edges, 2) vertex indices, head first, in random order; a tree is also connected and simple, and a DAG has no
+    # self loops and every edge going forward in some order of the vertices
+    for name in shape:
+        if name not in SHAPES:
+            raise Exception("Unknown graph shape!", name)
+    tree = "tree" in shape
+    connected = tree or "connected" in shape
+    simple = tree or "simple" in shape
+    dag = "dag" in shape
+    pairs = vertices * (vertices - 1) // 2
+    if edges is None:
+        edges = max(vertices - 1, 0) if tree else min(2 * vertices, pairs if simple or dag else 2 * vertices)
+    if vertices < 0 or edges < 0 or vertices + edges > MAX_ELEMENTS:
+        raise Exception("Graph size out of range!", vertices, edges)
+    if tree and edges != max(vertices - 1, 0):
+        raise Exception("A tree has one edge less than it has vertices!", vertices, edges)
+    if connected and edges < vertices - 1:
+        raise Exception("Too few edges for a connected graph!", vertices, edges)
+    if simple and edges > pairs:
+        raise Exception("Too many edges for a simple graph!", vertices, edges)
+    if dag and edges and vertices < 2:
+        raise Exception("A DAG's edges need two vertices!", vertices, edges)
+
+    parts = [np.zeros((0, 2), dtype=np.int64)]
+    if connected and vertices > 1:
+        # a random recursive tree: each vertex hangs off one that came before it
+        child = np.arange(1, vertices)
+        parts.append(np.stack([(rng.random(vertices - 1) * child).astype(np.int64), child], axis=1))
+    extra = edges - sum(len(part) for part in parts)
+    if simple:
+        parts.append(distinct_pairs(vertices, extra, np.concatenate(parts), rng))
+    else:
+        heads = rng.integers(0, vertices, extra)
+        tails = rng.integers(0, vertices, extra)
+        if dag:
+            # no self loops: the tail is any other vertex
+            tails = (heads + rng.integers(1, vertices, extra)) % vertices
+        parts.append(np.stack([heads, tails], axis=1))
+    out = np.concatenate(parts)
+    if dag:
+        out.sort(axis=1)
+    else:
+        flip = rng.random(len(out)) < 0.5
+        out[flip] = out[flip, ::-1]
+    out = out[rng.permutation(len(out))]
+    # relabelled, so that the first vertices aren't always the roots; a DAG's order goes along
+    return rng.permutation(vertices)[out] if vertices else out
+
+
+def distinct_pairs(vertices: int, count: int, taken: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    # count pairs of different vertices, lowest first, none of them in taken or twice
+    if count <= 0:
+        return np.zeros((0, 2), dtype=np.int64)
+    taken = np.sort(taken, axis=1)
+    taken_keys = taken[:, 0] * vertices + taken[:, 1]
+    pairs = vertices * (vertices - 1) // 2
+    if 2 * (count + len(taken)) > pairs:
+        # dense: pick from all of them
+        lo, hi = np.triu_indices(vertices, 1)
+        keys = lo.astype(np.int64) * vertices + hi
+        keys = keys[~np.isin(keys, taken_keys)]
+        keys = keys[rng.permutation(len(keys))[:count]]
+    else:
+        keys = np.zeros(0, dtype=np.int64)
+        while len(keys) < count:
+            need = count - len(keys)
+            lo = rng.integers(0, vertices, need + need // 8 + 16)
+            hi = rng.integers(0, vertices, len(lo))
+            lo, hi = np.minimum(lo, hi), np.maximum(lo, hi)
+            fresh = lo[lo != hi] * vertices + hi[lo != hi]
+            keys = np.unique(np.concatenate([keys, fresh[~np.isin(fresh, taken_keys)]]))
+        keys = keys[rng.permutation(len(keys))[:count]]
+    return np.stack([keys // vertices, keys % vertices], axis=1)
+
+
+def same(a: Any, b: Any) -> bool:
+    # for values and columns of them alike
+    equal = a == b
+    return equal if type(equal) is bool else bool(np.all(equal))
+
+
+def leaves(expression: compile.Expression) -> List[Union[compile.Keyword, compile.Variable]]:
+    if isinstance(expression, (compile.Keyword, compile.Variable)):
+        return [expression]
+    if isinstance(expression, compile.MathExpression):
+        return leaves(expression.lhs) + leaves(expression.rhs)
+    return []
+
+
+def contains(expression: compile.Expression, leaf: Union[compile.Keyword, compile.Variable]) -> bool:
+    return any(other is leaf for other in leaves(expression))
+
+
+def keyword_count(statement: compile.Statement, keyword: str) -> int:
+    # values of a keyword a token or hint takes each time it runs
+    if isinstance(statement, compile.Token):
+        expressions = statement.expression_list
+    elif isinstance(statement, compile.Hint):
+        expressions = statement.targets if statement.targets is not None else statement.expression_list
+    else:
+        return 0
+    return sum(isinstance(leaf, compile.Keyword) and leaf.name == keyword
+               for expression in expressions for leaf in leaves(expression))
+
+
+class Plan:
+    # what the generator needs to know about a format before writing anything
+    def __init__(self, statements: List[compile.Statement]) -> None:
+        self.ast = statements
+        self.header, self.cases = compile.split_cases(statements)
+        self.cases_name = None
+        if self.cases is not None and isinstance(self.cases.count, compile.Variable):
+            self.cases_name = self.cases.count.name
+        # loops by the variable counting them, in format order, and the loops each loop is inside, outermost first
+        self.count_loops: Dict[compile.VarName, List[compile.Loop]] = {}
+        self.parents: Dict[int, List[compile.Loop]] = {}
+        # values of each keyword every iteration of a loop takes outside the loops inside it, the keywords it and the
+        # loops inside it take, and how many of the statements after it and in its body take each keyword
+        self.direct: Dict[int, Dict[str, int]] = {}
+        self.takes: Dict[int, Set[str]] = {}
+        self.after: Dict[int, Dict[str, int]] = {}
+        self.inside: Dict[int, Dict[str, int]] = {}
+        self.keywords: Set[str] = set()
+        # hints with the loop, or test cases, they run in, and the innermost loop, and scope, of every store and read
+        self.hints: List[Tuple[compile.Hint, Optional[int]]] = []
+        self.assigned: Dict[compile.VarName, Set[Optional[int]]] = {}
+        self.scopes: Dict[compile.VarName, Set[Optional[int]]] = {}
+        self.read: Dict[compile.VarName, List[Set[int]]] = {}
+        self.visit(statements, [], None)
+
+        self.counts = set(self.count_loops) | ({self.cases_name} if self.cases_name is not None else set())
+        # values kept after the iteration that stored them, for later loops over the same counters
+        self.escaping = {name for name, loops in self.assigned.items() for loop in loops
+                         if loop is not None and any(loop not in chain for chain in self.read.get(name, ()))}
+        self.deferred = self.plan_deferred()
+        self.columnar = {key for key, loop in self.loops().items() if self.is_columnar(loop)}
+        # what a columnar body reads from outside it, which can't be waiting on one of its hints
+        self.outer = {key: self.outer_names(self.loops()[key]) for key in self.columnar}
+        # tokens each iteration of a loop writes outside the loops inside it
+        self.tokens = {key: sum(isinstance(statement, compile.Token) for statement in loop.statements)
+                       for key, loop in self.loops().items()}
+
+    def visit(self, statements: List[compile.Statement], parents: List[compile.Loop], scope: Optional[int]) -> None:
+        chain = {id(loop) for loop in parents}
+        innermost = id(parents[-1]) if parents else None
+        for i, statement in enumerate(statements):
+            if isinstance(statement, compile.Loop):
+                self.parents[id(statement)] = parents
+                if isinstance(statement.loopvar, compile.Variable):
+                    self.count_loops.setdefault(statement.loopvar.name, []).append(statement)
+                for name in cases.variable_names(statement.loopvar):
+                    self.read.setdefault(name, []).append(chain)
+                self.visit(statement.statements, parents + [statement], id(statement))
+                self.direct[id(statement)] = {keyword: sum(keyword_count(child, keyword)
+                                                           for child in statement.statements)
+                                              for keyword in STREAM_KEYWORDS}
+                self.takes[id(statement)] = {keyword for keyword in STREAM_KEYWORDS
+                                             if self.direct[id(statement)][keyword]
+                                             or any(keyword in self.takes.get(id(child), ())
+                                                    for child in statement.statements)}
+                self.inside[id(statement)] = {keyword: sum(keyword in self.takes.get(id(child), ())
+                                                           for child in statement.statements)
+                                              for keyword in STREAM_KEYWORDS}
+            elif isinstance(statement, compile.TestCases):
+                for name in cases.variable_names(statement.count):
+                    self.read.setdefault(name, []).append(chain)
+                self.visit(statement.statements, parents, id(statement))
+            elif isinstance(statement, (compile.Token, compile.Hint)):
+                expressions = statement.expression_list
+                if isinstance(statement, compile.Hint):
+                    self.hints.append((statement, scope))
+                    if statement.source is not None:
+                        expressions = statement.targets
+                        for name in cases.variable_names(statement.source):
+                            self.read.setdefault(name, []).append(chain)
+                for expression in expressions:
+                    assigned, read = cases.split_names(expression)
+                    for name in assigned:
+                        self.assigned.setdefault(name, set()).add(innermost)
+                        self.scopes.setdefault(name, set()).add(scope)
+                    for name in read:
+                        self.read.setdefault(name, []).append(chain)
+                    self.keywords.update(leaf.name for leaf in leaves(expression)
+                                         if isinstance(leaf, compile.Keyword))
+        for i, statement in enumerate(statements):
+            if isinstance(statement, compile.Loop):
+                self.after[id(statement)] = {keyword: sum(keyword in self.takes.get(id(later), ())
+                                                          for later in statements[i + 1:])
+                                             for keyword in STREAM_KEYWORDS}
+
+    def loops(self) -> Dict[int, compile.Loop]:
+        return {id(loop): loop for group in self.count_loops.values() for loop in group}
+
+    def plan_deferred(self) -> Set[compile.VarName]:
+        # variables read from a token but only passed on to the graph or a loop count by a later hint, which is what
+        # decides them; the hint's source is solved for the one variable stored in the same scope as the hint, and
+        # can't be with more than one
+        deferred = set()
+        changed = True
+        while changed:
+            changed = False
+            for hint, scope in self.hints:
+                if hint.source is None:
+                    continue
+                names = {name for name in cases.variable_names(hint.source) if scope in self.scopes.get(name, ())}
+                if len(names) != 1 or names <= deferred:
+                    continue
+                if any(isinstance(leaf, compile.Keyword) or leaf.name in self.counts or leaf.name in deferred
+                       for target in hint.targets for leaf in leaves(target)):
+                    deferred |= names
+                    changed = True
+        return deferred
+
+    def is_columnar(self, loop: compile.Loop, nested: bool = False) -> bool:
+        # A body of tokens and hints settled when compiling, keeping nothing past its iteration and deciding no loop
+        # count but those of the loops inside it, runs the same statements every iteration, so a block of iterations
+        # can run as one on columns. A loop inside over a count read in the body runs on columns too, one row per
+        # iteration of both, as long as the two don't take the same keyword, whose values would then come in the
+        # wrong order.
+        kept = self.escaping | self.counts
+        inner = [statement for statement in loop.statements if isinstance(statement, compile.Loop)]
+        for statement in inner:
+            if nested or not isinstance(statement.loopvar, compile.Variable) or not self.is_columnar(statement, True) \
+                    or self.count_loops[statement.loopvar.name] != [statement] \
+                    or self.outer_names(statement) & self.deferred:
+                return False
+            kept = kept - {statement.loopvar.name}
+        for keyword in STREAM_KEYWORDS:
+            if self.inside[id(loop)][keyword] > 1 or self.inside[id(loop)][keyword] and self.direct[id(loop)][keyword]:
+                return False
+        for statement in loop.statements:
+            if isinstance(statement, compile.Hint):
+                if statement.source is None:
+                    return False
+                expressions = statement.targets
+            elif isinstance(statement, compile.Token):
+                expressions = statement.expression_list
+            elif isinstance(statement, compile.Loop):
+                continue
+            else:
+                return False
+            for expression in expressions:
+                if cases.split_names(expression)[0] & kept:
+                    return False
+                if any(isinstance(leaf, compile.Keyword) and leaf.name not in STREAM_KEYWORDS
+                       for leaf in leaves(expression)):
+                    return False
+        return True
+
+    def outer_names(self, loop: compile.Loop) -> Set[compile.VarName]:
+        # what a body, and the loops inside it, read from outside it
+        assigned = set()
+        read = set()
+        for statement in loop.statements:
+            if isinstance(statement, compile.Loop):
+                read |= self.outer_names(statement) | cases.variable_names(statement.loopvar)
+                continue
+            expressions = statement.expression_list
+            if isinstance(statement, compile.Hint):
+                read |= cases.variable_names(statement.source)
+                expressions = statement.targets
+            for expression in expressions:
+                names = cases.split_names(expression)
+                assigned |= names[0]
+                read |= names[1]
+        return read - assigned
+
+    def count_loop(self, name: compile.VarName, running: List[compile.Loop]) -> Optional[compile.Loop]:
+        # the first loop a count read now goes to: one over it inside the loops running
+        for loop in self.count_loops.get(name, ()):
+            parents = self.parents[id(loop)]
+            if len(parents) >= len(running) and all(a is b for a, b in zip(parents, running)):
+                return loop
+        return None
+
+    def __repr__(self) -> str:
+        return "Plan(" + str(len(self.ast)) + " statements, deferred " + str(sorted(self.deferred)) + ")"
+
+
+class TokenWriter:
+    # Tokens joined by spaces and lines, written out a buffer at a time. A slot keeps the place of a token that isn't
+    # known yet; nothing is written while one is open, so slots should be filled soon after they are taken.
+    def __init__(self, out: TextIO, buffer_size: int = BUFFER_SIZE) -> None:
+        self.out = out
+        self.buffer_size = buffer_size
+        self.parts: List[Optional[str]] = []
+        self.size = 0
+        self.open = 0
+        # what goes before the next token
+        self.separator = ""
+
+    def token(self, value: Any) -> None:
+        text = str(value)
+        self.parts.append(self.separator)
+        self.parts.append(text)
+        self.separator = " "
+        self.size += len(text) + 1
+        if self.size >= self.buffer_size and not self.open:
+            self.flush()
+
+    def slot(self) -> int:
+        self.parts.append(self.separator)
+        self.parts.append(None)
+        self.separator = " "
+        self.open += 1
+        return len(self.parts) - 1
+
+    def fill(self, slot: int, value: Any) -> None:
+        text = str(value)
+        self.parts[slot] = text
+        self.open -= 1
+        self.size += len(text)
+        if self.size >= self.buffer_size and not self.open:
+            self.flush()
+
+    def end_line(self) -> None:
+        if self.separator:
+            self.separator = "\n"
+
+    def block(self, text: str) -> None:
+        # whole lines, written straight after what is buffered
+        if not text:
+            return
+        self.end_line()
+        self.parts.append(self.separator)
+        self.parts.append(text)
+        self.separator = "\n"
+        self.size += len(text) + 1
+        if not self.open:
+            self.flush()
+
+    def flush(self) -> None:
+        if self.open:
+            raise Exception("Token slots are still open!", self.open)
+        self.out.write("".join(self.parts))
+        self.parts = []
+        self.size = 0
+
+    def close(self) -> None:
+        self.end_line()
+        if self.separator:
+            self.parts.append("\n")
+        self.flush()
+
+
+class Columns:
+    # Takes the place of the writer while a block of iterations runs: every token is a column of them, and every loop
+    # run inside the block the lines it wrote, with how many of them each iteration wrote.
+    def __init__(self, rows: int) -> None:
+        self.rows = rows
+        self.segments: List[Union[List[Any], Tuple[List[str], np.ndarray]]] = []
+
+    def token(self, value: Any) -> None:
+        if not self.segments or type(self.segments[-1]) is not list:
+            self.segments.append([])
+        self.segments[-1].append(value)
+
+    def slot(self) -> Tuple[int, int]:
+        self.token(None)
+        return len(self.segments) - 1, len(self.segments[-1]) - 1
+
+    def fill(self, slot: Tuple[int, int], value: Any) -> None:
+        self.segments[slot[0]][slot[1]] = value
+
+    def end_line(self) -> None:
+        pass
+
+    def nested(self, lines: List[str], counts: np.ndarray) -> None:
+        self.segments.append((lines, counts))
+
+    def table(self, columns: List[Any]) -> str:
+        # a line of tokens per row
+        table = np.stack([np.broadcast_to(column, (self.rows,)) for column in columns], axis=1)
+        line = " ".join(["%d"] * len(columns))
+        return "\n".join([line] * self.rows) % tuple(table.ravel().tolist())
+
+    def text(self) -> str:
+        if len(self.segments) == 1 and type(self.segments[0]) is list and self.rows:
+            return self.table(self.segments[0])
+        return "\n".join(line for line in self.lines() if line)
+
+    def lines(self) -> List[str]:
+        # what each row wrote, as one string
+        if not self.rows:
+            return []
+        pieces = []
+        for segment in self.segments:
+            if type(segment) is list:
+                pieces.append(self.table(segment).split("\n"))
+            else:
+                lines, counts = segment
+                ends = np.cumsum(counts).tolist()
+                pieces.append(["\n".join(lines[end - count:end]) for end, count in zip(ends, counts.tolist())])
+        if len(pieces) == 1:
+            return pieces[0]
+        return ["\n".join(piece for piece in row if piece) for row in zip(*pieces)]
+
+
+class Frame:
+    def __init__(self, loop: compile.Loop, count: int) -> None:
+        self.loop = loop
+        self.name = loop.loopvar.name
+        self.count = count
+        self.index = 0
+        # variables stored during the current iteration
+        self.names: List[compile.VarName] = []
+
+
+class Deferred:
+    # a token held back in a slot until a hint decides one of the variables it is read into
+    def __init__(self, token: compile.Token, slot: Union[int, Tuple[int, int]], names: List[compile.VarName],
+                 depth: int) -> None:
+        self.token = token
+        self.slot = slot
+        self.names = names
+        self.depth = depth
+
+
+# what decides a token's value, in order: a keyword, a variable a later hint decides, a loop count, anything else
+KEYWORD, DEFERRED, COUNT, FREE, KNOWN = range(5)
+
+
+class Generator:
+    def __init__(self, plan: Plan, out: TokenWriter, sizes: Dict[str, int], shape: FrozenSet[str],
+                 seed: Tuple[int, ...], inherited: Optional[Dict[compile.VarName, int]] = None,
+                 parallel: Optional[bool] = None, budget: Optional[int] = None) -> None:
+        self.plan = plan
+        self.out = out
+        self.sizes = sizes
+        self.shape = shape
+        self.seed = seed
+        self.parallel = parallel
+        # tokens still allowed, or None for no limit
+        self.budget = budget
+        self.max_tokens = budget
+        self.rng = np.random.default_rng(list(seed))
+        self.values = dict(inherited or {})
+        self.frames: List[Frame] = []
+        self.counters: Dict[compile.VarName, int] = {}
+        # values of escaping variables by the counters of the loops they were stored under
+        self.history: Dict[compile.VarName, Tuple[Tuple[compile.VarName, ...], Dict[Tuple[int, ...], Any]]] = {}
+        self.pending: Dict[compile.VarName, Deferred] = {}
+        self.initialized = False
+        self.streams: Optional[Dict[str, np.ndarray]] = None
+        self.taken = {keyword: 0 for keyword in STREAM_KEYWORDS}
+        # rows of a block running on columns, and the columns of keyword values it hands out
+        self.width: Optional[int] = None
+        self.blocks: Dict[str, Iterator[np.ndarray]] = {}
+
+    def graph(self) -> Dict[str, np.ndarray]:
+        # made the first time anything needs it: the vertex names in order, and the endpoints' names in order
+        if self.streams is None:
+            vertices = self.sizes.get("vertices", DEFAULT_VERTICES)
+            edges = self.sizes.get("edges") if "ENDPOINT" in self.plan.keywords else 0
+            pairs = make_graph(vertices, edges, self.shape, self.rng)
+            if "VERTEX" in self.plan.keywords:
+                names = self.rng.permutation(vertices) + 1
+            else:
+                # VERTICES names them from 0
+                names = np.arange(vertices)
+            self.vertices = vertices
+            self.streams = {"VERTEX": names, "ENDPOINT": names[pairs.ravel()]}
+        return self.streams
+
+    def spend(self, tokens: int) -> None:
+        # charged before tokens are made, so that a format asked for too much fails before holding it all
+        if self.budget is not None:
+            self.budget -= tokens
+            if self.budget < 0:
+                raise Exception("Test data has too many tokens!", self.max_tokens)
+
+    def left(self, keyword: str) -> int:
+        return len(self.graph()[keyword]) - self.taken[keyword]
+
+    def take(self, keyword: str, count: int) -> np.ndarray:
+        if count > self.left(keyword):
+            raise Exception("Format reads more of the graph than there is!", keyword, count, self.left(keyword))
+        out = self.streams[keyword][self.taken[keyword]:self.taken[keyword] + count]
+        self.taken[keyword] += count
+        return out
+
+    def take_one(self, keyword: str) -> Any:
+        if self.width is not None:
+            return next(self.blocks[keyword])
+        return int(self.take(keyword, 1)[0])
+
+    def made_up(self, name: compile.VarName) -> Any:
+        if name in self.sizes:
+            return self.sizes[name]
+        if self.width is not None:
+            return self.rng.integers(1, FREE_VALUES + 1, self.width)
+        return int(self.rng.integers(1, FREE_VALUES + 1))
+
+    def run(self, statements: List[compile.Statement]) -> None:
+        for statement in statements:
+            if isinstance(statement, compile.Initializer):
+                if statement.type != "newgraph":
+                    raise Exception("Unknown initializer!", statement.type)
+                if self.initialized:
+                    raise Exception("Attempting to initialize graph when one already exists!")
+                self.initialized = True
+                self.graph()
+            elif isinstance(statement, compile.Token):
+                self.run_token(statement)
+            elif isinstance(statement, compile.Hint):
+                self.run_hint(statement)
+            elif isinstance(statement, compile.Loop):
+                self.run_loop(statement)
+            elif isinstance(statement, compile.TestCases):
+                self.run_cases(statement)
+            else:
+                raise Exception("Statement type unknown!", type(statement))
+
+    def finish(self) -> None:
+        self.settle(0)
+        if self.streams is not None:
+            for keyword in STREAM_KEYWORDS:
+                if keyword in self.plan.keywords and self.left(keyword):
+                    raise Exception("Format doesn't read the whole graph!", keyword, self.left(keyword))
+
+    def rank(self, leaf: Optional[Union[compile.Keyword, compile.Variable]]) -> int:
+        if leaf is None:
+            return KNOWN
+        if isinstance(leaf, compile.Keyword):
+            return KEYWORD
+        if leaf.name in self.plan.deferred:
+            return DEFERRED
+        if leaf.name in self.plan.counts:
+            return COUNT
+        return FREE
+
+    def wanted(self, leaf: Union[compile.Keyword, compile.Variable]) -> Any:
+        # the value a leaf has to end up with
+        if isinstance(leaf, compile.Keyword):
+            if leaf.name in STREAM_KEYWORDS:
+                return self.take_one(leaf.name)
+            elif leaf.name == "VERTICES":
+                self.graph()
+                return self.vertices
+            elif leaf.name in ("HEAD", "TAIL"):
+                raise Exception("Directed graphs not yet supported!")
+            raise Exception("Keyword type unknown!")
+        if leaf.name in self.plan.counts:
+            return self.count(leaf.name)
+        return self.made_up(leaf.name)
+
+    def count(self, name: compile.VarName) -> int:
+        if name == self.plan.cases_name and not self.frames:
+            return self.sizes.get(name, self.sizes.get("cases", DEFAULT_CASES))
+        loop = self.plan.count_loop(name, [frame.loop for frame in self.frames])
+        if loop is None:
+            return self.sizes.get(name, DEFAULT_COUNT)
+        takes = [keyword for keyword in STREAM_KEYWORDS if keyword in self.plan.takes[id(loop)]]
+        if not takes:
+            return self.sizes.get(name, DEFAULT_COUNT)
+        keyword = takes[0]
+        width = self.plan.direct[id(loop)][keyword]
+        if not width or self.plan.inside[id(loop)][keyword]:
+            # the loops inside it share out the graph; a line per vertex is as good a start as any
+            self.graph()
+            return self.sizes.get(name, self.vertices)
+        if self.width is not None:
+            return self.share_rows(loop, keyword, width)
+        # the loops between here and this one multiply what each of its iterations takes
+        between = self.plan.parents[id(loop)][len(self.frames):]
+        for outer in between:
+            value = self.peek(outer.loopvar.name)
+            width *= value if type(value) is int and value > 0 else 1
+        # what is left goes to this loop if nothing else will take any, otherwise its share at random
+        sites = 1 + self.plan.after[id(between[0] if between else loop)][keyword]
+        for frame in self.frames:
+            sites += (frame.count - frame.index - 1) * self.plan.inside[id(frame.loop)][keyword] \
+                + self.plan.after[id(frame.loop)][keyword]
+        left = self.left(keyword)
+        share = left if sites == 1 else int(self.rng.binomial(left, 1 / sites))
+        return share // width
+
+    def share_rows(self, loop: compile.Loop, keyword: str, width: int) -> np.ndarray:
+        # counts of a loop inside a block running on columns, for all the block's rows at once: the rows' share of what
+        # is left, counting each row as one of the places left to take some, split at random between them
+        block = self.frames[-1]
+        rows = self.width
+        sites = rows * (1 + self.plan.after[id(loop)][keyword]) \
+            + (block.count - block.index - rows) * self.plan.inside[id(block.loop)][keyword]
+        for frame in self.frames[:-1]:
+            sites += (frame.count - frame.index - 1) * self.plan.inside[id(frame.loop)][keyword] \
+                + self.plan.after[id(frame.loop)][keyword]
+        sites += self.plan.after[id(block.loop)][keyword]
+        left = self.left(keyword)
+        share = left if sites == rows else int(self.rng.binomial(left, rows / sites))
+        return self.rng.multinomial(share // width, np.full(rows, 1 / rows))
+
+    def known(self, name: compile.VarName) -> bool:
+        return name in self.values or name in self.pending or self.peek(name) is not None
+
+    def peek(self, name: compile.VarName) -> Any:
+        # a value in scope, without settling it if it is pending
+        if name in self.values:
+            return self.values[name]
+        entry = self.history.get(name)
+        if entry is not None and all(loop in self.counters for loop in entry[0]):
+            return entry[1].get(tuple(self.counters[loop] for loop in entry[0]))
+        return None
+
+    def lookup(self, name: compile.VarName) -> Any:
+        if name in self.pending:
+            self.resolve(name, self.made_up(name))
+        return self.peek(name)
+
+    def get_value(self, expression: compile.Expression) -> Any:
+        if isinstance(expression, compile.Constant):
+            return expression.value
+        elif isinstance(expression, compile.Variable):
+            return self.lookup(expression.name)
+        elif isinstance(expression, compile.MathExpression):
+            a = self.get_value(expression.lhs)
+            b = self.get_value(expression.rhs)
+            if a is None or b is None:
+                return None
+            return expression.operator.execute(a, b)
+        return None
+
+    def unknown_leaf(self, expression: compile.Expression) -> Optional[Union[compile.Keyword, compile.Variable]]:
+        # the keyword or variable a value read into the expression ends up in
+        if isinstance(expression, compile.Keyword):
+            return expression
+        elif isinstance(expression, compile.Variable):
+            return None if self.known(expression.name) else expression
+        elif isinstance(expression, compile.MathExpression):
+            lhs = self.unknown_leaf(expression.lhs)
+            rhs = self.unknown_leaf(expression.rhs)
+            if lhs is not None and rhs is not None:
+                raise Exception("Both sides of an arithmetic expression are indeterminate!", expression)
+            return lhs if lhs is not None else rhs
+        return None
+
+    def forward(self, expression: compile.Expression, leaf: Union[compile.Keyword, compile.Variable],
+                value: Any) -> Any:
+        # the value of the expression with the leaf set to value
+        if expression is leaf:
+            return value
+        if contains(expression.lhs, leaf):
+            return expression.operator.execute(self.forward(expression.lhs, leaf, value),
+                                               self.get_value(expression.rhs))
+        return expression.operator.execute(self.get_value(expression.lhs), self.forward(expression.rhs, leaf, value))
+
+    def backward(self, expression: compile.Expression, leaf: Union[compile.Keyword, compile.Variable],
+                 value: Any) -> Any:
+        # what Execute puts in the leaf when the value is read into the expression
+        if expression is leaf:
+            return value
+        if contains(expression.lhs, leaf):
+            return self.backward(expression.lhs, leaf,
+                                 expression.operator.get_lhs(self.get_value(expression.rhs), value))
+        return self.backward(expression.rhs, leaf, expression.operator.get_rhs(self.get_value(expression.lhs), value))
+
+    def through(self, expression: compile.Expression, leaf: Union[compile.Keyword, compile.Variable],
+                value: Any) -> Any:
+        # the value to read into the expression for the leaf to get value
+        out = self.forward(expression, leaf, value)
+        if not same(self.backward(expression, leaf, out), value):
+            raise Exception("Value can't be written through expression!", expression, value)
+        return out
+
+    def solve(self, expression: compile.Expression, leaf: Union[compile.Keyword, compile.Variable],
+              value: Any) -> Any:
+        # the value the leaf needs for the expression to come to value
+        out = self.backward(expression, leaf, value)
+        if not same(self.forward(expression, leaf, out), value):
+            raise Exception("Expression can't come to value!", expression, value)
+        return out
+
+    def store(self, name: compile.VarName, value: Any) -> None:
+        if name in self.values:
+            raise Exception("Variable name already defined!", name)
+        self.values[name] = value
+        if not self.frames:
+            return
+        self.frames[-1].names.append(name)
+        if name in self.plan.escaping:
+            loops, values = self.history.setdefault(name, (tuple(frame.name for frame in self.frames), {}))
+            if all(loop in self.counters for loop in loops):
+                values[tuple(self.counters[loop] for loop in loops)] = value
+
+    def assign(self, expression: compile.Expression, value: Any,
+               decided: Optional[Union[compile.Keyword, compile.Variable]] = None) -> None:
+        # a keyword other than the one that decided the value still takes its place in the graph, so the loops
+        # sharing out the graph stay in step; the graph then just isn't the one made
+        leaf = self.unknown_leaf(expression)
+        if leaf is None:
+            raise Exception("Expression already fully defined!", expression)
+        if isinstance(leaf, compile.Variable):
+            self.store(leaf.name, self.backward(expression, leaf, value))
+        elif leaf is not decided and leaf.name in STREAM_KEYWORDS:
+            self.take_one(leaf.name)
+
+    def run_token(self, token: compile.Token) -> None:
+        choices = [(self.rank(leaf), expression, leaf)
+                   for expression, leaf in ((e, self.unknown_leaf(e)) for e in token.expression_list)]
+        rank, expression, leaf = min(choices, key=lambda choice: choice[0])
+        if rank == KNOWN:
+            raise Exception("Expression already fully defined!", expression)
+        if self.width is None:
+            self.spend(1)
+        if rank == DEFERRED:
+            names = [leaf.name for rank, _, leaf in choices if rank == DEFERRED]
+            deferred = Deferred(token, self.out.slot(), names, len(self.frames))
+            for name in names:
+                self.pending[name] = deferred
+            return
+        value = self.through(expression, leaf, self.wanted(leaf))
+        self.out.token(value)
+        for other in token.expression_list:
+            self.assign(other, value, leaf)
+
+    def resolve(self, name: compile.VarName, value: Any) -> None:
+        # writes the token a pending variable is read from, now that it has to be value
+        deferred = self.pending[name]
+        for other in deferred.names:
+            del self.pending[other]
+        for expression in deferred.token.expression_list:
+            leaf = self.unknown_leaf(expression)
+            if isinstance(leaf, compile.Variable) and leaf.name == name:
+                break
+        else:
+            raise Exception("Pending variable is not in its token!", name)
+        token_value = self.through(expression, leaf, value)
+        self.out.fill(deferred.slot, token_value)
+        for other in deferred.token.expression_list:
+            self.assign(other, token_value)
+
+    def settle(self, depth: int) -> None:
+        # pending variables from this deep or deeper that nothing decided get made up
+        for name, deferred in list(self.pending.items()):
+            if deferred.depth >= depth and name in self.pending:
+                self.resolve(name, self.made_up(name))
+
+    def run_hint(self, hint: compile.Hint) -> None:
+        source, targets = hint.source, hint.targets
+        if source is None:
+            for source in hint.expression_list:
+                if self.unknown_leaf(source) is None:
+                    break
+            else:
+                raise Exception("Value hint is indeterminate!")
+            targets = [e for e in hint.expression_list if e is not source and self.unknown_leaf(e) is not None]
+        waiting = [name for name in cases.variable_names(source) if name in self.pending]
+        decided = None
+        if len(waiting) == 1:
+            # the first target wanting a particular value decides the variable the hint is waiting on
+            for target in targets:
+                decided = self.unknown_leaf(target)
+                if self.rank(decided) in (KEYWORD, COUNT):
+                    value = self.through(target, decided, self.wanted(decided))
+                    variable = next(leaf for leaf in leaves(source) if leaf.name == waiting[0])
+                    self.resolve(waiting[0], self.solve(source, variable, value))
+                    break
+            else:
+                decided = None
+        value = self.get_value(source)
+        for target in targets:
+            self.assign(target, value, decided)
+
+    def run_loop(self, loop: compile.Loop) -> None:
+        if self.width is not None:
+            self.run_nested(loop)
+            return
+        count = self.get_value(loop.loopvar) if isinstance(loop.loopvar, compile.Variable) else None
+        if type(count) is not int:
+            raise Exception("Loop count is indeterminate!", loop.loopvar)
+        if loop.loopvar.name in self.counters:
+            raise Exception("Loop variable already defined!", loop.loopvar)
+        self.out.end_line()
+        if self.width is None and id(loop) in self.plan.columnar \
+                and not any(name in self.pending for name in self.plan.outer[id(loop)]):
+            for start in range(0, count, BLOCK_ROWS):
+                self.run_block(loop, count, start, min(BLOCK_ROWS, count - start))
+            return
+        frame = Frame(loop, count)
+        self.frames.append(frame)
+        for i in range(count):
+            frame.index = self.counters[frame.name] = i
+            self.run(loop.statements)
+            self.end_iteration(frame)
+            self.out.end_line()
+        self.frames.pop()
+        del self.counters[frame.name]
+
+    def end_iteration(self, frame: Frame) -> None:
+        self.settle(len(self.frames))
+        for name in frame.names:
+            del self.values[name]
+        frame.names.clear()
+
+    def run_block(self, loop: compile.Loop, count: int, start: int, rows: int) -> None:
+        # rows iterations at once, every value a column of them
+        self.spend(rows * self.plan.tokens[id(loop)])
+        frame = Frame(loop, count)
+        frame.index = self.counters[frame.name] = start
+        self.frames.append(frame)
+        self.blocks = self.take_columns(loop, rows)
+        writer = self.out
+        self.out = Columns(rows)
+        self.width = rows
+        try:
+            self.run(loop.statements)
+            self.end_iteration(frame)
+            text = self.out.text()
+        finally:
+            self.out = writer
+            self.width = None
+            self.frames.pop()
+            del self.counters[frame.name]
+        self.check_columns(loop)
+        self.blocks = {}
+        self.out.block(text)
+
+    def run_nested(self, loop: compile.Loop) -> None:
+        # a loop inside a block running on columns: every iteration it runs for every row, as one block, with the
+        # block's values repeated for each iteration they go with
+        counts = np.maximum(np.broadcast_to(self.get_value(loop.loopvar), (self.width,)), 0)
+        rows = int(counts.sum())
+        self.spend(rows * self.plan.tokens[id(loop)])
+        saved = {name: self.values[name] for name in self.frames[-1].names}
+        for name, value in saved.items():
+            if isinstance(value, np.ndarray):
+                self.values[name] = np.repeat(value, counts)
+        frame = Frame(loop, rows)
+        self.counters[frame.name] = 0
+        self.frames.append(frame)
+        outer = self.blocks
+        self.blocks = dict(outer, **self.take_columns(loop, rows))
+        writer, width = self.out, self.width
+        self.out = Columns(rows)
+        self.width = rows
+        try:
+            self.run(loop.statements)
+            self.end_iteration(frame)
+            lines = self.out.lines()
+        finally:
+            self.out = writer
+            self.width = width
+            self.frames.pop()
+            del self.counters[frame.name]
+            self.values.update(saved)
+        self.check_columns(loop)
+        self.blocks = outer
+        self.out.nested(lines, counts)
+
+    def take_columns(self, loop: compile.Loop, rows: int) -> Dict[str, Iterator[np.ndarray]]:
+        # the keyword values a loop's body takes for rows iterations, as a column for each time it takes one
+        return {keyword: iter(self.take(keyword, rows * width).reshape(rows, width).T)
+                for keyword, width in self.plan.direct[id(loop)].items() if width}
+
+    def check_columns(self, loop: compile.Loop) -> None:
+        for keyword, width in self.plan.direct[id(loop)].items():
+            if width and next(self.blocks[keyword], None) is not None:
+                raise Exception("Loop took fewer keywords than planned!", keyword, loop)
+
+    def run_cases(self, testcases: compile.TestCases) -> None:
+        count = self.get_value(testcases.count)
+        if type(count) is not int:
+            raise Exception("Test case count is not a number!", count)
+        # every case starts from the header's values, and makes its own graph
+        self.settle(0)
+        # cases may run anywhere, so each gets an even share of the tokens left
+        budget = None if self.budget is None else self.budget // max(count, 1)
+        for text in case_texts(self.plan, self.sizes, self.shape, self.seed, count, self.values, self.parallel,
+                               budget):
+            self.out.block(text.rstrip("\n"))
+
+
+def case_texts(plan: Plan, sizes: Dict[str, int], shape: FrozenSet[str], seed: Tuple[int, ...], count: int,
+               inherited: Dict[compile.VarName, Any], parallel: Optional[bool], budget: Optional[int]) -> List[str]:
+    # case i is made from seed + (i,), wherever it runs
+    if parallel is None:
+        elements = sizes.get("vertices", DEFAULT_VERTICES) + sizes.get("edges", 2 * DEFAULT_VERTICES)
+        parallel = count > 1 and GENERATE_WORKERS > 1 and count * elements >= PARALLEL_SIZE
+    seeds = [seed + (i,) for i in range(count)]
+    if not parallel:
+        return [generate_case(plan, sizes, shape, case_seed, inherited, budget) for case_seed in seeds]
+    initargs = (plan,) if generate_context.get_start_method() == "fork" else (plan.ast,)
+    with ProcessPoolExecutor(min(GENERATE_WORKERS, count), generate_context, initializer=set_plan,
+                             initargs=initargs) as pool:
+        return list(pool.map(run_case, [sizes] * count, [shape] * count, seeds, [inherited] * count,
+                             [budget] * count))
+
+
+def generate_case(plan: Plan, sizes: Dict[str, int], shape: FrozenSet[str], seed: Tuple[int, ...],
+                  inherited: Dict[compile.VarName, Any], budget: Optional[int]) -> str:
+    out = io.StringIO()
+    writer = TokenWriter(out)
+    generator = Generator(plan, writer, sizes, shape, seed, inherited, budget=budget)
+    generator.run(plan.cases.statements)
+    generator.finish()
+    writer.close()
+    return out.getvalue()
+
+
+worker_plan = None
+
+
+def set_plan(plan: Union[Plan, List[compile.Statement]]) -> None:
+    global worker_plan
+    worker_plan = plan if isinstance(plan, Plan) else Plan(plan)
+
+
+def run_case(sizes: Dict[str, int], shape: FrozenSet[str], seed: Tuple[int, ...],
+             inherited: Dict[compile.VarName, Any], budget: Optional[int]) -> str:
+    return generate_case(worker_plan, sizes, shape, seed, inherited, budget)
+
+
+def generate(ast: Union[Plan, List[compile.Statement]], out: TextIO, sizes: Optional[Dict[str, int]] = None,
+             shape: Iterable[str] = (), seed: Union[int, Tuple[int, ...]] = 0, parallel: Optional[bool] = None,
+             max_tokens: Optional[int] = None) -> None:
+    # Writes data for the format to out. Sizes are "vertices" and "edges" of the graph, "cases" for the number of test
+    # cases, or the names of the format's variables, for the values of those that don't count the graph's loops. The
+    # same seed makes the same data; test cases are generated in parallel when there are enough of them. Formats that
+    # would write more than max_tokens fail instead, before making most of them.
+    plan = ast if isinstance(ast, Plan) else Plan(ast)
+    seed = (seed,) if isinstance(seed, int) else tuple(seed)
+    if any(part < 0 for part in seed):
+        raise Exception("Seeds can't be negative!", seed)
+    writer = TokenWriter(out)
+    generator = Generator(plan, writer, dict(sizes or {}), frozenset(shape), seed, parallel=parallel,
+                          budget=max_tokens)
+    generator.run(plan.ast)
+    generator.finish()
+    writer.close()
+
+
+def generate_string(ast: Union[Plan, List[compile.Statement]], sizes: Optional[Dict[str, int]] = None,
+                    shape: Iterable[str] = (), seed: Union[int, Tuple[int, ...]] = 0,
+                    parallel: Optional[bool] = None, max_tokens: Optional[int] = None) -> str:
+    out = io.StringIO()
+    generate(ast, out, sizes, shape, seed, parallel, max_tokens)
+    return out.getvalue()
+
+
+def generate_files(ast: List[compile.Statement], directory: str, count: int, sizes: Optional[Dict[str, int]] = None,
+                   shape: Iterable[str] = (), seed: int = 0, parallel: Optional[bool] = None) -> List[str]:
+    # count inputs, written to 0.txt, 1.txt and so on in the directory, input i from the seed (seed, i)
+    plan = Plan(ast)
+    sizes = dict(sizes or {})
+    shape = frozenset(shape)
+    os.makedirs(directory, exist_ok=True)
+    paths = [os.path.join(directory, str(i) + ".txt") for i in range(count)]
+    seeds = [(seed, i) for i in range(count)]
+    if parallel is None:
+        parallel = count > 1 and GENERATE_WORKERS > 1
+    if not parallel:
+        for path, file_seed in zip(paths, seeds):
+            write_file(plan, path, sizes, shape, file_seed)
+        return paths
+    initargs = (plan,) if generate_context.get_start_method() == "fork" else (plan.ast,)
+    with ProcessPoolExecutor(min(GENERATE_WORKERS, count), generate_context, initializer=set_plan,
+                             initargs=initargs) as pool:
+        list(pool.map(run_file, paths, [sizes] * count, [shape] * count, seeds))
+    return paths
+
+
+def write_file(plan: Plan, path: str, sizes: Dict[str, int], shape: FrozenSet[str], seed: Tuple[int, ...]) -> None:
+    with open(path, "w") as f:
+        generate(plan, f, sizes, shape, seed, parallel=False)
+
+
+def run_file(path: str, sizes: Dict[str, int], shape: FrozenSet[str], seed: Tuple[int, ...]) -> None:
+    write_file(worker_plan, path, sizes, shape, seed)
+
+
+def parse_size(text: str) -> Tuple[str, int]:
+    name, _, value = text.partition("=")
+    if not name or not value:
+        raise Exception("Sizes are given as name=value!", text)
+    return name.strip(), int(float(value))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generates test data for an input format.")
+    parser.add_argument("format", help="file holding the input format")
+    parser.add_argument("--vertices", type=float)
+    parser.add_argument("--edges", type=float)
+    parser.add_argument("--cases", type=int, help="test cases, for formats that have them")
+    parser.add_argument("--shape", default="", help="any of " + ",".join(SHAPES))
+    parser.add_argument("--size", action="append", default=[], help="a variable's value, like n=10")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--files", type=int, help="write this many inputs to the output directory")
+    parser.add_argument("--output", help="the file, or directory with --files, to write to")
+    args = parser.parse_args()
+
+    with open(args.format) as f:
+        ast = compile.compile_tree(parse_gen.parse_generated(f.read()))
+    sizes = dict(map(parse_size, args.size))
+    for name in ("vertices", "edges", "cases"):
+        if getattr(args, name) is not None:
+            sizes[name] = int(getattr(args, name))
+    shape = [name.strip() for name in args.shape.split(",") if name.strip()]
+    if args.files is not None:
+        if args.output is None:
+            raise Exception("Generating files needs an output directory!")
+        generate_files(ast, args.output, args.files, sizes, shape, args.seed)
+    elif args.output is not None:
+        with open(args.output, "w") as f:
+            generate(ast, f, sizes, shape, args.seed)
+    else:
+        generate(ast, sys.stdout, sizes, shape, args.seed)
+
+
+if __name__ == '__main__':
+    main()
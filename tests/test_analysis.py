@@ -0,0 +1,96 @@
+# coding=utf-8
+import json
+
+import numpy as np
+import pytest
+
+import analysis
+import endpoint
+
+# a triangle a b c with a tail c d e, and an edge f g on its own:
+#
+#   a - b
+#    \ /
+#     c - d - e      f - g
+NAMES = list("abcdefg")
+EDGES = [(0, 1), (1, 2), (2, 0), (2, 3), (3, 4), (5, 6)]
+
+
+@pytest.fixture
+def graph():
+    heads, tails = zip(*EDGES)
+    return analysis.GraphIndex(NAMES, np.array(heads, dtype=np.intc), np.array(tails, dtype=np.intc))
+
+
+def overlay(graph, *query):
+    out = json.loads(graph.overlay(*query))
+    assert out.pop("analysis") == query[0]
+    return out
+
+
+def test_bfs(graph):
+    out = overlay(graph, "bfs", "a")
+    assert out["order"] == [0, 1, 2, 3, 4]
+    assert out["vertices"] == {"distance": [0, 1, 1, 2, 3, -1, -1], "parent": [-1, 0, 0, 2, 3, -1, -1]}
+    # c is reached from a through c - a, not through b
+    assert out["edges"]["tree"] == [1, 0, 1, 1, 1, 0]
+    assert out["summary"] == {"reached": 5, "depth": 3}
+
+
+def test_dfs(graph):
+    out = overlay(graph, "dfs", "a")
+    assert out["order"] == [0, 1, 2, 3, 4]
+    assert out["vertices"] == {"rank": [0, 1, 2, 3, 4, -1, -1], "parent": [-1, 0, 1, 2, 3, -1, -1]}
+    assert out["edges"]["tree"] == [1, 1, 0, 1, 1, 0]
+    assert overlay(graph, "dfs", "f")["order"] == [5, 6]
+
+
+def test_components(graph):
+    out = overlay(graph, "components")
+    assert out["vertices"]["component"] == [0, 0, 0, 0, 0, 1, 1]
+    assert out["edges"]["component"] == [0, 0, 0, 0, 0, 1]
+    assert out["summary"] == {"count": 2, "sizes": [5, 2], "largest": 5}
+
+
+def test_bipartite(graph):
+    out = overlay(graph, "bipartite")
+    assert out["vertices"]["side"] == [0, 1, 1, 0, 1, 0, 1]
+    # the triangle has to have an edge within a side
+    assert out["edges"]["conflict"] == [0, 1, 0, 0, 0, 0]
+    assert out["summary"] == {"bipartite": False, "conflicts": 1, "odd_components": [0]}
+    square = analysis.GraphIndex(list("wxyz"), np.array([0, 1, 2, 3], dtype=np.intc),
+                                 np.array([1, 2, 3, 0], dtype=np.intc))
+    assert overlay(square, "bipartite")["summary"]["bipartite"]
+    loop = analysis.GraphIndex(["x"], np.array([0], dtype=np.intc), np.array([0], dtype=np.intc))
+    assert overlay(loop, "bipartite")["summary"]["odd_components"] == [0]
+
+
+def test_degrees(graph):
+    out = overlay(graph, "degrees")
+    assert out["vertices"]["degree"] == [2, 2, 3, 2, 1, 1, 1]
+    summary = out["summary"]
+    assert (summary["min"], summary["max"], summary["median"]) == (1, 3, 2.0)
+    assert (summary["isolated"], summary["leaves"], summary["self_loops"]) == (0, 3, 0)
+    assert summary["histogram"] == {"degrees": [1, 2, 3], "counts": [3, 3, 1]}
+
+
+def test_shortest_paths(graph):
+    out = overlay(graph, "shortest_paths", "a", "e")
+    assert out["path"] == {"vertices": [0, 2, 3, 4], "edges": [2, 3, 4], "length": 3}
+    assert out["summary"]["eccentricity"] == 3
+    assert overlay(graph, "shortest_paths", "a", "g")["path"] == {"vertices": [], "edges": [], "length": 0}
+    assert overlay(graph, "shortest_paths", "e", "e")["path"] == {"vertices": [4], "edges": [], "length": 0}
+
+
+def test_unknown_queries(graph):
+    with pytest.raises(Exception, match="Unknown vertex"):
+        graph.overlay("bfs", "z")
+    with pytest.raises(Exception, match="Unknown analysis"):
+        graph.overlay("pagerank")
+
+
+def test_analysis_by_name():
+    program = "newgraph n forall n { <VERTEX> } m forall m { <ENDPOINT> <ENDPOINT> }"
+    data = "7 a b c d e f g 6 a b b c c a c d d e f g"
+    out = json.loads(endpoint.get_analysis(program, data, "shortest_paths", "a", "e"))
+    assert out["path"]["vertices"] == [0, 2, 3, 4]
@@ -0,0 +1,48 @@
+# coding=utf-8
+import pytest
+
+import compile
+import execute
+import parse_gen
+from benchmarks import generators
+
+# bulk loops read whole columns at once; the Root they build, and the errors they raise, have to be the slow path's
+CORPUS = [
+    ("newgraph VERTICES EDGES forall EDGES { <ENDPOINT + 1> <ENDPOINT + 1> }", "3 2 1 2 2 3"),
+    ("newgraph VERTICES EDGES forall EDGES { <ENDPOINT> <ENDPOINT> }", "3 2 +1 0002 2 \u0663"),
+    ("newgraph n forall n { <VERTEX> <w> }", "3 a 5 b -6 c 99999999999999999999"),
+    ("n forall n { <a> <b> }", "2 1 99999999999999999999 -3 1_000"),
+    ("n forall n { <a * 2> }", "3 2 4 6"),
+    ("n forall n { <a> <b> } m forall m { <c - 1> }", "2 1 2 3 4 2 5 6"),
+    ("n forall n { m forall m { <x> } }", "2 2 1 2 1 3"),
+]
+CORPUS += [generators.generate(name, 300, seed) for name in generators.format_names() for seed in range(3)]
+
+# tokens that can't be numbers, raising partway through a column
+BAD = [
+    ("newgraph VERTICES EDGES forall EDGES { <ENDPOINT + 1> <ENDPOINT + 1> }", "3 2 1 2 2.5 3"),
+    ("newgraph VERTICES EDGES forall EDGES { <ENDPOINT + 1> <ENDPOINT + 1> }", "3 2 1 2 x 99999999999999999999"),
+    ("n forall n { <a + 1> <b> }", "3 1 x 2 y z w"),
+    ("n forall n { <6 / a> }", "3 1 0 2"),
+]
+
+
+def run(program: str, data: str, bulk: bool) -> str:
+    ast = compile.compile_tree(parse_gen.parse_generated(program))
+    try:
+        return repr(execute.Execute(ast, data, bulk=bulk).get_data())
+    except Exception as e:
+        return repr(e.args)
+
+
+@pytest.mark.parametrize("program,data", CORPUS)
+def test_bulk_matches_slow_path(program, data):
+    assert run(program, data, True) == run(program, data, False)
+    assert not run(program, data, True).startswith("(")
+
+
+@pytest.mark.parametrize("program,data", BAD)
+def test_bulk_raises_like_slow_path(program, data):
+    out = run(program, data, True)
+    assert out.startswith("(")
+    assert out == run(program, data, False)
@@ -0,0 +1,41 @@
+# coding=utf-8
+from __future__ import annotations
+
+import pytest
+
+import cache
+
+
+def test_setting(monkeypatch):
+    monkeypatch.delenv("GRAPHVIS_TEST_ENTRIES", raising=False)
+    assert cache.setting("TEST_ENTRIES", 16) == 16
+    monkeypatch.setenv("GRAPHVIS_TEST_ENTRIES", " 3 ")
+    assert cache.setting("TEST_ENTRIES", 16) == 3
+    monkeypatch.setenv("GRAPHVIS_TEST_ENTRIES", "")
+    assert cache.setting("TEST_ENTRIES", 16) == 16
+    for value in ("-1", "1.5", "lots", "\u00b2", "\u0663"):
+        monkeypatch.setenv("GRAPHVIS_TEST_ENTRIES", value)
+        with pytest.raises(Exception, match="whole number"):
+            cache.setting("TEST_ENTRIES", 16)
+
+
+def test_resize():
+    lru = cache.LRUCache(4, 100, len)
+    for key in "abcd":
+        lru.put(key, key * 20)
+    lru.get("a")
+    lru.resize(2)
+    assert lru.get("b") is None and lru.get("c") is None
+    assert lru.get("a") == "a" * 20 and lru.get("d") == "d" * 20
+    lru.resize(2, 30)
+    assert lru.get("a") is None and lru.get("d") == "d" * 20
+    lru.put("e", "e" * 20)
+    assert lru.get("d") is None and lru.get("e") == "e" * 20
+
+
+def test_too_big_replaces():
+    lru = cache.LRUCache(4, 10, len)
+    lru.put("a", "old")
+    lru.put("a", "far too big to keep")
+    assert lru.get("a") is None
+    assert lru.stats()["bytes"] == 0
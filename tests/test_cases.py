@@ -0,0 +1,50 @@
+# coding=utf-8
+import json
+
+import pytest
+
+import cases
+import compile
+import endpoint
+import execute
+import parse_gen
+
+BACKENDS = ["interpreter", "closures"]
+
+# formats whose cases build their graph with keywords, with data for two cases each way
+KEYWORD_CASES = [
+    ("newgraph n (VERTICES, n) forall n { <a> }", ["3 1 2 3", "2 5 6"]),
+    ("newgraph VERTICES d forall d { <ENDPOINT + d> <ENDPOINT> }", ["3 2 2 1 3 2", "2 1 2 0"]),
+    ("newgraph n m forall n { <VERTEX> } forall m { <ENDPOINT> <ENDPOINT> }", ["3 2 a b c a b b c", "1 0 x"]),
+]
+
+
+def compile_format(text: str):
+    return compile.compile_tree(parse_gen.parse_generated(text))
+
+
+def describe(root: execute.Root):
+    # cases also see the header's values, which a single run doesn't have
+    graph = root.values[execute.GRAPH_NAME].values[tuple()]
+    names, heads, tails = endpoint.graph_structure(graph)
+    values = json.loads(endpoint.get_varvals(root))
+    values.pop("T", None)
+    return names, list(heads), list(tails), values
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("body,datasets", KEYWORD_CASES)
+def test_keyword_cases_match_single_runs(body, datasets, backend):
+    plan = cases.CasePlan(compile_format("T testcases T { " + body + " }"))
+    data = str(len(datasets)) + " " + " ".join(datasets)
+    roots = cases.run_cases(plan, data, backend, parallel=False)
+    program = endpoint.Program(compile_format(body))
+    assert [describe(root) for root in roots] == [describe(program.execute(data, backend)) for data in datasets]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_graph_dependent_case_length(backend):
+    # a loop count that only the graph knows can't be found by the pre-scan
+    with pytest.raises(Exception, match="indeterminate"):
+        plan = cases.CasePlan(compile_format("T testcases T { newgraph forall m { <a> } (VERTICES, m) }"))
+        cases.run_cases(plan, "1 2", backend, parallel=False)
@@ -0,0 +1,165 @@
+# coding=utf-8
+import numpy as np
+import pytest
+
+import draw_graph
+
+# two triangles, so the modes pack two components
+NAMES = [str(i) for i in range(6)]
+HEADS = np.array([0, 1, 2, 3, 4, 5])
+TAILS = np.array([1, 2, 0, 4, 5, 3])
+
+
+def test_streamed_layouts_are_kept_apart():
+    draw_graph.layout_cache.clear()
+    *_, (streamed, report) = draw_graph.stream_points(NAMES, HEADS, TAILS, "multilevel", "stream test")
+    assert report["done"]
+    assert draw_graph.layout_cache.get(draw_graph.layout_key(NAMES, HEADS, TAILS, "multilevel")) is None
+    # the same stream again is served from the cache
+    [(again, report)] = list(draw_graph.stream_points(NAMES, HEADS, TAILS, "multilevel", "stream test"))
+    assert report["saved"] and (again == streamed).all()
+    # a layout in the mode is made, not served the streamed one, and streams use it from then on
+    points, report = draw_graph.cached_points(NAMES, HEADS, TAILS, "multilevel")
+    assert report["iterations"] and report["saved"] == 0
+    [(again, report)] = list(draw_graph.stream_points(NAMES, HEADS, TAILS, "multilevel"))
+    assert (again == points).all()
+
+
+def exact_repulsion(points):
+    diff = points[:, None, :] - points[None, :, :]
+    distance = np.sqrt((diff ** 2).sum(axis=2))
+    np.fill_diagonal(distance, np.inf)
+    return (draw_graph.K2 * diff / distance[..., None] ** 3).sum(axis=1)
+
+
+@pytest.mark.parametrize("theta,tolerance", [(1e-9, 1e-9), (draw_graph.THETA, 0.02)])
+def test_tree_repulsion_approximates_pairs(theta, tolerance):
+    points = np.random.default_rng(1).normal(size=(300, 2)) * 400
+    exact = exact_repulsion(points)
+    forces = draw_graph.QuadTree(points).repulsion(points, theta)
+    assert np.linalg.norm(forces - exact) <= tolerance * np.linalg.norm(exact)
+
+
+def test_groups_only_push_themselves():
+    points = np.random.default_rng(2).normal(size=(40, 2)) * 300
+    groups = np.repeat([0, 1], 20)
+    forces = draw_graph.QuadTree(points, groups).repulsion(points, 1e-9)
+    for group in (0, 1):
+        alone = points[groups == group]
+        assert np.allclose(forces[groups == group], exact_repulsion(alone))
+
+
+def test_force_layout_settles():
+    # a cycle settles into a ring with edges about D long
+    n = 12
+    heads = np.arange(n)
+    tails = (heads + 1) % n
+    points = draw_graph.initial_points(n)
+    iterations = draw_graph.layout(points, heads, tails)
+    assert iterations < draw_graph.MAX_ITERATIONS
+    lengths = np.hypot(*(points[heads] - points[tails]).T)
+    assert np.all((lengths > draw_graph.D / 2) & (lengths < 2 * draw_graph.D))
+
+
+def grid(k):
+    index = np.arange(k * k).reshape(k, k)
+    heads = np.concatenate([index[:, :-1].ravel(), index[:-1, :].ravel()])
+    tails = np.concatenate([index[:, 1:].ravel(), index[1:, :].ravel()])
+    return heads, tails
+
+
+def test_coarsening_merges_neighbours():
+    heads, tails = grid(12)
+    n = 144
+    parent, count = draw_graph.coarsen(n, heads, tails, np.random.default_rng(0))
+    assert count < n * draw_graph.MIN_SHRINK
+    assert sorted(set(parent.tolist())) == list(range(count))
+    # every vertex merged with others shares an edge with one of them
+    merged = np.bincount(parent, minlength=count)[parent] > 1
+    inside = parent[heads] == parent[tails]
+    joined = np.zeros(n, dtype=bool)
+    joined[heads[inside]] = joined[tails[inside]] = True
+    assert (joined == merged).all()
+
+
+def test_coarsening_shrinks_stars():
+    # matching alone would only take one edge of a star
+    leaves = np.arange(1, 200)
+    _, count = draw_graph.coarsen(200, np.zeros(199, dtype=np.int64), leaves, np.random.default_rng(0))
+    assert count == 1
+
+
+def test_multilevel_layout():
+    heads, tails = grid(20)
+    points, iterations = draw_graph.multilevel(400, heads, tails, 200)
+    assert points.shape == (400, 2) and np.isfinite(points).all()
+    assert len(np.unique(points.round(3), axis=0)) == 400
+    # neighbours end up far closer together than vertices picked at random
+    rng = np.random.default_rng(0)
+    a, b = rng.integers(0, 400, (2, 1000))
+    edges = np.hypot(*(points[heads] - points[tails]).T).mean()
+    assert edges * 4 < np.hypot(*(points[a] - points[b]).T).mean()
+
+
+def test_components():
+    heads = np.array([0, 1, 3, 6])
+    tails = np.array([1, 2, 4, 6])
+    label, count = draw_graph.components(7, heads, tails)
+    assert count == 4
+    assert label.tolist() == [0, 0, 0, 1, 1, 2, 3]
+
+
+def boxes_overlap(a, b):
+    return (a.min(axis=0) < b.max(axis=0)).all() and (b.min(axis=0) < a.max(axis=0)).all()
+
+
+@pytest.mark.parametrize("mode", draw_graph.MODES)
+def test_components_are_packed_apart(mode):
+    # a grid, a few triangles, a path and lone vertices, the grid and path interleaved
+    grid_heads, grid_tails = grid(9)
+    heads = [grid_heads * 2]
+    tails = [grid_tails * 2]
+    extra = 81 * 2
+    for start in range(extra, extra + 12, 3):
+        heads.append(np.array([start, start + 1, start + 2]))
+        tails.append(np.array([start + 1, start + 2, start]))
+    heads.append(np.arange(1, 40, 2))
+    tails.append(np.arange(3, 42, 2))
+    n = extra + 12 + 2
+    heads = np.concatenate(heads)
+    tails = np.concatenate(tails)
+    label, count = draw_graph.components(n, heads, tails)
+    points, _ = draw_graph.place(n, heads, tails, mode, parallel=False)
+    assert np.isfinite(points).all()
+    parts = [points[label == c] for c in range(count)]
+    for i in range(count):
+        for j in range(i):
+            assert not boxes_overlap(parts[i], parts[j])
+
+
+def test_layouts_are_cached_and_warm_started():
+    draw_graph.layout_cache.clear()
+    heads, tails = grid(6)
+    names = ["v" + str(i) for i in range(36)]
+    first, report = draw_graph.cached_points(names, heads, tails, "force", "cache test")
+    assert not report["warm"] and report["iterations"]
+    cold = report["iterations"]
+
+    # the same graph, numbered and listed differently, comes from the cache
+    order = np.random.default_rng(0).permutation(36)
+    rank = np.argsort(order)
+    again, report = draw_graph.cached_points([names[i] for i in order], rank[tails], rank[heads], "force",
+                                             "cache test")
+    assert report == {"warm": True, "iterations": 0, "saved": cold}
+    assert (again == first[order]).all()
+
+    # another mode is laid out on its own
+    _, report = draw_graph.cached_points(names, heads, tails, "multilevel")
+    assert report["iterations"]
+
+    # one more vertex starts from the latest layout of the context, and the rest barely moves
+    edited, report = draw_graph.cached_points(names + ["new"], np.append(heads, 35), np.append(tails, 36), "force",
+                                              "cache test")
+    assert report["warm"] and report["iterations"]
+    moved = np.hypot(*(edited[:36] - first).T)
+    assert np.median(moved) < draw_graph.D / 4
@@ -0,0 +1,51 @@
+# coding=utf-8
+import json
+
+import pytest
+
+import compile
+import endpoint
+import execute
+import lower
+import parse_gen
+
+# Values a loop stored come back into scope when a later loop runs over the same counter, one iteration at a time,
+# and go out of scope when the iteration of the innermost loop they depend on ends. Variables nest by their loops in
+# name order.
+SCOPES = [
+    ("n forall n { <a> } forall n { <b + a> }", "2 1 2 5 7",
+     {"n": 2, "a": {"0": 1, "1": 2}, "b": {"0": 4, "1": 5}}),
+    ("n m forall n { forall m { <a> } } forall m { forall n { <b + a> } }", "2 2 1 2 3 4 10 20 30 40",
+     {"n": 2, "m": 2, "a": {"0": {"0": 1, "1": 3}, "1": {"0": 2, "1": 4}},
+      "b": {"0": {"0": 9, "1": 17}, "1": {"0": 28, "1": 36}}}),
+    ("n forall n { <a> m forall m { <b + a> } }", "2 1 2 5 6 2 1 1 1",
+     {"n": 2, "a": {"0": 1, "1": 2}, "m": {"0": 2, "1": 1}, "b": {"0": {"0": 4, "1": -1}, "1": {"0": 5}}}),
+    ("n forall n { <a> } <a>", "2 1 2 5", {"n": 2, "a": "5"}),
+    ("n forall n { <a> } forall n { <b> (c, b + a) }", "2 1 2 5 7",
+     {"n": 2, "a": {"0": 1, "1": 2}, "b": {"0": 5, "1": 7}, "c": {"0": 6, "1": 9}}),
+    ("n forall n { m forall m { <a> } } forall n { <x> forall m { <b + a> } }", "2 1 5 2 6 7 0 100 1 10 20",
+     {"n": 2, "m": {"0": 1, "1": 2}, "a": {"0": {"0": 5, "1": 6}, "1": {"1": 7}}, "x": {"0": "0", "1": "1"},
+      "b": {"0": {"0": 95, "1": 4}, "1": {"1": 13}}}),
+    ("n forall n { <k> forall k { <x> } } forall n { forall k { <y + x> } }", "2 1 7 2 8 9 10 20 30",
+     {"n": 2, "k": {"0": 1, "1": 2}, "x": {"0": {"0": 7, "1": 8}, "1": {"1": 9}},
+      "y": {"0": {"0": 3, "1": 12}, "1": {"1": 21}}}),
+]
+
+
+def runs(ast, data):
+    yield execute.Execute(ast, data, bulk=False)
+    yield execute.Execute(ast, data)
+    yield lower.ClosureExecute(ast, data, lower.lower_statements(ast))
+
+
+@pytest.mark.parametrize("program,data,expected", SCOPES)
+def test_loop_scopes(program, data, expected):
+    ast = compile.compile_tree(parse_gen.parse_generated(program))
+    for run in runs(ast, data):
+        assert json.loads(endpoint.get_varvals(run.get_data())) == expected
+
+
+def test_loop_variable_reused_inside_itself():
+    ast = compile.compile_tree(parse_gen.parse_generated("n forall n { forall n { <x> } }"))
+    with pytest.raises(Exception, match="Loop variable already defined"):
+        execute.Execute(ast, "2 1 2 3 4", bulk=False).get_data()
@@ -0,0 +1,68 @@
+# coding=utf-8
+import json
+
+import pytest
+
+import endpoint
+import graphvis
+
+# what the page sends with every format
+PAGE_ACCEPT = endpoint.COLUMNAR_TYPE + ", application/json;q=0.5"
+
+SINGLE = ("newgraph VERTICES EDGES forall EDGES { <ENDPOINT + 1> <ENDPOINT + 1> }", "3 2 1 2 2 3")
+CASES = ("T testcases T { newgraph VERTICES EDGES forall EDGES { <ENDPOINT> <ENDPOINT> } }", "2 2 1 0 1 3 1 1 2")
+
+
+@pytest.fixture
+def client():
+    return graphvis.app.test_client()
+
+
+def post(client, route, fmt, data, **kwargs):
+    return client.post(route, data={"graphformat": fmt, "graphdata": data, "stream": "on"}, **kwargs)
+
+
+def test_page_gets_columnar_graphs(client):
+    response = post(client, "/process_graph", *SINGLE, headers={"Accept": PAGE_ACCEPT})
+    assert response.status_code == 200
+    assert response.mimetype == endpoint.COLUMNAR_TYPE
+
+
+def test_page_gets_json_test_cases(client):
+    response = post(client, "/process_graph", *CASES, headers={"Accept": PAGE_ACCEPT})
+    assert response.status_code == 200
+    assert response.mimetype == endpoint.JSON_TYPE
+    assert [len(case["graph"]["edges"]) for case in response.get_json()["cases"]] == [1, 1]
+    plain = post(client, "/process_graph", *CASES)
+    assert plain.mimetype == endpoint.JSON_TYPE
+    assert plain.get_json() == response.get_json()
+
+
+def test_columnar_only_refuses_test_cases(client):
+    assert post(client, "/process_graph", *CASES, headers={"Accept": endpoint.COLUMNAR_TYPE}).status_code == 500
+
+
+def test_streamed_test_cases(client):
+    response = post(client, "/stream_graph", *CASES)
+    assert response.status_code == 200
+    text = response.get_data(as_text=True)
+    assert text.startswith("event: cases\ndata: ")
+    streamed = json.loads(text.split("data: ", 1)[1])["cases"]
+    whole = post(client, "/process_graph", *CASES).get_json()["cases"]
+    # the layout reports differ, since the second run starts from the cached layouts
+    assert [case["varvals"] for case in streamed] == [case["varvals"] for case in whole]
+    assert [case["graph"]["edges"] for case in streamed] == [case["graph"]["edges"] for case in whole]
+
+
+@pytest.mark.parametrize("seed", ["-1", "1.5", "\u00b2", "\u0663"])
+def test_generate_refuses_bad_seeds(client, seed):
+    response = client.post("/generate", data={"graphformat": SINGLE[0], "seed": seed})
+    assert response.status_code == 400
+    assert "Seed" in response.get_json()["error"]
+
+
+def test_generate(client):
+    form = {"graphformat": SINGLE[0], "seed": "7", "vertices": "5"}
+    response = client.post("/generate", data=form)
+    assert response.status_code == 200
+    assert response.get_data(as_text=True) == client.post("/generate", data=form).get_data(as_text=True)
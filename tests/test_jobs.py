@@ -0,0 +1,17 @@
+# coding=utf-8
+import jobs
+
+
+def test_too_big_results_fail_the_job():
+    queue = jobs.JobQueue(workers=0)
+    queue.finished.resize(16, 1000)
+    small = jobs.Job("a", "1", None, "closures", "force", "json")
+    big = jobs.Job("a", "1", None, "closures", "force", "json")
+    with queue.lock:
+        queue.finish(small, jobs.DONE, "x" * 100, None)
+        queue.finish(big, jobs.DONE, "x" * 1000, None)
+    assert queue.get(small.id).state == jobs.DONE
+    job = queue.get(big.id)
+    assert job.state == jobs.FAILED and job.result is None
+    assert job.status()["error"] == "Result is too large to keep!"
+    assert queue.stats()["completed"] == {jobs.DONE: 1, jobs.FAILED: 1, jobs.CANCELLED: 0}
@@ -0,0 +1,24 @@
+# coding=utf-8
+import pytest
+
+import compile
+import lower
+import parse_gen
+from benchmarks import generators
+
+# formats and data the closures have to run exactly as the interpreter does; test cases are compared in test_cases
+CORPUS = [
+    ("newgraph VERTICES EDGES forall EDGES { <ENDPOINT + 1> <ENDPOINT + 1> }", "3 2 1 2 2 3"),
+    ("newgraph n forall n { <VERTEX> <w> } m forall m { <ENDPOINT> <ENDPOINT> }", "2 a 5 b 6 1 a b"),
+    ("n forall n { m forall m { <x> } <y> }", "2 2 1 2 a 1 3 b"),
+    ("n forall n { <a> (b, a * 2) (c = b / 2 - 1) }", "3 4 6 8"),
+    ("n forall n { <x> } <x>", "2 3 4 5"),
+    ("k forall k { <v> } forall k { <w> } <v2>", "2 x y z w q"),
+]
+CORPUS += [generators.generate(name, 300, seed) for name in generators.format_names() for seed in range(3)]
+
+
+@pytest.mark.parametrize("program,data", CORPUS)
+def test_closures_match_interpreter(program, data):
+    ast = compile.compile_tree(parse_gen.parse_generated(program))
+    assert lower.diff_backends(ast, data) == []
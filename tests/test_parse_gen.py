@@ -0,0 +1,39 @@
+# coding=utf-8
+import pytest
+
+import parse
+import parse_gen
+from benchmarks import generators, parse_bench
+
+# the generated parser has to build the tree the grammar interpreter does, whatever the text, including texts that
+# only partly parse
+FORMATS = [parse_bench.make_format(loops, depth) for loops, depth in [(1, 2), (10, 4), (20, 6)]]
+FORMATS += [program for program, _ in generators.FORMATS.values()]
+FORMATS += [
+    "",
+    "newgraph",
+    "T testcases T { newgraph n forall n { <VERTEX> } }",
+    "n (VERTICES, n) (HEAD, TAIL) forall n { <a, b> (ENDPOINT = a - 1) }",
+    "x <(a + b) * (c - d) / e>",
+    "forall {",
+    "n forall n { <x> ",
+    "<a +> b",
+    "(a = ) c",
+]
+
+PROC_GRAMMAR = parse.build_proc_grammar(parse.GRAMMAR)
+
+
+def outcome(parser, text: str) -> str:
+    # the tree, or the error for texts that don't parse at all
+    try:
+        return repr(parser(text))
+    except Exception as e:
+        return type(e).__name__
+
+
+@pytest.mark.parametrize("text", FORMATS)
+def test_generated_parser_matches_interpreter(text):
+    expected = outcome(lambda s: parse.parse(s, PROC_GRAMMAR), text)
+    assert outcome(parse_gen.parse_generated, text) == expected
+    assert outcome(lambda s: parse.parse(s, PROC_GRAMMAR, packrat=True), text) == expected
@@ -0,0 +1,73 @@
+# coding=utf-8
+import json
+
+import pytest
+
+import compile
+import endpoint
+import execute
+import lower
+import parse_gen
+from benchmarks import generators
+
+# Values are kept in rows of loop counters rather than a dict keyed by them; whatever the format, what is stored and
+# how it serializes has to be what the dict gave, on the slow path and through bulk loops and closures alike.
+
+CORPUS = [
+    ("n forall n { <x> }", "3 a b c"),
+    ("n forall n { <x> } <x>", "2 3 4 5"),
+    ("n forall n { m forall m { <x> } } forall n { <x> }", "2 1 7 2 8 9 5 6"),
+    ("n forall n { m forall m { <x> } <y> }", "2 2 1 2 a 1 3 b"),
+    ("n m forall m { forall n { <x> } }", "2 3 1 2 3 4 5 6"),
+    ("n forall n { <a> (b, a * 2) }", "3 1 2 3"),
+    ("n forall n { <a> } forall n { <b + a> }", "2 1 2 5 7"),
+    ("k forall k { <v> } forall k { <w> } <v2>", "2 x y z w q"),
+]
+CORPUS += [generators.generate(name, 300, seed) for name in generators.format_names() for seed in range(2)]
+
+
+def compile_format(text: str):
+    return compile.compile_tree(parse_gen.parse_generated(text))
+
+
+def nested_dicts(values: dict):
+    # variables serialized from a plain dict of counters to values, the way they were before rows
+    out = {}
+    for key, value in values.items():
+        if not key:
+            out = value
+            continue
+        if not isinstance(out, dict):
+            out = {}
+        level = out
+        for counter in key[:-1]:
+            if not isinstance(level.get(counter), dict):
+                level[counter] = {}
+            level = level[counter]
+        level[key[-1]] = value
+    return out
+
+
+def reference(root: execute.Root) -> dict:
+    return {name: nested_dicts(dict(variable.values.items())) for name, variable in root.values.items()
+            if name != execute.GRAPH_NAME}
+
+
+def runs(ast, data):
+    yield "slow path", execute.Execute(ast, data, bulk=False).get_data()
+    yield "bulk", execute.Execute(ast, data).get_data()
+    yield "closures", lower.ClosureExecute(ast, data, lower.lower_statements(ast)).get_data()
+
+
+@pytest.mark.parametrize("text,data", CORPUS)
+def test_rows_match_dict_storage(text, data):
+    ast = compile_format(text)
+    slow = None
+    for name, root in runs(ast, data):
+        values = json.loads(endpoint.get_varvals(root))
+        assert values == json.loads(json.dumps(reference(root))), name
+        graph = root.values[execute.GRAPH_NAME].values[tuple()] if execute.GRAPH_NAME in root.values else None
+        got = (values, None if graph is None else endpoint.graph_structure(graph))
+        if slow is None:
+            slow = got
+        assert got == slow, name
@@ -0,0 +1,42 @@
+# coding=utf-8
+import pytest
+
+import compile
+import endpoint
+import execute
+import parse_gen
+import testdata
+from benchmarks import generators
+
+
+def compile_format(text: str):
+    return compile.compile_tree(parse_gen.parse_generated(text))
+
+
+@pytest.mark.parametrize("name", generators.format_names())
+def test_generated_data_reads_back(name):
+    text = generators.FORMATS[name][0]
+    sizes = {"vertices": 40, "edges": 60}
+    data = testdata.generate_string(compile_format(text), sizes, ["connected"], 5)
+    assert data == testdata.generate_string(compile_format(text), sizes, ["connected"], 5)
+    root = endpoint.Program(compile_format(text)).execute(data)
+    names, heads, _ = endpoint.graph_structure(root.values[execute.GRAPH_NAME].values[tuple()])
+    assert (len(names), len(heads)) == (40, 60)
+
+
+@pytest.mark.parametrize("text,sizes", [
+    ("n forall n { <x> }", {"n": 1000}),
+    ("n forall n { m forall m { <x> } }", {"n": 40, "m": 40}),
+    ("T testcases T { n forall n { <x> } }", {"cases": 4, "n": 300}),
+    (generators.HINTS, {"vertices": 100, "edges": 400}),
+])
+def test_token_budget(text, sizes):
+    ast = compile_format(text)
+    assert testdata.generate_string(ast, sizes, max_tokens=10 ** 4)
+    with pytest.raises(Exception, match="too many tokens"):
+        testdata.generate_string(ast, sizes, max_tokens=500)
+
+
+def test_negative_seed():
+    with pytest.raises(Exception, match="negative"):
+        testdata.generate_string(compile_format("n forall n { <x> }"), seed=-1)
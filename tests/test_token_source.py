@@ -0,0 +1,76 @@
+# coding=utf-8
+import sys
+
+import pytest
+
+import token_source
+
+SPACES = "".join(chr(c) for c in range(sys.maxunicode + 1) if chr(c).isspace())
+
+TEXTS = [
+    "3 4 5 6",
+    "3\u00a04 5\u20036",
+    "a\u3000b\u2028c\u0085d\x1ce",
+    "\u00e9\u00a0\u00fc \u0100x\u2009y",
+    # bytes that start or continue a multibyte space, in tokens
+    "\u00a1\u00a0\u1681\u2011\u2080\u3001 \u205e",
+    "  leading\u3000and trailing \u00a0",
+    "",
+]
+
+
+def mapped(tmp_path, text: str) -> str:
+    path = tmp_path / "data.txt"
+    path.write_bytes(text.encode("utf-8"))
+    return str(path)
+
+
+def test_spaces_end_at_u3000():
+    assert max(map(ord, SPACES)) == 0x3000
+
+
+@pytest.mark.parametrize("text", TEXTS + [SPACES.join(["x", "y\u00e9", "z"])])
+def test_mapped_files_split_like_strings(tmp_path, text):
+    expected = text.split()
+    assert list(token_source.StringTokens(text)) == expected
+    with token_source.MappedTokens(mapped(tmp_path, text)) as tokens:
+        assert list(tokens) == expected
+        positions = list(tokens.positions())
+    assert [token for token, _ in positions] == expected
+    # a slice between two positions has the tokens between them
+    if len(positions) >= 3:
+        with token_source.MappedTokens(mapped(tmp_path, text)) as tokens:
+            piece = tokens.slice(positions[0][1], positions[2][1])
+            assert list(piece) == expected[1:3]
+            assert [token for token, _ in piece.positions()] == expected[1:3]
+
+
+def test_counting_positions():
+    tokens = token_source.CountingTokens(token_source.StringTokens("a b\u00a0c"))
+    assert [token for token, _ in tokens.positions()] == ["a", "b", "c"]
+    assert tokens.taken() == 3
+
+
+def test_counting_partial_reads():
+    tokens = token_source.CountingTokens(token_source.StringTokens("a b c d e"))
+    assert tokens.taken() == 0
+    it = iter(tokens)
+    next(it)
+    next(it)
+    assert tokens.taken() == 2
+    assert list(it) == ["c", "d", "e"]
+    assert tokens.taken() == 5
+
+
+def test_sources_must_implement_everything():
+    class Partial(token_source.TokenSource):
+        def __iter__(self):
+            return iter(())
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+def test_mapped_files_must_be_utf8(tmp_path):
+    with pytest.raises(Exception, match="UTF-8"):
+        token_source.MappedTokens(mapped(tmp_path, "a"), encoding="latin-1")
@@ -0,0 +1,195 @@
+# coding=utf-8
+from __future__ import annotations
+
+import codecs
+import mmap
+import os
+import re
+from abc import ABC, abstractmethod
+from typing import Iterator, List, Optional, Pattern, Tuple
+
+TOKEN = re.compile(r"\S+")
+
+
+def bytes_patterns() -> Tuple[Pattern[bytes], Pattern[bytes], Pattern[bytes]]:
+    # Mapped files are tokenized as UTF-8 bytes, splitting on the same characters str.isspace, and so TOKEN, does. The
+    # ones past ASCII take several bytes, which a character class can't exclude; the pattern that can is slower, so
+    # it is only used on files that have any. A token can't start on a continuation byte, so the end of a multibyte
+    # space is never taken for the start of one. Returns the ASCII pattern, the full pattern and the spaces past ASCII.
+    # no space comes after U+3000
+    spaces = [chr(c).encode("utf-8") for c in range(0x3001) if chr(c).isspace()]
+    single = sorted(space[0] for space in spaces if len(space) == 1)
+    multi = [space for space in spaces if len(space) > 1]
+    leads = sorted({space[0] for space in multi})
+
+    def byte_class(values: List[int]) -> bytes:
+        return b"".join(re.escape(bytes([value])) for value in values)
+
+    others = b"[^" + byte_class(single + leads) + b"]"
+    lead = b"(?!" + b"|".join(map(re.escape, multi)) + b")[" + byte_class(leads) + b"]"
+    return (re.compile(b"[^" + byte_class(single) + b"]+"),
+            re.compile(b"(?![\x80-\xbf])(?:" + others + b"|" + lead + b")" + others + b"*(?:" + lead + others + b"*)*"),
+            re.compile(b"|".join(map(re.escape, multi))))
+
+
+BYTES_TOKEN, UNICODE_BYTES_TOKEN, UNICODE_SPACE = bytes_patterns()
+
+
+class TokenSource(ABC):
+    @abstractmethod
+    def __iter__(self) -> Iterator[str]:
+        pass
+
+    @abstractmethod
+    def positions(self) -> Iterator[Tuple[str, int]]:
+        # every token with the offset just past it, in whatever units slice takes
+        pass
+
+    @abstractmethod
+    def slice(self, start: int, end: int) -> TokenSource:
+        # a source of the tokens between two offsets from positions, cheap to send to another process
+        pass
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> TokenSource:
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+
+class StringTokens(TokenSource):
+    def __init__(self, S: str) -> None:
+        self.S = S
+
+    def __iter__(self) -> Iterator[str]:
+        for match in TOKEN.finditer(self.S):
+            yield match.group()
+
+    def positions(self) -> Iterator[Tuple[str, int]]:
+        for match in TOKEN.finditer(self.S):
+            yield match.group(), match.end()
+
+    def slice(self, start: int, end: int) -> TokenSource:
+        return StringTokens(self.S[start:end])
+
+    def __repr__(self) -> str:
+        return "StringTokens(" + str(len(self.S)) + " chars)"
+
+
+class ListTokens(TokenSource):
+    def __init__(self, tokens: List[str]) -> None:
+        self.tokens = tokens
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.tokens)
+
+    def positions(self) -> Iterator[Tuple[str, int]]:
+        for i, token in enumerate(self.tokens):
+            yield token, i + 1
+
+    def slice(self, start: int, end: int) -> TokenSource:
+        return ListTokens(self.tokens[start:end])
+
+    def __repr__(self) -> str:
+        return "ListTokens(" + str(len(self.tokens)) + " tokens)"
+
+
+class CountingTokens(TokenSource):
+    # counts the tokens read from source as they go
+    def __init__(self, source: TokenSource) -> None:
+        self.source = source
+        self.count = 0
+
+    def __iter__(self) -> Iterator[str]:
+        for token in self.source:
+            self.count += 1
+            yield token
+
+    def positions(self) -> Iterator[Tuple[str, int]]:
+        for token in self.source.positions():
+            self.count += 1
+            yield token
+
+    def slice(self, start: int, end: int) -> TokenSource:
+        # tokens read from a slice aren't counted here
+        return self.source.slice(start, end)
+
+    def taken(self) -> int:
+        return self.count
+
+    def close(self) -> None:
+        self.source.close()
+
+    def __repr__(self) -> str:
+        return "CountingTokens(" + repr(self.source) + ")"
+
+
+class MappedTokens(TokenSource):
+    def __init__(self, path: str, encoding: str = "utf-8", start: int = 0, end: Optional[int] = None) -> None:
+        # only the tokens between byte offsets start and end are read
+        if codecs.lookup(encoding).name != "utf-8":
+            raise Exception("Mapped files have to be UTF-8!", encoding)
+        self.path = path
+        self.encoding = encoding
+        self.start = start
+        self.end = end
+        self.file = open(path, "rb")
+        self.map = None
+        size = os.fstat(self.file.fileno()).st_size
+        if size:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.end is None:
+            self.end = size
+        self.pattern = BYTES_TOKEN
+        if self.map is not None and UNICODE_SPACE.search(self.map, self.start, self.end):
+            self.pattern = UNICODE_BYTES_TOKEN
+
+    def __iter__(self) -> Iterator[str]:
+        if self.map is None:
+            return
+        for match in self.pattern.finditer(self.map, self.start, self.end):
+            yield match.group().decode(self.encoding)
+
+    def positions(self) -> Iterator[Tuple[str, int]]:
+        if self.map is None:
+            return
+        for match in self.pattern.finditer(self.map, self.start, self.end):
+            yield match.group().decode(self.encoding), match.end()
+
+    def slice(self, start: int, end: int) -> TokenSource:
+        # opened again wherever it is used, so it carries no file handle across processes
+        return MappedSlice(self.path, self.encoding, start, end)
+
+    def close(self) -> None:
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        self.file.close()
+
+    def __repr__(self) -> str:
+        return "MappedTokens(" + self.path + ")"
+
+
+class MappedSlice(TokenSource):
+    def __init__(self, path: str, encoding: str, start: int, end: int) -> None:
+        self.path = path
+        self.encoding = encoding
+        self.start = start
+        self.end = end
+
+    def __iter__(self) -> Iterator[str]:
+        with MappedTokens(self.path, self.encoding, self.start, self.end) as tokens:
+            yield from tokens
+
+    def positions(self) -> Iterator[Tuple[str, int]]:
+        with MappedTokens(self.path, self.encoding, self.start, self.end) as tokens:
+            yield from tokens.positions()
+
+    def slice(self, start: int, end: int) -> TokenSource:
+        return MappedSlice(self.path, self.encoding, start, end)
+
+    def __repr__(self) -> str:
+        return "MappedSlice(" + self.path + ", " + str(self.start) + ", " + str(self.end) + ")"